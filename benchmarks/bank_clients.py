@@ -0,0 +1,111 @@
+"""
+Drive the Inter and Rede clients against the local stand-in APIs.
+
+    python benchmarks/bank_clients.py --pages 50 --latency 0.05 --error-rate 0.02
+
+Reports wall time, requests, retries, transactions/s and the highest number of
+requests the server saw at once, per client. Injected errors left after the
+last retry are reported as failures
+"""
+import contextlib
+import io
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import typer
+from tabulate import tabulate
+
+from fiscal.banco_inter import InterBank
+from fiscal.rede import Merchant, Rede
+from fiscal.transport import Transport
+from tests.fake_banks import FakeBanks
+
+START = datetime(2023, 3, 1)
+END = datetime(2023, 3, 31)
+
+
+def _inter(banks: FakeBanks, transport: Transport) -> int:
+    client = InterBank.from_secrets(
+        "id", "secret", base_url=banks.inter_url, transport=transport
+    )
+    return len(client.get_transactions(START, END).transacoes)
+
+
+def _rede(banks: FakeBanks, transport: Transport) -> int:
+    client = Rede("user", "password", "id", "secret", banks.rede_url, transport)
+    return len(client.get_transactions(START, END))
+
+
+def _rede_stores(banks: FakeBanks, transport: Transport) -> int:
+    client = Rede(
+        "user",
+        "password",
+        "id",
+        "secret",
+        banks.rede_url,
+        transport,
+        merchants=[Merchant.parse("93122470"), Merchant.parse("93122471")],
+    )
+    return len(client.get_transactions(START, END))
+
+
+def _run(
+    name: str,
+    fetch: Callable[[FakeBanks, Transport], int],
+    rate_limit: float | None,
+    **options,
+) -> dict:
+    transport = Transport(rate_limit=rate_limit)
+    with FakeBanks(**options) as banks:
+        start = time.perf_counter()
+        error = ""
+        transactions = 0
+        try:
+            # The clients print their progress
+            with contextlib.redirect_stdout(io.StringIO()):
+                transactions = fetch(banks, transport)
+        except Exception as err:
+            error = f"{type(err).__name__}: {err}"[:60]
+        seconds = time.perf_counter() - start
+
+    return {
+        "client": name,
+        "seconds": seconds,
+        "requests": sum(banks.stats.requests.values()),
+        "retries": transport.retries,
+        "transactions": transactions,
+        "transactions/s": transactions / seconds,
+        "max in flight": banks.stats.max_in_flight,
+        "injected errors": sum(banks.stats.errors.values()),
+        "failure": error,
+    }
+
+
+def main(
+    pages: int = typer.Option(20, help="Pages served per listing"),
+    page_size: int = typer.Option(100, help="Transactions per page"),
+    latency: float = typer.Option(0.05, help="Seconds the server waits per request"),
+    error_rate: float = typer.Option(0.0, help="Share of requests failing (429/5xx)"),
+    retry_after: float = typer.Option(1.0, help="Seconds asked for by a 429"),
+    seed: int = typer.Option(42, help="Seed for the injected errors"),
+    rate_limit: Optional[float] = typer.Option(None, help="Client requests/s"),
+):
+    options = {
+        "pages": pages,
+        "page_size": page_size,
+        "latency": latency,
+        "error_rate": error_rate,
+        "retry_after": retry_after,
+        "seed": seed,
+    }
+    results = [
+        _run("inter", _inter, rate_limit, **options),
+        _run("rede", _rede, rate_limit, **options),
+        _run("rede 2 stores", _rede_stores, rate_limit, **options),
+    ]
+    print(tabulate(results, headers="keys", tablefmt="psql", floatfmt=",.3f"))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+from sqlmodel import SQLModel
+
+import synthetic
+from fiscal.db import Database
+
+# 10k, 100k or 1m transactions, see synthetic.SCALES
+SCALE = os.environ.get("FISCAL_BENCH_SCALE", "10k")
+
+
+@pytest.fixture(scope="session")
+def db(tmp_path_factory):
+    """
+    Database filled with the synthetic data of the selected scale, shared by the
+    whole run. Commands opening their own connection find it through DB_PATH
+    """
+    path = tmp_path_factory.mktemp("benchmarks") / f"{SCALE}.db"
+    previous = dict(os.environ)
+    os.environ |= {"DB_PATH": str(path), "FISCAL_REPORT_CACHE": "off"}
+
+    db = Database.from_default()
+    SQLModel.metadata.create_all(db.engine)
+    synthetic.generate(db, synthetic.SCALES[SCALE])
+
+    yield db
+
+    os.environ.clear()
+    os.environ |= previous
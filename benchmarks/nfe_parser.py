@@ -0,0 +1,89 @@
+"""
+Throughput of the NFe zip parser over generated documents.
+
+    python benchmarks/nfe_parser.py --documents 5000
+
+Parsed values are checked against the generated ones, so a faster parser that
+reads something different fails here
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import typer
+from tabulate import tabulate
+
+from fiscal.xmls_nfs import _iter_nfes
+from tests import nfe_factory
+
+EMITTERS = [(f"fornecedor {index:03} ltda", f"{index:014}") for index in range(1, 200)]
+
+
+def _check(parsed, expected: list[nfe_factory.ExpectedNFE]) -> list[str]:
+    by_code = {nfe.codigo_acesso: nfe for nfe in parsed}
+    errors = []
+
+    if sorted(by_code) != sorted(nfe.codigo_acesso for nfe in expected):
+        errors.append(f"parsed {len(by_code)} documents, expected {len(expected)}")
+
+    for nfe in expected:
+        found = by_code.get(nfe.codigo_acesso)
+        if found is None:
+            continue
+        if (found.valor_total, found.valor_liquido) != (
+            nfe.valor_total,
+            nfe.valor_liquido,
+        ):
+            errors.append(f"{nfe.codigo_acesso}: totals differ")
+        if [p.valor_total for p in found.produtos] != [p.total for p in nfe.produtos]:
+            errors.append(f"{nfe.codigo_acesso}: items differ")
+
+    return errors
+
+
+def main(
+    documents: int = typer.Option(5000, help="NFEs in the generated zip"),
+    max_items: int = typer.Option(30, help="Maximum items per NFE"),
+    repeat: int = typer.Option(3, help="Parses timed, the best one is reported"),
+):
+    expected = nfe_factory.random_nfes(documents, EMITTERS, max_items=max_items)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "nfes.zip"
+        size = nfe_factory.write_zip(path, expected)
+        compressed = path.stat().st_size
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parsed = list(_iter_nfes(str(path)))
+            timings.append(time.perf_counter() - start)
+
+    errors = _check(parsed, expected)
+    seconds = min(timings)
+
+    print(
+        tabulate(
+            [
+                {
+                    "documents": documents,
+                    "xml (MB)": size / 1e6,
+                    "zip (MB)": compressed / 1e6,
+                    "seconds": seconds,
+                    "documents/s": documents / seconds,
+                    "MB/s": size / 1e6 / seconds,
+                }
+            ],
+            headers="keys",
+            tablefmt="psql",
+            floatfmt=",.3f",
+        )
+    )
+
+    if errors:
+        print("\n".join(errors[:20]))
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,162 @@
+"""
+Time an import and the month reports under each SQLite profile.
+
+    python benchmarks/sqlite_profiles.py --transactions 5000
+"""
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import typer
+from sqlmodel import SQLModel
+from tabulate import tabulate
+
+from fiscal import fetcher, reports
+from fiscal.db import (
+    SQLITE_PROFILES,
+    Balance,
+    Category,
+    Companies,
+    Company_Naming,
+    Database,
+    EntryType,
+    Transactions,
+)
+
+
+BANKS = ["bb", "itau", "inter", "rede"]
+
+COMPANIES = [
+    Companies(name="fornecedor", cnpj="1", default_category=Category.COMPRAS),
+    Companies(name="distribuidora", cnpj="2", default_category=Category.INSUMOS),
+]
+
+
+def _setup(db: Database) -> None:
+    with db:
+        for company in COMPANIES:
+            db.add(Companies(**company.dict()))
+            db.add(Company_Naming(nickname=company.name, name=company.name))
+
+        for bank in BANKS:
+            for n_previous in (1, 2):
+                db.add(
+                    Balance(
+                        date=reports.last_day_of_month(n_previous).date(),
+                        bank=bank,
+                        balance=10_000.0,
+                    )
+                )
+
+
+def _label_transfers(db: Database) -> None:
+    """
+    Transfers between our banks are labeled by hand after the import
+    """
+    with db:
+        db.execute(
+            "UPDATE transactions SET category = 'transferencia'"
+            " WHERE transaction_type == 'pix' AND id % 10 == 0"
+        )
+
+
+def _transactions(quantity: int, seed: int = 42) -> list[tuple[Transactions, str]]:
+    """
+    A month of transactions whose counterparts already exist, so nothing is asked
+    """
+    rnd = random.Random(seed)
+    start = reports.first_day_of_month(1)
+
+    kinds = [
+        (EntryType.ENTRADA, "pix", None),
+        (EntryType.ENTRADA, "crédito", None),
+        (EntryType.ENTRADA, "débito", None),
+        (EntryType.SAIDA, "pix", "fornecedor"),
+        (EntryType.SAIDA, "pagamento", "distribuidora"),
+        (EntryType.SAIDA, "tarifa", None),
+        (EntryType.SAIDA, "imposto", None),
+    ]
+
+    transactions = []
+    for index in range(quantity):
+        entry_type, transaction_type, counterpart = rnd.choice(kinds)
+        transactions.append(
+            (
+                Transactions(
+                    bank=rnd.choice(BANKS),
+                    date=start + timedelta(minutes=rnd.randrange(28 * 24 * 60)),
+                    entry_type=entry_type,
+                    transaction_type=transaction_type,
+                    category=None,
+                    description="benchmark",
+                    value=round(rnd.uniform(1, 2000), 2),
+                    counterpart_name=counterpart,
+                    validated=False,
+                    external_id=f"benchmark-{index}",
+                ),
+                "",
+            )
+        )
+
+    return transactions
+
+
+def _timed(function) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    return time.perf_counter() - start
+
+
+def _run_profile(profile: str, quantity: int, directory: Path) -> dict[str, object]:
+    os.environ["DB_PATH"] = str(directory / f"{profile}.db")
+    os.environ["FISCAL_DB_PROFILE"] = profile
+    os.environ["FISCAL_REPORT_CACHE"] = "off"
+
+    db = Database.from_default()
+    SQLModel.metadata.create_all(db.engine)
+    _setup(db)
+
+    transactions = _transactions(quantity)
+
+    def do_import():
+        with db:
+            fetcher.handle_inserts(transactions, db)
+
+    def do_reports():
+        reports.report_all(
+            output=None, start=None, end=None, granularity=reports.Granularity.MONTH
+        )
+
+    import_seconds = _timed(do_import)
+    _label_transfers(db)
+    report_seconds = min(_timed(do_reports) for _ in range(3))
+
+    return {
+        "profile": profile,
+        "import (s)": import_seconds,
+        "rows/s": quantity / import_seconds,
+        "report all (s)": report_seconds,
+    }
+
+
+def main(
+    transactions: int = typer.Option(5000, help="Transactions imported per profile"),
+):
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            _run_profile(profile, transactions, Path(directory))
+            for profile in SQLITE_PROFILES
+        ]
+
+    print(f"{transactions} transactions at {datetime.now():%Y-%m-%d %H:%M}")
+    print(tabulate(results, headers="keys", tablefmt="psql", floatfmt=",.3f"))
+
+
+if __name__ == "__main__":
+    typer.run(main)
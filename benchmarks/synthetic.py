@@ -0,0 +1,305 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+    generate(db, SCALES["100k"])
+
+fills an empty database with companies and their namings, two years of
+transactions over every bank, month end balances, and NFEs with their product
+lines. A share of the payments carries the total of an NFE from the same company,
+so the matching queries have work to do. The same seed always gives the same rows
+"""
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert
+
+from fiscal.db import (
+    Balance,
+    Category,
+    Companies,
+    Company_Naming,
+    Database,
+    EntryType,
+    NFEs,
+    Products_Pricing,
+    Transactions,
+)
+from tests import nfe_factory
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+BANKS = ["bb", "itau", "inter", "rede"]
+
+FIRST_MONTH = datetime(2022, 1, 1)
+MONTHS = 24
+LAST_DAY = FIRST_MONTH + relativedelta(months=MONTHS) - timedelta(microseconds=1)
+
+# Rows per executemany
+CHUNK = 10_000
+
+NFES_PER_TRANSACTION = 0.2
+TRANSACTIONS_PER_COMPANY = 200
+MAX_PRODUCTS = 10
+
+COMPANY_CATEGORIES = [
+    Category.COMPRAS,
+    Category.INSUMOS,
+    Category.FRETE,
+    Category.MARKETING,
+    Category.SERVIÇOS_3,
+    Category.SISTEMAS,
+]
+
+UNITS = ["un", "cx", "kg", "lt", "pc"]
+
+# Card sales on rede and their deposits on itau, by brand
+CARD_BRANDS = ["mastercard", "visa", "elo"]
+ITAU_DEPOSITS = {
+    "débito": [
+        "rede   mast db093122470",
+        "rede   visa db093122470",
+        "rede   elo  db093122470",
+    ],
+    "crédito": ["rede  mc  093122470", "rede  vs  093122470", "rede  el  093122470"],
+}
+
+
+def _chunks(rows: Iterator[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(db: Database, model: type, rows: Iterator[dict[str, Any]]) -> None:
+    with db.engine.begin() as connection:
+        for chunk in _chunks(rows):
+            connection.execute(insert(model.__table__), chunk)
+
+
+def _date(rnd: random.Random) -> datetime:
+    seconds = int((LAST_DAY - FIRST_MONTH).total_seconds())
+    return FIRST_MONTH + timedelta(seconds=rnd.randrange(seconds))
+
+
+def companies(quantity: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "name": f"empresa {index:05}",
+            "cnpj": f"{10_000_000_000_000 + index:014}",
+            "default_category": COMPANY_CATEGORIES[
+                index % len(COMPANY_CATEGORIES)
+            ].value,
+        }
+        for index in range(quantity)
+    ]
+
+
+def namings(company_rows: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    """
+    Every company is known by its own name and by the name on its NFEs
+    """
+    for company in company_rows:
+        yield {"nickname": company["name"], "name": company["name"]}
+        yield {"nickname": f"{company['name']} ltda", "name": company["name"]}
+
+
+def nfes(
+    quantity: int, company_rows: list[dict[str, Any]], seed: int = 42, prefix: str = ""
+) -> Iterator[tuple[dict[str, Any], list[dict[str, Any]]]]:
+    """
+    NFEs and their product lines, whose values add up to the NFE total
+    """
+    rnd = random.Random(seed)
+
+    for index in range(quantity):
+        company = rnd.choice(company_rows)
+        codigo_acesso = f"{prefix}{index:0{44 - len(prefix)}}"
+        dt_emissao = _date(rnd)
+
+        products = []
+        for _ in range(rnd.randint(1, MAX_PRODUCTS)):
+            quantity_ = rnd.randint(1, 50)
+            unit_value = round(rnd.uniform(1, 200), 2)
+            products.append(
+                {
+                    "codigo_acesso": codigo_acesso,
+                    "name": f"produto {rnd.randrange(5_000):04}",
+                    "unit_value": f"{unit_value:.2f}",
+                    "total_value": f"{quantity_ * unit_value:.2f}",
+                    "quantity": f"{quantity_:.4f}",
+                    "unity": rnd.choice(UNITS),
+                    "dt_emissao": dt_emissao,
+                }
+            )
+
+        total = sum(float(product["total_value"]) for product in products)
+        yield (
+            {
+                "codigo_acesso": codigo_acesso,
+                "emissor": f"{company['name']} ltda",
+                "dt_emissao": dt_emissao,
+                "valor_liquido": f"{total:.2f}",
+                "valor_total": f"{total:.2f}",
+                "validated": False,
+                "description": ",".join(product["name"] for product in products),
+            },
+            products,
+        )
+
+
+def transactions(
+    quantity: int,
+    company_rows: list[dict[str, Any]],
+    nfe_rows: list[dict[str, Any]],
+    seed: int = 42,
+    prefix: str = "synthetic",
+) -> Iterator[dict[str, Any]]:
+    """
+    Transactions categorized the way handle_inserts would
+    """
+    rnd = random.Random(seed)
+    categories = {
+        company["name"]: company["default_category"] for company in company_rows
+    }
+
+    for index in range(quantity):
+        row = {
+            "bank": rnd.choice(BANKS),
+            "date": _date(rnd),
+            "validated": False,
+            "external_id": f"{prefix}-{index}",
+            "description": "synthetic",
+            "counterpart_name": None,
+        }
+        kind = rnd.random()
+
+        if kind < 0.45:
+            row |= {
+                "entry_type": EntryType.ENTRADA.value,
+                "transaction_type": rnd.choice(["pix", "crédito", "débito"]),
+                "category": Category.ENTRADA.value,
+                "value": round(rnd.uniform(5, 500), 2),
+            }
+            # Named the way the rede and itau imports do, for the settlement report
+            brand = index % len(CARD_BRANDS)
+            if row["bank"] == "rede" and row["transaction_type"] != "pix":
+                row["description"] = CARD_BRANDS[brand]
+            elif row["bank"] == "itau" and row["transaction_type"] != "pix":
+                row["description"] = ITAU_DEPOSITS[row["transaction_type"]][brand]
+        elif kind < 0.8:
+            # Payment to a supplier, half of them for the exact value of an NFE
+            if nfe_rows and rnd.random() < 0.5:
+                nfe = rnd.choice(nfe_rows)
+                name = nfe["emissor"].removesuffix(" ltda")
+                value = float(nfe["valor_total"])
+                row["date"] = nfe["dt_emissao"] + timedelta(days=rnd.randint(0, 30))
+            else:
+                name = rnd.choice(company_rows)["name"]
+                value = round(rnd.uniform(50, 5_000), 2)
+            row |= {
+                "entry_type": EntryType.SAIDA.value,
+                "transaction_type": rnd.choice(["pix", "pagamento"]),
+                "category": categories[name],
+                "counterpart_name": name,
+                "value": value,
+            }
+        elif kind < 0.9:
+            row |= {
+                "entry_type": EntryType.SAIDA.value,
+                "transaction_type": "tarifa",
+                "category": Category.BANCOS.value,
+                "value": round(rnd.uniform(1, 50), 2),
+            }
+        elif kind < 0.95:
+            row |= {
+                "entry_type": EntryType.SAIDA.value,
+                "transaction_type": "imposto",
+                "category": Category.IMPOSTO.value,
+                "value": round(rnd.uniform(100, 3_000), 2),
+            }
+        else:
+            # Transfers between our own banks are labeled by hand after the import
+            row |= {
+                "entry_type": rnd.choice(list(EntryType)).value,
+                "transaction_type": "pix",
+                "category": "transferencia",
+                "value": round(rnd.uniform(500, 10_000), 2),
+            }
+
+        yield row
+
+
+def balances() -> Iterator[dict[str, Any]]:
+    for month in range(-1, MONTHS):
+        month_end = FIRST_MONTH + relativedelta(months=month, day=31)
+        for bank in BANKS:
+            yield {"date": month_end.date(), "bank": bank, "balance": 100_000.0}
+
+
+def generate(db: Database, quantity: int, seed: int = 42) -> dict[str, int]:
+    """
+    Fill an empty database with `quantity` transactions and everything around them
+    """
+    company_rows = companies(max(10, quantity // TRANSACTIONS_PER_COMPANY))
+    nfe_with_products = list(
+        nfes(int(quantity * NFES_PER_TRANSACTION), company_rows, seed)
+    )
+    nfe_rows = [nfe for nfe, _ in nfe_with_products]
+
+    _insert(db, Companies, iter(company_rows))
+    _insert(db, Company_Naming, namings(company_rows))
+    _insert(db, NFEs, iter(nfe_rows))
+    _insert(
+        db,
+        Products_Pricing,
+        (product for _, products in nfe_with_products for product in products),
+    )
+    _insert(db, Transactions, transactions(quantity, company_rows, nfe_rows, seed))
+    _insert(db, Balance, balances())
+
+    return {
+        "companies": len(company_rows),
+        "nfes": len(nfe_rows),
+        "products": sum(len(products) for _, products in nfe_with_products),
+        "transactions": quantity,
+    }
+
+
+def new_transactions(
+    db: Database, quantity: int, seed: int
+) -> list[tuple[Transactions, str]]:
+    """
+    Transactions as an importer hands them to handle_inserts: known counterparts,
+    not categorized yet and not in the database. Transfers are left out, as
+    they would stop the import to ask for a counterpart
+    """
+    with db:
+        company_rows = [company.dict() for company in db.get_companies()]
+
+    rows = transactions(quantity, company_rows, [], seed, prefix=f"new-{seed}")
+    return [
+        (Transactions(**row | {"category": None}), "")
+        for row in rows
+        if row["category"] != "transferencia"
+    ]
+
+
+def nfe_zip(path: Path, quantity: int, seed: int, company_rows: list[dict[str, Any]]):
+    """
+    Zip of NFe XMLs from known companies, as exported by the accounting system
+    """
+    emitters = [
+        (f"{company['name']} ltda", company["cnpj"]) for company in company_rows
+    ]
+    nfes = nfe_factory.random_nfes(
+        quantity, emitters, seed, first_number=(seed % 1_000) * 100_000 + 1
+    )
+    nfe_factory.write_zip(path, nfes, seed)
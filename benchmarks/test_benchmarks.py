@@ -0,0 +1,136 @@
+"""
+Import, dedup, matching and report timings over synthetic data.
+
+    FISCAL_BENCH_SCALE=100k just bench
+
+Imports always add the same number of new rows, so what changes between scales
+is the size of the database they run against
+"""
+import itertools
+from datetime import datetime
+from functools import partial
+
+import pytest
+
+import synthetic
+from fiscal import reports
+from fiscal.auto_match import find_matches
+from fiscal.duplicates import find_duplicates
+from fiscal.fetcher import _remove_existent_transactions, handle_inserts
+from fiscal.match import BestMatch, MarketPlace
+from fiscal.settlement import reconcile
+from fiscal.transfers import find_transfers
+from fiscal.xmls_nfs import update_nfes
+
+IMPORT_SIZE = 1_000
+NFE_IMPORT_SIZE = 200
+
+LAST_MONTH = synthetic.LAST_DAY.replace(day=1, hour=0, minute=0, second=0)
+PERIOD = {
+    "start": datetime(LAST_MONTH.year, LAST_MONTH.month, 1),
+    "end": datetime(LAST_MONTH.year, LAST_MONTH.month, 1),
+    "granularity": reports.Granularity.MONTH,
+}
+YEAR = {
+    "start": datetime(LAST_MONTH.year, 1, 1),
+    "end": datetime(LAST_MONTH.year, 12, 1),
+    "granularity": reports.Granularity.MONTH,
+}
+
+REPORTS = {
+    "balances": partial(reports.diff_balance, **PERIOD),
+    "dre": partial(reports.dre, **PERIOD),
+    "transferencias": partial(reports.transfers, **PERIOD),
+    "consolidado": partial(reports.entradas_e_saidas_por_banco, **PERIOD),
+    "vendas": partial(reports.compare_itau_and_rede, **PERIOD),
+    "entradas": partial(reports.entradas, **PERIOD),
+    "saidas": partial(reports.saidas, **PERIOD),
+    "fornecedor": partial(reports.fornecedores, **PERIOD),
+    "tendencia": partial(reports.trend, **YEAR),
+    "all": partial(reports.report_all, output=None, **PERIOD),
+    "all-year": partial(reports.report_all, output=None, **YEAR),
+}
+
+
+def test_remove_existent_transactions(benchmark, db):
+    transactions = synthetic.new_transactions(db, IMPORT_SIZE, seed=1)
+
+    def run():
+        with db:
+            return _remove_existent_transactions(db, transactions)
+
+    assert len(benchmark(run)) == len(transactions)
+
+
+def test_handle_inserts(benchmark, db):
+    seeds = itertools.count(100)
+
+    def setup():
+        return (synthetic.new_transactions(db, IMPORT_SIZE, next(seeds)),), {}
+
+    def run(transactions):
+        with db:
+            handle_inserts(transactions, db)
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("match", [BestMatch, MarketPlace], ids=["best", "marketplace"])
+def test_match_query(benchmark, db, match):
+    def run():
+        with db:
+            return db.execute(match.query()).all()
+
+    benchmark(run)
+
+
+def test_find_matches(benchmark, db):
+    def run():
+        with db:
+            return find_matches(db)
+
+    confident, _ = benchmark(run)
+    assert confident
+
+
+def test_find_transfers(benchmark, db):
+    def run():
+        with db:
+            return find_transfers(db)
+
+    benchmark(run)
+
+
+def test_find_duplicates(benchmark, db):
+    def run():
+        with db:
+            return find_duplicates(db, days=1)
+
+    benchmark(run)
+
+
+def test_reconcile_year(benchmark, db):
+    def run():
+        with db:
+            return reconcile(db, YEAR["start"].date(), synthetic.LAST_DAY.date())
+
+    assert benchmark(run)
+
+
+@pytest.mark.parametrize("report", REPORTS)
+def test_report(benchmark, db, report):
+    benchmark(REPORTS[report])
+
+
+def test_update_nfes(benchmark, db, tmp_path):
+    with db:
+        company_rows = [company.dict() for company in db.get_companies()]
+    seeds = itertools.count(1_000)
+
+    def setup():
+        seed = next(seeds)
+        path = tmp_path / f"{seed}.zip"
+        synthetic.nfe_zip(path, NFE_IMPORT_SIZE, seed, company_rows)
+        return (str(path),), {}
+
+    benchmark.pedantic(update_nfes, setup=setup, rounds=3)
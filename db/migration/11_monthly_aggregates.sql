@@ -0,0 +1,60 @@
+-- liquibase formatted sql
+
+--changeset monthly_aggregates:1
+CREATE TABLE monthly_aggregates (
+    month TEXT NOT NULL,
+    bank TEXT NOT NULL,
+    category TEXT NOT NULL,
+    entry_type TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    counterparty TEXT NOT NULL,
+    value NUMERIC(25, 10) NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, bank, category, entry_type, transaction_type, counterparty)
+);
+INSERT INTO monthly_aggregates (month, bank, category, entry_type, transaction_type, counterparty, value, quantity)
+SELECT   COALESCE(strftime('%Y-%m', TRA.date), ''), COALESCE(TRA.bank, ''), COALESCE(TRA.category, ''), COALESCE(TRA.entry_type, ''), COALESCE(TRA.transaction_type, ''), COALESCE(TRA.counterpart_name, '')
+        ,SUM(COALESCE(TRA.value, 0))
+        ,COUNT(*)
+FROM "main"."transactions" as TRA
+GROUP BY 1, 2, 3, 4, 5, 6;
+--rollback DROP TABLE monthly_aggregates;
+
+--changeset monthly_aggregates:2 splitStatements:false
+CREATE TRIGGER monthly_aggregates_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_aggregates (month, bank, category, entry_type, transaction_type, counterparty, value, quantity)
+    VALUES (COALESCE(strftime('%Y-%m', NEW.date), ''), COALESCE(NEW.bank, ''), COALESCE(NEW.category, ''), COALESCE(NEW.entry_type, ''), COALESCE(NEW.transaction_type, ''), COALESCE(NEW.counterpart_name, ''), COALESCE(NEW.value, 0), 1)
+    ON CONFLICT (month, bank, category, entry_type, transaction_type, counterparty)
+    DO UPDATE SET value = value + excluded.value, quantity = quantity + 1;
+END;
+--rollback DROP TRIGGER monthly_aggregates_insert;
+
+--changeset monthly_aggregates:3 splitStatements:false
+CREATE TRIGGER monthly_aggregates_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_aggregates
+    SET value = value - COALESCE(OLD.value, 0), quantity = quantity - 1
+    WHERE month = COALESCE(strftime('%Y-%m', OLD.date), '') AND bank = COALESCE(OLD.bank, '') AND category = COALESCE(OLD.category, '') AND entry_type = COALESCE(OLD.entry_type, '') AND transaction_type = COALESCE(OLD.transaction_type, '') AND counterparty = COALESCE(OLD.counterpart_name, '');
+    DELETE FROM monthly_aggregates WHERE quantity <= 0 AND month = COALESCE(strftime('%Y-%m', OLD.date), '') AND bank = COALESCE(OLD.bank, '') AND category = COALESCE(OLD.category, '') AND entry_type = COALESCE(OLD.entry_type, '') AND transaction_type = COALESCE(OLD.transaction_type, '') AND counterparty = COALESCE(OLD.counterpart_name, '');
+END;
+--rollback DROP TRIGGER monthly_aggregates_delete;
+
+--changeset monthly_aggregates:4 splitStatements:false
+CREATE TRIGGER monthly_aggregates_update
+AFTER UPDATE OF date, bank, category, entry_type, transaction_type, counterpart_name, value
+ON transactions
+BEGIN
+    UPDATE monthly_aggregates
+    SET value = value - COALESCE(OLD.value, 0), quantity = quantity - 1
+    WHERE month = COALESCE(strftime('%Y-%m', OLD.date), '') AND bank = COALESCE(OLD.bank, '') AND category = COALESCE(OLD.category, '') AND entry_type = COALESCE(OLD.entry_type, '') AND transaction_type = COALESCE(OLD.transaction_type, '') AND counterparty = COALESCE(OLD.counterpart_name, '');
+    DELETE FROM monthly_aggregates WHERE quantity <= 0 AND month = COALESCE(strftime('%Y-%m', OLD.date), '') AND bank = COALESCE(OLD.bank, '') AND category = COALESCE(OLD.category, '') AND entry_type = COALESCE(OLD.entry_type, '') AND transaction_type = COALESCE(OLD.transaction_type, '') AND counterparty = COALESCE(OLD.counterpart_name, '');
+
+    INSERT INTO monthly_aggregates (month, bank, category, entry_type, transaction_type, counterparty, value, quantity)
+    VALUES (COALESCE(strftime('%Y-%m', NEW.date), ''), COALESCE(NEW.bank, ''), COALESCE(NEW.category, ''), COALESCE(NEW.entry_type, ''), COALESCE(NEW.transaction_type, ''), COALESCE(NEW.counterpart_name, ''), COALESCE(NEW.value, 0), 1)
+    ON CONFLICT (month, bank, category, entry_type, transaction_type, counterparty)
+    DO UPDATE SET value = value + excluded.value, quantity = quantity + 1;
+END;
+--rollback DROP TRIGGER monthly_aggregates_update;
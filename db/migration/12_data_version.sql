@@ -0,0 +1,9 @@
+-- liquibase formatted sql
+
+--changeset data_version:1
+CREATE TABLE data_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT INTO data_version (id, version) VALUES (1, 0);
+--rollback DROP TABLE data_version;
@@ -0,0 +1,11 @@
+-- liquibase formatted sql
+
+--changeset validation_batches:1
+ALTER TABLE validations ADD COLUMN batch TEXT;
+--rollback ALTER TABLE validations DROP COLUMN batch;
+
+--changeset validation_batches:2
+CREATE INDEX ix_validations_created_at ON validations (created_at);
+CREATE INDEX ix_validations_batch ON validations (batch);
+--rollback DROP INDEX ix_validations_created_at;
+--rollback DROP INDEX ix_validations_batch;
@@ -0,0 +1,88 @@
+-- liquibase formatted sql
+
+--changeset rede_sales:1
+CREATE TABLE rede_sales (
+    external_id TEXT PRIMARY KEY,
+    sale_date DATE NOT NULL,
+    brand TEXT NOT NULL,
+    modality TEXT NOT NULL,
+    installments INTEGER NOT NULL,
+    nsu INTEGER,
+    amount INTEGER NOT NULL,
+    net_amount INTEGER NOT NULL,
+    mdr_amount INTEGER NOT NULL,
+    fee_total FLOAT NOT NULL
+);
+--rollback DROP TABLE rede_sales;
+
+--changeset rede_sales:2
+CREATE TABLE rede_fees_daily (
+    day DATE NOT NULL,
+    brand TEXT NOT NULL,
+    modality TEXT NOT NULL,
+    sales INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    net_amount INTEGER NOT NULL,
+    mdr_amount INTEGER NOT NULL,
+    PRIMARY KEY (day, brand, modality)
+);
+--rollback DROP TABLE rede_fees_daily;
+
+--changeset rede_sales:3 splitStatements:false
+CREATE TRIGGER rede_fees_daily_insert
+AFTER INSERT ON rede_sales
+BEGIN
+    INSERT INTO rede_fees_daily
+        (day, brand, modality, sales, amount, net_amount, mdr_amount)
+    VALUES
+        (NEW.sale_date, NEW.brand, NEW.modality, 1,
+         NEW.amount, NEW.net_amount, NEW.mdr_amount)
+    ON CONFLICT (day, brand, modality)
+    DO UPDATE SET sales = sales + 1,
+                  amount = amount + excluded.amount,
+                  net_amount = net_amount + excluded.net_amount,
+                  mdr_amount = mdr_amount + excluded.mdr_amount;
+END;
+--rollback DROP TRIGGER rede_fees_daily_insert;
+
+--changeset rede_sales:4 splitStatements:false
+CREATE TRIGGER rede_fees_daily_delete
+AFTER DELETE ON rede_sales
+BEGIN
+    UPDATE rede_fees_daily
+    SET sales = sales - 1,
+        amount = amount - OLD.amount,
+        net_amount = net_amount - OLD.net_amount,
+        mdr_amount = mdr_amount - OLD.mdr_amount
+    WHERE day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+    DELETE FROM rede_fees_daily
+    WHERE sales <= 0
+        AND day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+END;
+--rollback DROP TRIGGER rede_fees_daily_delete;
+
+--changeset rede_sales:5 splitStatements:false
+CREATE TRIGGER rede_fees_daily_update
+AFTER UPDATE ON rede_sales
+BEGIN
+    UPDATE rede_fees_daily
+    SET sales = sales - 1,
+        amount = amount - OLD.amount,
+        net_amount = net_amount - OLD.net_amount,
+        mdr_amount = mdr_amount - OLD.mdr_amount
+    WHERE day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+    DELETE FROM rede_fees_daily
+    WHERE sales <= 0
+        AND day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+    INSERT INTO rede_fees_daily
+        (day, brand, modality, sales, amount, net_amount, mdr_amount)
+    VALUES
+        (NEW.sale_date, NEW.brand, NEW.modality, 1,
+         NEW.amount, NEW.net_amount, NEW.mdr_amount)
+    ON CONFLICT (day, brand, modality)
+    DO UPDATE SET sales = sales + 1,
+                  amount = amount + excluded.amount,
+                  net_amount = net_amount + excluded.net_amount,
+                  mdr_amount = mdr_amount + excluded.mdr_amount;
+END;
+--rollback DROP TRIGGER rede_fees_daily_update;
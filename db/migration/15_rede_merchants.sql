@@ -0,0 +1,7 @@
+-- liquibase formatted sql
+
+--changeset rede_merchants:1
+ALTER TABLE rede_sales ADD COLUMN merchant TEXT NOT NULL DEFAULT '93122470';
+CREATE INDEX ix_rede_sales_merchant ON rede_sales (merchant);
+--rollback DROP INDEX ix_rede_sales_merchant;
+--rollback ALTER TABLE rede_sales DROP COLUMN merchant;
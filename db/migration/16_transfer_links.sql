@@ -0,0 +1,11 @@
+-- liquibase formatted sql
+
+--changeset transfer_links:1
+CREATE TABLE transfer_links (
+    saida INTEGER PRIMARY KEY,
+    entrada INTEGER NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(saida) REFERENCES transactions(id),
+    FOREIGN KEY(entrada) REFERENCES transactions(id)
+);
+--rollback DROP TABLE transfer_links;
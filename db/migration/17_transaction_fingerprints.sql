@@ -0,0 +1,9 @@
+-- liquibase formatted sql
+
+--changeset transaction_fingerprints:1
+ALTER TABLE transactions ADD COLUMN fingerprint TEXT;
+--rollback ALTER TABLE transactions DROP COLUMN fingerprint;
+
+--changeset transaction_fingerprints:2
+CREATE INDEX ix_transactions_fingerprint ON transactions (fingerprint);
+--rollback DROP INDEX ix_transactions_fingerprint;
@@ -0,0 +1,249 @@
+"""
+Match NFEs and payments of the same company and value without asking.
+
+Unvalidated NFEs and transactions are grouped by canonical company name and
+value in cents. Within a group an NFE and a payment further apart than the
+window are not candidates, and the one-to-one pairing with the most matches
+and then the smallest total date difference wins.
+
+A pair is confident when no other best pairing of its group leaves it out: two
+NFEs and two payments of the same value a few days apart can be paired either
+way, so neither pairing is applied. Those are left for `fiscal match`
+"""
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+import typer
+from tabulate import tabulate
+
+from fiscal import profiling
+from fiscal.db import Database
+from fiscal.match import BaseMatch, match, new_batch
+
+# Days between the NFE and the payment
+WINDOW_DAYS = 45
+
+# Total day differences closer than this are a tie
+TOLERANCE = 1e-6
+
+# Larger groups are only paired for review, proving each pair is forced costs
+# a full assignment per pair
+MAX_GROUP_EDGES = 400
+
+NFE_CANDIDATES = """
+SELECT   NFE.codigo_acesso
+        ,EMISSOR.name
+        ,CAST(ROUND(NFE.valor_total * 100) AS INTEGER)
+        ,NFE.dt_emissao
+        ,julianday(NFE.dt_emissao)
+FROM "main"."nfes" as NFE
+    JOIN "company_naming" as EMISSOR ON EMISSOR.nickname == NFE.emissor
+WHERE NFE.validated == 0
+"""
+
+TRANSACTION_CANDIDATES = """
+SELECT   TRA.id
+        ,CPART.name
+        ,CAST(ROUND(TRA.value * 100) AS INTEGER)
+        ,TRA.date
+        ,julianday(TRA.date)
+FROM "main"."transactions" as TRA
+    JOIN "company_naming" as CPART ON CPART.nickname == TRA.counterpart_name
+WHERE TRA.validated == 0
+"""
+
+
+class Candidate(NamedTuple):
+    key: str | int
+    name: str
+    cents: int
+    date: str
+    day: float
+
+
+class Pair(NamedTuple):
+    nfe: Candidate
+    transaction: Candidate
+
+    @property
+    def days(self) -> float:
+        return abs(self.nfe.day - self.transaction.day)
+
+    def row(self) -> dict[str, object]:
+        return {
+            "Emissor": self.nfe.name,
+            "Valor": self.nfe.cents / 100,
+            "Emissão": self.nfe.date[:10],
+            "Transação": self.transaction.date[:10],
+            "Diff": round(self.days),
+            "Codigo": self.nfe.key,
+            "Id": self.transaction.key,
+        }
+
+
+Score = tuple[int, float]
+Edges = dict[tuple[int, int], float]
+
+
+def _assignment(edges: Edges, rows: int) -> tuple[Score, list[tuple[int, int]]]:
+    """
+    Matching of rows to columns over `edges` (pair -> days) with the most pairs
+    and, among those, the smallest total. Returns (pairs, total) and the pairs.
+
+    Successive shortest augmenting paths: every round adds the pair of free
+    nodes whose alternating path costs the least, found with Bellman-Ford
+    """
+    row_of: dict[int, int] = {}
+    column_of: dict[int, int] = {}
+    total = 0.0
+
+    while True:
+        distance = {row: 0.0 for row in range(rows) if row not in column_of}
+        reached: dict[int, float] = {}
+        parent: dict[int, int] = {}
+
+        changed = True
+        while changed:
+            changed = False
+            for (row, column), days in edges.items():
+                if row not in distance or column_of.get(row) == column:
+                    continue
+                cost = distance[row] + days
+                if cost >= reached.get(column, float("inf")) - TOLERANCE:
+                    continue
+                reached[column] = cost
+                parent[column] = row
+                changed = True
+                # Going on through the row the column is matched to
+                if column in row_of:
+                    matched = row_of[column]
+                    back = cost - edges[(matched, column)]
+                    if back < distance.get(matched, float("inf")) - TOLERANCE:
+                        distance[matched] = back
+
+        free = [column for column in reached if column not in row_of]
+        if not free:
+            break
+
+        column = min(free, key=lambda column: (reached[column], column))
+        total += reached[column]
+        while True:
+            row = parent[column]
+            previous = column_of.get(row)
+            row_of[column] = row
+            column_of[row] = column
+            if previous is None:
+                break
+            del row_of[previous]
+            column = previous
+
+    pairs = sorted(column_of.items())
+    return (len(pairs), total), pairs
+
+
+def _same_score(first: Score, second: Score) -> bool:
+    return first[0] == second[0] and abs(first[1] - second[1]) < TOLERANCE
+
+
+def solve_group(
+    nfes: list[Candidate], transactions: list[Candidate], window: float
+) -> tuple[list[Pair], list[Pair]]:
+    """
+    Best pairing of one company and value, split into confident and ambiguous
+    """
+    nfes = sorted(nfes, key=lambda nfe: (nfe.day, nfe.key))
+    transactions = sorted(transactions, key=lambda tra: (tra.day, tra.key))
+
+    edges = {
+        (i, j): abs(nfe.day - transaction.day)
+        for i, nfe in enumerate(nfes)
+        for j, transaction in enumerate(transactions)
+        if abs(nfe.day - transaction.day) <= window
+    }
+    score, pairing = _assignment(edges, len(nfes))
+    pairs = [Pair(nfes[i], transactions[j]) for i, j in pairing]
+
+    if len(edges) > MAX_GROUP_EDGES:
+        return [], pairs
+
+    confident, ambiguous = [], []
+    for (i, j), pair in zip(pairing, pairs):
+        # Forced unless the group does as well without it
+        without, _ = _assignment(
+            {edge: days for edge, days in edges.items() if edge != (i, j)}, len(nfes)
+        )
+        (ambiguous if _same_score(score, without) else confident).append(pair)
+
+    return confident, ambiguous
+
+
+def _group(rows: Iterable[tuple]) -> dict[tuple[str, int], list[Candidate]]:
+    groups: dict[tuple[str, int], list[Candidate]] = defaultdict(list)
+    for row in rows:
+        candidate = Candidate(*row)
+        groups[(candidate.name, candidate.cents)].append(candidate)
+    return groups
+
+
+def find_matches(
+    db: Database, window: float = WINDOW_DAYS
+) -> tuple[list[Pair], list[Pair]]:
+    """
+    Confident and ambiguous pairs over every unvalidated NFE and transaction
+    """
+    with profiling.stage("candidates"):
+        nfes = _group(db.execute(NFE_CANDIDATES).all())
+        transactions = _group(db.execute(TRANSACTION_CANDIDATES).all())
+
+    confident, ambiguous = [], []
+    with profiling.stage("assign"):
+        for key in nfes.keys() & transactions.keys():
+            sure, unsure = solve_group(nfes[key], transactions[key], window)
+            confident += sure
+            ambiguous += unsure
+
+    return confident, ambiguous
+
+
+def auto_match(
+    window: int = typer.Option(WINDOW_DAYS, help="Days between NFE and payment"),
+    dry_run: bool = typer.Option(False, help="Only show the confident matches"),
+    review: bool = typer.Option(True, help="Review what is left with `match`"),
+):
+    db = Database.from_default()
+
+    with db:
+        confident, ambiguous = find_matches(db, window)
+        confident.sort(key=lambda pair: (pair.nfe.name, pair.nfe.day))
+
+        if confident:
+            print(
+                tabulate(
+                    [pair.row() for pair in confident],
+                    headers="keys",
+                    tablefmt="psql",
+                    floatfmt=".2f",
+                )
+            )
+
+        batch = new_batch("auto-match")
+        if not dry_run:
+            # All in the same database transaction
+            BaseMatch.act_all(
+                db,
+                [
+                    BaseMatch(
+                        codigo_acesso=str(pair.nfe.key), id=int(pair.transaction.key)
+                    )
+                    for pair in confident
+                ],
+                batch,
+            )
+
+    verb = "Would match" if dry_run else "Matched"
+    print(f"{verb} {len(confident)}, {len(ambiguous)} ambiguous left for review")
+    if confident and not dry_run:
+        print(f"Undo with `fiscal transaction undo --batch {batch}`")
+
+    if review and ambiguous and not dry_run:
+        match()
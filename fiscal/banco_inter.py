@@ -3,20 +3,34 @@ from enum import Enum
 
 import requests
 import typer
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from pydantic import parse_obj_as
 from responses import _recorder
 from sqlmodel import select
 from typing_extensions import Self
 
-from fiscal import fetcher
+from fiscal import fetcher, profiling
+from fiscal.transport import Transport
 from fiscal.db import DATE_FORMAT, Balance, Database, EntryType, Transactions
+from fiscal.landing import Landing
 from fiscal.reports import first_day_of_month, last_day_of_month
 
-URL_OAUTH = "https://cdpj.partners.bancointer.com.br/oauth/v2/token"
-URL_EXTRATO = "https://cdpj.partners.bancointer.com.br/banking/v2/extrato/completo"
-URL_SALDO = "https://cdpj.partners.bancointer.com.br/banking/v2/saldo"
-URL_PAGAMENTOS = "https://cdpj.partners.bancointer.com.br/banking/v2/pagamento"
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+INTER_URL = "https://cdpj.partners.bancointer.com.br"
+PATH_OAUTH = "/oauth/v2/token"
+PATH_EXTRATO = "/banking/v2/extrato/completo"
+PATH_SALDO = "/banking/v2/saldo"
+PATH_PAGAMENTOS = "/banking/v2/pagamento"
+
+# Client certificate and key issued by Inter for the API
+INTER_CERT = ("certificado.crt", "chave.key")
+
+# Requests per second to the Inter API
+INTER_RATE_LIMIT = 5.0
 
 INTER_BANK = "inter"
 
@@ -150,6 +164,20 @@ class PixTransacao(BaseModel):
         anystr_lower = True
 
 
+# Model of `detalhes` for each (lower cased) `tipoTransacao`. `tipoDetalhe` only
+# says how complete the details are, so it can't pick the model. Details of any
+# other type are kept as they came
+DETALHES: dict[str, type[BaseModel]] = {
+    "pix": PixTransacao,
+    "transferencia": TransferenciaTransacao,
+    "boleto_cobranca": BoletoTransacao,
+    "cheque": ChequeTransacao,
+    "compra_debito": DebitoTransacao,
+    "deposito_boleto": DepositoTransacao,
+    "pagamento": PagamentoTransacao,
+}
+
+
 class Transaction(BaseModel):
     idTransacao: str
     dataInclusao: datetime
@@ -159,10 +187,19 @@ class Transaction(BaseModel):
     valor: str
     titulo: str
     descricao: str
-    detalhes: PixTransacao | TransferenciaTransacao | BoletoTransacao | ChequeTransacao | DebitoTransacao | DepositoTransacao | PagamentoTransacao | None
+    detalhes: PixTransacao | TransferenciaTransacao | BoletoTransacao | ChequeTransacao | DebitoTransacao | DepositoTransacao | PagamentoTransacao | dict | None
 
     class Config:
         anystr_lower = True
+        # Keep the model picked by _parse_detalhes instead of trying each one
+        smart_union = True
+
+    @validator("detalhes", pre=True)
+    def _parse_detalhes(cls, detalhes, values):
+        model = DETALHES.get(values.get("tipoTransacao", ""))
+        if model is None or not isinstance(detalhes, dict):
+            return detalhes
+        return model.parse_obj(detalhes)
 
 
 class GetTransactions(BaseModel):
@@ -176,6 +213,7 @@ class GetTransactions(BaseModel):
 
     class Config:
         anystr_lower = True
+        json_loads = json_loads
 
 
 class GetBalance(BaseModel):
@@ -205,12 +243,20 @@ class GetPaymentTransaction(BaseModel):
 class InterBank:
     bearer_token: str | None
 
-    def __init__(self) -> None:
-        self._session = requests.session()
+    def __init__(
+        self,
+        base_url: str = INTER_URL,
+        cert: tuple[str, str] | None = INTER_CERT,
+        transport: Transport | None = None,
+        landing: Landing | None = None,
+    ) -> None:
+        self.base_url = base_url
+        self.landing = landing
+        self._session = transport or Transport(cert=cert, rate_limit=INTER_RATE_LIMIT)
 
     @classmethod
-    def from_secrets(cls, client_id: str, client_secret: str) -> Self:
-        client = cls()
+    def from_secrets(cls, client_id: str, client_secret: str, **kwargs) -> Self:
+        client = cls(**kwargs)
         client.authenticate(client_id, client_secret)
         return client
 
@@ -223,9 +269,8 @@ class InterBank:
         }
 
         resp = self._session.post(
-            url=URL_OAUTH,
+            url=self.base_url + PATH_OAUTH,
             data=headers,
-            cert=("certificado.crt", "chave.key"),
         )
 
         resp.raise_for_status()
@@ -276,7 +321,7 @@ class InterBank:
         There is a need to get information from two endpoints: 'extrato' and 'Pagamento'
         """
         pagina = 0
-        content = self._get_endpoint(URL_EXTRATO, start_date, end_date, pagina)
+        content = self._get_endpoint(PATH_EXTRATO, start_date, end_date, pagina)
         return parse_obj_as(list[GetPaymentTransaction], content)
 
     def _get_extrato(
@@ -285,7 +330,11 @@ class InterBank:
         """
         Should paginate requests here
         """
-        content = self._get_endpoint(URL_EXTRATO, start_date, end_date, pagina)
+        content = self._get_endpoint(PATH_EXTRATO, start_date, end_date, pagina)
+        if self.landing:
+            self.landing.save(
+                INTER_BANK, "extrato", start_date, end_date, pagina or 0, content
+            )
         return GetTransactions.parse_raw(content)
 
 
@@ -304,12 +353,11 @@ class InterBank:
             params["pagina"] = str(pagina)
 
         resp = self._session.get(
-            endpoint,
+            self.base_url + endpoint,
             headers={
                 "Authorization": self.bearer_token,
             },
             params=params,
-            cert=("certificado.crt", "chave.key"),
         )
 
         try:
@@ -317,21 +365,18 @@ class InterBank:
         except requests.HTTPError as err:
             print(resp.content)
             raise err
-        
-        print(resp.content)
 
         return resp.content
 
     def _get_balance(self, date: datetime) -> GetBalance:
         resp = self._session.get(
-            URL_SALDO,
+            self.base_url + PATH_SALDO,
             headers={
                 "Authorization": self.bearer_token,
             },
             params={
                 "dataSaldo": date.date().strftime(DATE_FORMAT),
             },
-            cert=("certificado.crt", "chave.key"),
         )
 
         resp.raise_for_status()
@@ -370,10 +415,11 @@ def test_recorder():
 
 def _convert_transaction(transaction: Transaction) -> tuple[Transactions, str]:
     cnpj = ""
-    if isinstance(transaction.detalhes, PixTransacao) and hasattr(
-        transaction.detalhes, "cpfCnpjRecebedor"
-    ):
+    counterpart_name = transaction.descricao
+    # Pix and transfers name who received them
+    if isinstance(transaction.detalhes, (PixTransacao, TransferenciaTransacao)):
         cnpj = transaction.detalhes.cpfCnpjRecebedor or ""
+        counterpart_name = transaction.detalhes.nomeRecebedor
 
     return (
         Transactions(
@@ -384,7 +430,7 @@ def _convert_transaction(transaction: Transaction) -> tuple[Transactions, str]:
             category=None,
             description=transaction.descricao,
             value=transaction.valor,
-            counterpart_name= transaction.detalhes.nomeRecebedor if isinstance(transaction .detalhes, PixTransacao) else transaction.descricao,
+            counterpart_name=counterpart_name,
             validated=False,
             external_id=transaction.idTransacao,
         ),
@@ -439,11 +485,14 @@ def update_banco_inter(
 ):
     db = Database.from_default()
 
-    client = InterBank.from_secrets(client_id=client_id, client_secret=client_secret)
+    client = InterBank.from_secrets(
+        client_id=client_id, client_secret=client_secret, landing=Landing.from_db(db)
+    )
 
     with db:
         _update_balance(client, db)
-        transactions = _get_transactions(db=db, client=client)
+        with profiling.stage("fetch"):
+            transactions = _get_transactions(db=db, client=client)
         fetcher.handle_inserts(transactions, db)
 
 
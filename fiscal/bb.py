@@ -7,6 +7,7 @@ import typer
 from sqlmodel import select
 from tabulate import tabulate
 
+from fiscal import profiling
 from fiscal.db import DATE_FORMAT, Balance, Database, EntryType, Transactions
 from fiscal.fetcher import handle_inserts
 from fiscal.reports import last_day_of_month
@@ -191,9 +192,12 @@ def _update_balance(db: Database, balance: float):
 def update_bb(xlsx_path: str):
     """Update banco do brasil"""
 
-    d_f, balance = _get_dataframe(xlsx_path=xlsx_path)
-    print(tabulate(d_f, headers="keys", tablefmt="psql"))
-    transactions = [_parse_row(row) for _, row in d_f.iterrows()]
+    with profiling.stage("read"):
+        d_f, balance = _get_dataframe(xlsx_path=xlsx_path)
+    with profiling.stage("render"):
+        print(tabulate(d_f, headers="keys", tablefmt="psql"))
+    with profiling.stage("parse"):
+        transactions = [_parse_row(row) for _, row in d_f.iterrows()]
 
     db = Database.from_default()
     with db:
@@ -0,0 +1,73 @@
+"""
+On disk cache of rendered reports.
+
+Entries are keyed by the report, its parameters and the data version of the
+database, so any commit that writes through `Database` invalidates them.
+Set FISCAL_REPORT_CACHE=off to always render from the database
+"""
+import contextlib
+import hashlib
+import io
+import os
+from pathlib import Path
+from typing import Any, Callable
+
+from fiscal import profiling
+from fiscal.db import Database
+
+CACHE_DIR_NAME = ".report_cache"
+
+
+def _cache_dir(db: Database) -> Path | None:
+    # read only engines open the file through an sqlite URI
+    database = (db.engine.url.database or "").removeprefix("file:")
+
+    if not database or database == ":memory:":
+        return None
+    if os.environ.get("FISCAL_REPORT_CACHE", "on") == "off":
+        return None
+
+    return Path(database).parent / CACHE_DIR_NAME
+
+
+def _capture(printer: Callable[[], None]) -> str:
+    buffer = io.StringIO()
+    with profiling.stage("render"), contextlib.redirect_stdout(buffer):
+        printer()
+    return buffer.getvalue()
+
+
+def render(
+    db: Database, report: str, params: tuple[Any, ...], printer: Callable[[], None]
+) -> str:
+    """
+    Return what `printer` prints, from the cache when the data did not change since
+    """
+    directory = _cache_dir(db)
+    if directory is None:
+        return _capture(printer)
+
+    with db:
+        version = db.get_data_version()
+
+    digest = hashlib.sha256(repr(params).encode()).hexdigest()[:16]
+    path = directory / f"{report}-{version}-{digest}.txt"
+
+    if path.exists():
+        return path.read_text()
+
+    content = _capture(printer)
+
+    directory.mkdir(exist_ok=True)
+    for stale in directory.glob(f"{report}-*.txt"):
+        if not stale.name.startswith(f"{report}-{version}-"):
+            stale.unlink()
+    path.write_text(content)
+
+    return content
+
+
+def show(
+    db: Database, report: str, params: tuple[Any, ...], printer: Callable[[], None]
+) -> None:
+    print(render(db, report, params, printer), end="")
@@ -1,18 +1,23 @@
 import os
+import threading
 from datetime import date, datetime
 from enum import Enum
+from functools import partial
 from pathlib import Path
 from typing import Any, TypeVar
 
+import pandas as pd
 from pandas.core.common import contextlib
 from sqlalchemy import event, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Field, Relationship, Session, SQLModel, create_engine, select
 from sqlmodel.sql.expression import SelectOfScalar
 
 DB_PATH = str(Path(__file__).parent.parent /"fiscal.db")
 
 DATE_FORMAT = "%Y-%m-%d"
+MONTH_FORMAT = "%Y-%m"
 
 
 class EntryType(str, Enum):
@@ -69,6 +74,8 @@ class Transactions(SQLModel, table=True):
     counterpart_name: str | None
     validated: bool
     external_id: str
+    # Content hash numbered by occurrence, see fiscal.duplicates
+    fingerprint: str | None = Field(default=None, index=True)
 
     class Config:
         anystr_lower = True
@@ -137,11 +144,226 @@ class Validations(SQLModel, table=True):
     codigo_acesso: str = Field(
         default=None, primary_key=True, foreign_key=NFEs.codigo_acesso
     )
+    created_at: datetime | None = Field(
+        default=None,
+        index=True,
+        sa_column_kwargs={"server_default": text("CURRENT_TIMESTAMP")},
+    )
+    # Matching session the validation was accepted in
+    batch: str | None = Field(default=None, index=True)
 
     class Config:
         anystr_lower = True
 
 
+class Transfer_Links(SQLModel, table=True):
+    """
+    Saída in one of our banks and the entrada it became in another one
+    """
+
+    saida: int = Field(default=None, primary_key=True, foreign_key=Transactions.id)
+    entrada: int = Field(
+        default=None, unique=True, nullable=False, foreign_key=Transactions.id
+    )
+    created_at: datetime | None = Field(
+        default=None,
+        sa_column_kwargs={"server_default": text("CURRENT_TIMESTAMP")},
+    )
+
+
+class Monthly_Aggregates(SQLModel, table=True):
+    """
+    Sum of transactions per month and report dimensions.
+
+    Maintained by triggers on `transactions`, empty dimensions are stored as ''
+    """
+
+    month: str = Field(default=None, primary_key=True)
+    bank: str = Field(default=None, primary_key=True)
+    category: str = Field(default=None, primary_key=True)
+    entry_type: str = Field(default=None, primary_key=True)
+    transaction_type: str = Field(default=None, primary_key=True)
+    counterparty: str = Field(default=None, primary_key=True)
+    value: float
+    quantity: int
+
+
+AGGREGATE_KEY_COLUMNS = (
+    "month, bank, category, entry_type, transaction_type, counterparty"
+)
+
+
+def _aggregate_key(row: str) -> list[str]:
+    return [
+        f"COALESCE(strftime('%Y-%m', {row}.date), '')",
+        f"COALESCE({row}.bank, '')",
+        f"COALESCE({row}.category, '')",
+        f"COALESCE({row}.entry_type, '')",
+        f"COALESCE({row}.transaction_type, '')",
+        f"COALESCE({row}.counterpart_name, '')",
+    ]
+
+
+_AGGREGATE_ADD = f"""
+    INSERT INTO monthly_aggregates ({AGGREGATE_KEY_COLUMNS}, value, quantity)
+    VALUES ({", ".join(_aggregate_key("NEW"))}, COALESCE(NEW.value, 0), 1)
+    ON CONFLICT ({AGGREGATE_KEY_COLUMNS})
+    DO UPDATE SET value = value + excluded.value, quantity = quantity + 1;
+"""
+
+_OLD_KEY = " AND ".join(
+    f"{column.strip()} = {expression}"
+    for column, expression in zip(
+        AGGREGATE_KEY_COLUMNS.split(","), _aggregate_key("OLD")
+    )
+)
+
+_AGGREGATE_REMOVE = f"""
+    UPDATE monthly_aggregates
+    SET value = value - COALESCE(OLD.value, 0), quantity = quantity - 1
+    WHERE {_OLD_KEY};
+    DELETE FROM monthly_aggregates WHERE quantity <= 0 AND {_OLD_KEY};
+"""
+
+MONTHLY_AGGREGATES_TRIGGERS = [
+    f"""
+CREATE TRIGGER IF NOT EXISTS monthly_aggregates_insert
+AFTER INSERT ON transactions
+BEGIN{_AGGREGATE_ADD}END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS monthly_aggregates_delete
+AFTER DELETE ON transactions
+BEGIN{_AGGREGATE_REMOVE}END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS monthly_aggregates_update
+AFTER UPDATE OF date, bank, category, entry_type, transaction_type, counterpart_name, value
+ON transactions
+BEGIN{_AGGREGATE_REMOVE}{_AGGREGATE_ADD}END
+""",
+]
+
+MONTHLY_AGGREGATES_FROM_TRANSACTIONS = f"""
+SELECT   {", ".join(_aggregate_key("TRA"))}
+        ,SUM(COALESCE(TRA.value, 0))
+        ,COUNT(*)
+FROM "main"."transactions" as TRA
+GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+
+class Rede_Sales(SQLModel, table=True):
+    """
+    Fees and net amount of each Rede card sale, amounts in cents.
+
+    Keyed by the external_id of the sale's transaction
+    """
+
+    external_id: str = Field(primary_key=True)
+    # Rede company number of the store that made the sale
+    merchant: str = Field(index=True)
+    sale_date: date
+    brand: str
+    modality: str
+    installments: int
+    nsu: int | None
+    amount: int
+    net_amount: int
+    mdr_amount: int
+    # Percentage Rede charged on the sale
+    fee_total: float
+
+
+class Rede_Fees_Daily(SQLModel, table=True):
+    """
+    Sum of rede_sales per day, brand and modality, amounts in cents.
+
+    Maintained by triggers on `rede_sales`
+    """
+
+    day: date = Field(default=None, primary_key=True)
+    brand: str = Field(default=None, primary_key=True)
+    modality: str = Field(default=None, primary_key=True)
+    sales: int
+    amount: int
+    net_amount: int
+    mdr_amount: int
+
+
+_REDE_FEES_ADD = """
+    INSERT INTO rede_fees_daily
+        (day, brand, modality, sales, amount, net_amount, mdr_amount)
+    VALUES
+        (NEW.sale_date, NEW.brand, NEW.modality, 1,
+         NEW.amount, NEW.net_amount, NEW.mdr_amount)
+    ON CONFLICT (day, brand, modality)
+    DO UPDATE SET sales = sales + 1,
+                  amount = amount + excluded.amount,
+                  net_amount = net_amount + excluded.net_amount,
+                  mdr_amount = mdr_amount + excluded.mdr_amount;
+"""
+
+_REDE_FEES_REMOVE = """
+    UPDATE rede_fees_daily
+    SET sales = sales - 1,
+        amount = amount - OLD.amount,
+        net_amount = net_amount - OLD.net_amount,
+        mdr_amount = mdr_amount - OLD.mdr_amount
+    WHERE day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+    DELETE FROM rede_fees_daily
+    WHERE sales <= 0
+        AND day = OLD.sale_date AND brand = OLD.brand AND modality = OLD.modality;
+"""
+
+REDE_FEES_TRIGGERS = [
+    f"""
+CREATE TRIGGER IF NOT EXISTS rede_fees_daily_insert
+AFTER INSERT ON rede_sales
+BEGIN{_REDE_FEES_ADD}END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS rede_fees_daily_delete
+AFTER DELETE ON rede_sales
+BEGIN{_REDE_FEES_REMOVE}END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS rede_fees_daily_update
+AFTER UPDATE ON rede_sales
+BEGIN{_REDE_FEES_REMOVE}{_REDE_FEES_ADD}END
+""",
+]
+
+
+class Data_Version(SQLModel, table=True):
+    """
+    Single row counter bumped on every commit that wrote through `Database`
+    """
+
+    id: int = Field(default=None, primary_key=True)
+    version: int
+
+
+BUMP_DATA_VERSION = """
+INSERT INTO data_version (id, version) VALUES (1, 1)
+ON CONFLICT (id) DO UPDATE SET version = version + 1
+"""
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def create_monthly_aggregates_triggers(_, connection, **__):
+    for trigger in MONTHLY_AGGREGATES_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def create_rede_fees_triggers(_, connection, **__):
+    for trigger in REDE_FEES_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, _):
     cursor = dbapi_connection.cursor()
@@ -149,17 +371,121 @@ def set_sqlite_pragma(dbapi_connection, _):
     cursor.close()
 
 
+# Pragmas applied on every new connection, selected with FISCAL_DB_PROFILE
+SQLITE_PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+# Applied on top of the profile for connections opened with read_only=True
+READ_ONLY_PRAGMAS: dict[str, str | int] = {"query_only": "ON", "busy_timeout": 5000}
+
+READ_ONLY_POOL_SIZE = 4
+
+
+def _set_profile_pragmas(pragmas: dict[str, str | int], dbapi_connection, _):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in pragmas.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
 class Database:
-    _session: Session | None = None
-    steps = 0
+    """
+    Session scope over an engine.
+
+    Nested `with db:` blocks share one session that is committed when the outermost
+    block exits. The session and its nesting counter are kept per thread, so
+    several threads can read through the same `Database` at once.
+    """
 
     def __init__(self, engine: Engine) -> None:
         self.engine = engine
+        self._local = threading.local()
+        event.listen(engine, "after_cursor_execute", self._track_writes)
+
+    @property
+    def _session(self) -> Session | None:
+        return getattr(self._local, "session", None)
+
+    @_session.setter
+    def _session(self, session: Session | None) -> None:
+        self._local.session = session
+
+    @property
+    def steps(self) -> int:
+        return getattr(self._local, "steps", 0)
+
+    @steps.setter
+    def steps(self, steps: int) -> None:
+        self._local.steps = steps
+
+    @property
+    def _wrote(self) -> bool:
+        return getattr(self._local, "wrote", False)
+
+    @_wrote.setter
+    def _wrote(self, wrote: bool) -> None:
+        self._local.wrote = wrote
+
+    def _track_writes(self, _connection, _cursor, statement: str, *_) -> None:
+        if statement.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self._wrote = True
+
+    def _commit(self) -> None:
+        """
+        Commit the session, bumping the data version when anything was written
+        """
+        assert self._session
+        self._session.flush()
+        if self._wrote:
+            self._session.execute(text(BUMP_DATA_VERSION))
+            self._wrote = False
+        self._session.commit()
 
     @classmethod
-    def from_default(cls):
-        path = os.environ.get("DB_PATH", None)
-        engine = create_engine(f"sqlite:///{path or DB_PATH}", echo=False)
+    def from_default(cls, profile: str | None = None, read_only: bool = False):
+        """
+        Open the configured database.
+
+        With `read_only` the file is opened with mode=ro and query_only from a small
+        pool shared between threads, so reports can run while an import is writing
+        (under the "fast" profile, whose WAL journal lets readers and the writer
+        proceed at the same time)
+        """
+        path = os.environ.get("DB_PATH", None) or DB_PATH
+        profile = profile or os.environ.get("FISCAL_DB_PROFILE", "default")
+
+        if profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown database profile '{profile}'")
+
+        pragmas = SQLITE_PROFILES[profile]
+
+        if read_only:
+            engine = create_engine(
+                f"sqlite:///file:{path}?mode=ro&uri=true",
+                echo=False,
+                poolclass=QueuePool,
+                pool_size=READ_ONLY_POOL_SIZE,
+                connect_args={"check_same_thread": False},
+            )
+            # journal_mode can not be changed on a read only connection
+            pragmas = {
+                **{k: v for k, v in pragmas.items() if k != "journal_mode"},
+                **READ_ONLY_PRAGMAS,
+            }
+        else:
+            engine = create_engine(f"sqlite:///{path}", echo=False)
+
+        event.listen(engine, "connect", partial(_set_profile_pragmas, pragmas))
         return cls(engine=engine)
 
     def __enter__(self) -> Session:
@@ -174,9 +500,21 @@ class Database:
     def __exit__(self, *_):
         self.steps -= 1
         if self._session and self.steps == 0:
-            self._session.commit()
+            self._commit()
             self._session = None
 
+    def rollback(self) -> None:
+        """
+        Discard this thread's session and whatever it had not committed, so the
+        next `with db:` starts a new one after a failed commit
+        """
+        if self._session is not None:
+            self._session.rollback()
+            self._session.close()
+        self._session = None
+        self.steps = 0
+        self._wrote = False
+
     def delete(self, model: SQLModel) -> None:
         if self._session is None:
             raise ValueError("Not within a session")
@@ -226,19 +564,47 @@ class Database:
 
         return None
 
-    def execute(self, statement: str):
+    def execute(
+        self,
+        statement: str,
+        params: dict[str, Any] | list[dict[str, Any]] | None = None,
+    ):
+        """
+        Run raw SQL in the current session, a list of params runs it once per item
+        """
         if self._session is None:
             raise ValueError("Not within a session")
-        return self._session.execute(statement=text(statement))
+        return self._session.execute(statement=text(statement), params=params)
 
     def exec(self, statement: SelectOfScalar[Any]):
         if self._session is None:
             raise ValueError("Not within a session")
         return self._session.exec(statement=statement)
 
+    def read_sql(self, statement: Any) -> pd.DataFrame:
+        """
+        Run a statement on the current session and load the rows into a dataframe
+        """
+        if self._session is None:
+            raise ValueError("Not within a session")
+        return pd.read_sql(statement, self._session.connection())
+
+    def rebuild_monthly_aggregates(self) -> None:
+        """
+        Recompute monthly_aggregates from scratch out of the transactions table
+        """
+        self.execute("DELETE FROM monthly_aggregates")
+        self.execute(
+            f"INSERT INTO monthly_aggregates ({AGGREGATE_KEY_COLUMNS}, value, quantity)"
+            f"{MONTHLY_AGGREGATES_FROM_TRANSACTIONS}"
+        )
+
+    def get_data_version(self) -> int:
+        return self.execute("SELECT version FROM data_version WHERE id = 1").scalar() or 0
+
     def commit(self):
         assert self._session
-        self._session.commit()
+        self._commit()
         self._session.flush()
 
     def insert_balance(self, balance: Balance):
@@ -0,0 +1,261 @@
+"""
+Content fingerprints of transactions, to find the same one imported twice.
+
+The external ids of the spreadsheet imports (bb, itau) are the day and the row
+number within the day, so a statement exported again with one more row shifts
+every id after it. The fingerprint only looks at what the bank says about the
+transaction:
+
+    <hash of bank, day, signed cents and description>-<ordinal>
+
+where the description is lower cased, without accents and punctuation, and the
+ordinal counts the transactions with the same hash, so two identical payments
+on the same day are still two. Statement imports skip rows whose fingerprint is
+already stored, whatever their id, and `fiscal duplicates` hash joins the stored
+transactions on the part before the ordinal to list the copies already in the
+database
+"""
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Iterable, NamedTuple, Optional
+
+import typer
+from tabulate import tabulate
+
+from fiscal import profiling
+from fiscal.db import DATE_FORMAT, Database, EntryType, Transactions
+
+# Rows per IN (...) lookup, under SQLite's variable limit
+CHUNK = 500
+
+# Banks whose external ids are positions in an exported statement. The APIs
+# give ids of their own and are fetched by windows, where an identical sale
+# later in a day would be numbered as the one already stored
+POSITIONAL_IDS = {"bb", "itau"}
+
+NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+MISSING = """
+SELECT   TRA.id
+        ,TRA.bank
+        ,TRA.date
+        ,TRA.entry_type
+        ,TRA.value
+        ,TRA.description
+FROM "main"."transactions" as TRA
+WHERE TRA.fingerprint IS NULL {}
+ORDER BY TRA.id
+"""
+
+NUMBERED = """
+SELECT TRA.fingerprint
+FROM "main"."transactions" as TRA
+WHERE TRA.fingerprint IS NOT NULL {}
+"""
+
+SET_FINGERPRINT = """
+UPDATE transactions
+SET fingerprint = :fingerprint
+WHERE id = :id;
+"""
+
+STORED = """
+SELECT TRA.fingerprint
+FROM "main"."transactions" as TRA
+WHERE TRA.fingerprint IN ({})
+"""
+
+ALL = """
+SELECT   TRA.id
+        ,TRA.bank
+        ,TRA.date
+        ,TRA.entry_type
+        ,TRA.value
+        ,TRA.description
+        ,TRA.external_id
+        ,TRA.category
+FROM "main"."transactions" as TRA
+"""
+
+
+def normalize(description: str) -> str:
+    text = unicodedata.normalize("NFKD", description or "")
+    text = text.encode("ascii", "ignore").decode().lower()
+    return NOT_ALPHANUMERIC.sub(" ", text).strip()
+
+
+def _cents(entry_type: EntryType | str, value: float) -> int:
+    cents = round(abs(value) * 100)
+    return -cents if EntryType(entry_type) == EntryType.SAIDA else cents
+
+
+def _day(value: datetime | date | str) -> str:
+    if isinstance(value, str):
+        return value[:10]
+    return value.strftime(DATE_FORMAT)
+
+
+def content_key(
+    bank: str,
+    day: datetime | date | str,
+    entry_type: EntryType | str,
+    value: float,
+    description: str,
+) -> str:
+    """
+    Hash of what identifies a transaction, the same for every copy of it
+    """
+    content = f"{bank}|{_day(day)}|{_cents(entry_type, value)}|{normalize(description)}"
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+def _number(keys: Iterable[str], seen: dict[str, int] | None = None) -> list[str]:
+    """
+    Append to each key how many times it was seen before, counting from `seen`
+    """
+    seen = defaultdict(int, seen or {})
+    result = []
+    for key in keys:
+        result.append(f"{key}-{seen[key]}")
+        seen[key] += 1
+    return result
+
+
+def fingerprints(transactions: Iterable[Transactions]) -> list[str]:
+    """
+    Fingerprints in order, identical transactions numbered by their position
+    """
+    return _number(
+        content_key(
+            transaction.bank,
+            transaction.date,
+            transaction.entry_type,
+            transaction.value,
+            transaction.description,
+        )
+        for transaction in transactions
+    )
+
+
+def backfill(db: Database, bank: str | None = None) -> int:
+    """
+    Fingerprint the transactions stored before there were fingerprints, in the
+    order they were inserted and numbered after the copies already fingerprinted.
+    Returns how many
+    """
+    where = "AND TRA.bank == :bank" if bank else ""
+    rows = db.execute(MISSING.format(where), {"bank": bank}).all()
+    if not rows:
+        return 0
+
+    keys = [content_key(*row[1:]) for row in rows]
+
+    seen: dict[str, int] = {}
+    for (fingerprint,) in db.execute(NUMBERED.format(where), {"bank": bank}).all():
+        key, _, ordinal = fingerprint.rpartition("-")
+        seen[key] = max(seen.get(key, 0), int(ordinal) + 1)
+
+    keys = _number(keys, seen)
+    updates = [{"id": row[0], "fingerprint": key} for row, key in zip(rows, keys)]
+    db.execute(SET_FINGERPRINT, updates)
+    return len(updates)
+
+
+def stored(db: Database, candidates: list[str]) -> set[str]:
+    """
+    Which of the fingerprints are already stored, looked up through their index
+    """
+    found = set()
+    for start in range(0, len(candidates), CHUNK):
+        chunk = candidates[start : start + CHUNK]
+        params = {f"f{index}": value for index, value in enumerate(chunk)}
+        statement = STORED.format(", ".join(f":{name}" for name in params))
+        found.update(row[0] for row in db.execute(statement, params).all())
+    return found
+
+
+class Copy(NamedTuple):
+    id: int
+    bank: str
+    date: str
+    entry_type: str
+    value: float
+    description: str
+    external_id: str
+    category: str | None
+
+    @property
+    def day(self) -> date:
+        return datetime.strptime(self.date[:10], DATE_FORMAT).date()
+
+
+def find_duplicates(
+    db: Database, days: int = 0, bank: str | None = None
+) -> list[list[Copy]]:
+    """
+    Groups of stored transactions with the same bank, cents and description,
+    at most `days` apart
+    """
+    with profiling.stage("load"):
+        rows = [Copy(*row) for row in db.execute(ALL).all()]
+
+    with profiling.stage("join"):
+        buckets: dict[tuple[str, int, str], list[Copy]] = defaultdict(list)
+        for row in rows:
+            if bank and row.bank != bank:
+                continue
+            cents = _cents(row.entry_type, row.value)
+            key = (row.bank, cents, normalize(row.description))
+            buckets[key].append(row)
+
+        groups = []
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            bucket.sort(key=lambda row: (row.date, row.id))
+            group = [bucket[0]]
+            for row in bucket[1:]:
+                if (row.day - group[-1].day).days <= days:
+                    group.append(row)
+                    continue
+                if len(group) > 1:
+                    groups.append(group)
+                group = [row]
+            if len(group) > 1:
+                groups.append(group)
+
+    groups.sort(key=lambda group: (group[0].bank, group[0].date))
+    return groups
+
+
+def duplicates(
+    days: int = typer.Option(0, help="Days apart copies may be"),
+    bank: Optional[str] = typer.Option(None, help="Only this bank"),
+):
+    """
+    List transactions that look imported more than once
+    """
+    db = Database.from_default()
+
+    with db:
+        filled = backfill(db)
+        if filled:
+            print(f"Fingerprinted {filled} transactions")
+
+        groups = find_duplicates(db, days, bank)
+
+    for group in groups:
+        print(
+            tabulate(
+                [row._asdict() for row in group],
+                headers="keys",
+                tablefmt="psql",
+                floatfmt=".2f",
+            )
+        )
+
+    copies = sum(len(group) - 1 for group in groups)
+    print(f"{len(groups)} groups, {copies} possible copies")
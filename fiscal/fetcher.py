@@ -3,6 +3,7 @@ from enum import Enum
 
 from thefuzz import process
 
+from fiscal import duplicates, profiling
 from fiscal.db import (
     Balance,
     Category,
@@ -12,6 +13,7 @@ from fiscal.db import (
     EntryType,
     Transactions,
 )
+from fiscal.writer import BatchWriter
 
 
 class TransactionType(str, Enum):
@@ -110,7 +112,7 @@ def _ask_for_cnpj(companies: dict[str, Companies], nickname: str) -> str:
     return cnpj
 
 
-def _create_company(nickname: str, cnpj: str, db: Database) -> Companies:
+def _create_company(nickname: str, cnpj: str, writer: BatchWriter) -> Companies:
     print(f"Creating {nickname} with {cnpj}.")
 
     name = input("Which Name to use: ") or nickname
@@ -118,8 +120,8 @@ def _create_company(nickname: str, cnpj: str, db: Database) -> Companies:
 
     company = Companies(name=name, cnpj=cnpj, default_category=category)
 
-    db.add(company)
-    db.add(Company_Naming(nickname=nickname, name=name))
+    writer.add(company)
+    writer.add(Company_Naming(nickname=nickname, name=name))
 
     return company
 
@@ -150,7 +152,7 @@ def _get_company(
     companies: dict[str, Companies],
     counterpart: str,
     cnpj: str | None,
-    db: Database,
+    writer: BatchWriter,
 ) -> Companies:
     """
     Get the company by a given nickename or cnpj
@@ -166,11 +168,11 @@ def _get_company(
 
     if cnpj in companies:
         company = companies[cnpj]
-        db.add(Company_Naming(nickname=counterpart, name=company.name))
+        writer.add(Company_Naming(nickname=counterpart, name=company.name))
         return company
 
     # Otherwise create the company
-    return _create_company(counterpart, cnpj, db)
+    return _create_company(counterpart, cnpj, writer)
 
 
 def _print_company_suggestion(companies: dict[str, Companies], nickname: str):
@@ -215,12 +217,34 @@ def _remove_existent_transactions(
     db: Database, new_transactions: list[tuple[Transactions, str]]
 ):
     """
-    Filter transactions by checking if their id is already in the database
+    Filter transactions already in the database.
+
+    Statement imports (bb, itau) compare fingerprints only: their ids are row
+    positions, so a statement exported again with one more row gives a new
+    transaction the id of a stored one. The other banks compare their own ids,
+    and every bank's fingerprints are stored for `fiscal duplicates`.
+    Transactions inserted before there were fingerprints get theirs saved
+    first, so every stored one is numbered the same way
     """
-    transactions = db.get_transactions(bank=new_transactions[0][0].bank)
-    existent_ids = {tran.external_id for tran in transactions}
+    bank = new_transactions[0][0].bank
+
+    prints = duplicates.fingerprints(trans for trans, _ in new_transactions)
+    for (trans, _), fingerprint in zip(new_transactions, prints):
+        trans.fingerprint = fingerprint
+
+    if bank not in duplicates.POSITIONAL_IDS:
+        existent_ids = {tran.external_id for tran in db.get_transactions(bank=bank)}
+        return [
+            row for row in new_transactions if row[0].external_id not in existent_ids
+        ]
+
+    # Committed, or the writer thread would wait on this session's write lock
+    if duplicates.backfill(db, bank):
+        db.commit()
+
+    existent_prints = duplicates.stored(db, prints)
     return [
-        trans for trans in new_transactions if trans[0].external_id not in existent_ids
+        row for row in new_transactions if row[0].fingerprint not in existent_prints
     ]
 
 
@@ -228,31 +252,34 @@ def handle_inserts(transactions: list[tuple[Transactions, str]], db: Database) -
     """
     Handle the inserts of multiple transactions
     """
-    transactions = _remove_existent_transactions(db, transactions)
-    companies = _get_companies_mapping(db)
+    with profiling.stage("dedup"):
+        transactions = _remove_existent_transactions(db, transactions)
+        companies = _get_companies_mapping(db)
 
     transactions.sort(key=lambda row: row[0].date)
 
-    for trans, cnpj in transactions:
-        counterpart = trans.counterpart_name or ""
+    # Rows are written in batches on the writer thread while the next ones are
+    # categorized (and, for unknown counterparts, asked about)
+    with BatchWriter(db) as writer, profiling.stage("categorize"):
+        for trans, cnpj in transactions:
+            counterpart = trans.counterpart_name or ""
 
-        print(
-            f"{trans.counterpart_name}\t|{trans.entry_type}\t|{trans.transaction_type}\t|{trans.date}"
-        )
+            print(
+                f"{trans.counterpart_name}\t|{trans.entry_type}\t|{trans.transaction_type}\t|{trans.date}"
+            )
 
-        if _has_counterpart(trans):
-            company = _get_company(companies, counterpart, cnpj, db)
-            companies[company.cnpj] = company
-            companies[company.name] = company
-            companies[counterpart] = company
-            print(companies[counterpart])
-        else:
-            company = None
-            trans.counterpart_name = None
+            if _has_counterpart(trans):
+                company = _get_company(companies, counterpart, cnpj, writer)
+                companies[company.cnpj] = company
+                companies[company.name] = company
+                companies[counterpart] = company
+                print(companies[counterpart])
+            else:
+                company = None
+                trans.counterpart_name = None
 
-        category = _default_cat_for_transaction(trans, company)
+            category = _default_cat_for_transaction(trans, company)
 
-        trans.category = category
+            trans.category = category
 
-        db.add(trans)
-        db.commit()
+            writer.add(trans)
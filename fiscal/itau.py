@@ -5,6 +5,7 @@ import pandas as pd
 from sqlmodel import select
 from tabulate import tabulate
 
+from fiscal import profiling
 from fiscal.db import DATE_FORMAT, Balance, Category, Database, EntryType, Transactions
 from fiscal.fetcher import TransactionType, handle_inserts
 from fiscal.reports import last_day_of_month
@@ -132,11 +133,14 @@ def _update_balance(db: Database, balance: float):
 
 
 def update_itau(xlsx_path: str):
-    d_f, balance = _get_dataframe(xlsx_path)
+    with profiling.stage("read"):
+        d_f, balance = _get_dataframe(xlsx_path)
 
-    print(tabulate(d_f, headers="keys", tablefmt="psql"))
+    with profiling.stage("render"):
+        print(tabulate(d_f, headers="keys", tablefmt="psql"))
 
-    transactions = [_parse_row(row) for _, row in d_f.iterrows()]
+    with profiling.stage("parse"):
+        transactions = [_parse_row(row) for _, row in d_f.iterrows()]
 
     db = Database.from_default()
     with db:
@@ -0,0 +1,103 @@
+"""
+Landing store of the raw pages returned by the bank APIs.
+
+Every statement page is kept gzipped next to the database, under
+
+    landing/<source>/<endpoint>/<first day>_<last day>/<page>.json.gz
+
+so transactions can be rebuilt from what the banks sent (`fiscal reprocess`)
+without fetching months of history again. A later fetch of the same window and
+page replaces the stored one. Set FISCAL_LANDING=off to stop storing pages
+"""
+import gzip
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from fiscal.db import DATE_FORMAT, Database
+
+LANDING_DIR_NAME = "landing"
+
+SUFFIX = ".json.gz"
+
+
+class Page(NamedTuple):
+    source: str
+    endpoint: str
+    start: date
+    end: date
+    page: int
+    path: Path
+
+    def read(self) -> bytes:
+        return gzip.decompress(self.path.read_bytes())
+
+
+class Landing:
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    @classmethod
+    def from_db(cls, db: Database) -> "Landing | None":
+        """
+        Store beside the database file, none for in memory databases or when off
+        """
+        # read only engines open the file through an sqlite URI
+        database = (db.engine.url.database or "").removeprefix("file:")
+
+        if not database or database == ":memory:":
+            return None
+        if os.environ.get("FISCAL_LANDING", "on") == "off":
+            return None
+
+        return cls(Path(database).parent / LANDING_DIR_NAME)
+
+    def save(
+        self,
+        source: str,
+        endpoint: str,
+        start: datetime,
+        end: datetime,
+        page: int,
+        content: bytes,
+    ) -> Path:
+        window = f"{start.strftime(DATE_FORMAT)}_{end.strftime(DATE_FORMAT)}"
+        directory = self.directory / source / endpoint / window
+        directory.mkdir(parents=True, exist_ok=True)
+
+        path = directory / f"{page:05}{SUFFIX}"
+        # Written aside and renamed, so an interrupted fetch never leaves half a page
+        partial = path.with_name(path.name + ".partial")
+        partial.write_bytes(gzip.compress(content, compresslevel=6))
+        partial.replace(path)
+
+        return path
+
+    def endpoints(self, source: str) -> list[str]:
+        directory = self.directory / source
+        if not directory.is_dir():
+            return []
+        return sorted(path.name for path in directory.iterdir() if path.is_dir())
+
+    def pages(
+        self, source: str, endpoint: str, since: date | None = None
+    ) -> Iterator[Page]:
+        """
+        Stored pages by window, oldest first, and page number. Only the windows
+        ending on or after `since`, when given
+        """
+        directory = self.directory / source / endpoint
+        if not directory.is_dir():
+            return
+
+        for window in sorted(directory.iterdir()):
+            first, _, last = window.name.partition("_")
+            start = datetime.strptime(first, DATE_FORMAT).date()
+            end = datetime.strptime(last, DATE_FORMAT).date()
+            if since and end < since:
+                continue
+
+            for path in sorted(window.glob(f"*{SUFFIX}")):
+                page = int(path.name.removesuffix(SUFFIX))
+                yield Page(source, endpoint, start, end, page, path)
@@ -1,13 +1,20 @@
-from typing import Any
+from pathlib import Path
+from typing import Any, Optional
 
 import typer
 
+from fiscal import profiling, query_stats
+from fiscal.auto_match import auto_match
 from fiscal.banco_inter import update_banco_inter
 from fiscal.bb import update_bb
+from fiscal.duplicates import duplicates
 from fiscal.itau import update_itau
 from fiscal.match import manual_match, match, undo
 from fiscal.xmls_nfs import update_nfes
 from fiscal.rede import update_rede
+from fiscal.reprocess import reprocess
+from fiscal.settlement import settlement
+from fiscal.transfers import pair_transfers
 from fiscal.reports import (
     compare_itau_and_rede,
     diff_balance,
@@ -15,13 +22,36 @@ from fiscal.reports import (
     entradas,
     entradas_e_saidas_por_banco,
     fornecedores,
+    rede_fees,
+    report_all,
     saidas,
     transfers,
+    trend,
+    verify_aggregates,
 )
 
 
+def _options(
+    query_stats_: bool = typer.Option(
+        False,
+        "--query-stats",
+        envvar="FISCAL_QUERY_STATS",
+        help="Time every SQL statement and print a summary at exit",
+    ),
+    profile: Optional[Path] = typer.Option(
+        None,
+        help="Write cProfile stats to this file and print stage timings at exit",
+    ),
+):
+    if query_stats_:
+        query_stats.enable()
+    if profile:
+        profiling.enable(profile)
+
+
 def create_app() -> Any:
     app = typer.Typer()
+    app.callback()(_options)
     app.command("bb")(update_bb)
     #app.command("nfe")(update_nfes)
     app.command("xmls")(update_nfes)
@@ -29,16 +59,25 @@ def create_app() -> Any:
     app.command("itau")(update_itau)
     app.command("inter")(update_banco_inter)
     app.command("match")(match)
+    app.command("auto-match")(auto_match)
+    app.command("pair-transfers")(pair_transfers)
+    app.command("duplicates")(duplicates)
+    app.command("reprocess")(reprocess)
 
     report_app = typer.Typer()
     report_app.command("balances")(diff_balance)
     report_app.command("dre")(dre)
     report_app.command("consolidado")(entradas_e_saidas_por_banco)
     report_app.command("vendas")(compare_itau_and_rede)
+    report_app.command("conciliacao")(settlement)
+    report_app.command("taxas")(rede_fees)
     report_app.command("entradas")(entradas)
     report_app.command("saidas")(saidas)
     report_app.command("transferencias")(transfers)
     report_app.command("fornecedor")(fornecedores)
+    report_app.command("tendencia")(trend)
+    report_app.command("all")(report_all)
+    report_app.command("aggregates")(verify_aggregates)
     app.add_typer(report_app, name="report")
 
     transaction_app = typer.Typer()
@@ -0,0 +1,150 @@
+"""
+Marketplace payments covering several NFEs.
+
+A marketplace pays for an order with one transaction, while each seller emits
+its own NFE. For every unvalidated marketplace payment, the unvalidated NFEs
+emitted around its date are searched for a set whose totals add up to the
+payment, to the cent.
+
+The search is a subset sum over integer cents kept as the bits of a Python int
+(bit n set when n cents can be reached), so each candidate NFE costs a shift and
+an or. A set is only proposed when it is the only one reaching the payment: any
+other set would have to leave out one of its NFEs, so it is enough to check that
+the payment can't be reached without each of them
+"""
+import bisect
+from typing import NamedTuple
+
+from fiscal.db import Database
+
+# Counterparts paying on behalf of the sellers, lower cased
+MARKETPLACES = ["pix marketplace", "magalu pagamentos ltda"]
+
+# Days between the payment and the NFEs
+WINDOW_DAYS = 10
+
+# NFEs closest to the payment that are tried
+MAX_CANDIDATES = 40
+
+# Payments above this many cents are left alone
+MAX_CENTS = 5_000_000
+
+PAYMENTS = """
+SELECT   TRA.id
+        ,TRA.counterpart_name
+        ,TRA.date
+        ,julianday(TRA.date)
+        ,CAST(ROUND(TRA.value * 100) AS INTEGER)
+FROM "main"."transactions" as TRA
+WHERE TRA.validated == 0 AND lower(TRA.counterpart_name) IN ({})
+ORDER BY TRA.date
+"""
+
+NFES = """
+SELECT   NFE.codigo_acesso
+        ,NFE.emissor
+        ,NFE.dt_emissao
+        ,julianday(NFE.dt_emissao)
+        ,CAST(ROUND(NFE.valor_total * 100) AS INTEGER)
+FROM "main"."nfes" as NFE
+WHERE NFE.validated == 0
+ORDER BY julianday(NFE.dt_emissao)
+"""
+
+
+class Row(NamedTuple):
+    key: str | int
+    name: str
+    date: str
+    day: float
+    cents: int
+
+
+class NFESet(NamedTuple):
+    payment: Row
+    nfes: list[Row]
+
+
+def _reachable(values: list[int], target: int) -> int:
+    mask = (1 << (target + 1)) - 1
+    sums = 1
+    for value in values:
+        sums = (sums | sums << value) & mask
+    return sums
+
+
+def unique_subset(values: list[int], target: int) -> list[int] | None:
+    """
+    Indexes of the only subset of `values` adding up to `target`, or None when
+    there is no such subset or more than one
+    """
+    mask = (1 << (target + 1)) - 1
+    prefixes = [1]
+    for value in values:
+        prefixes.append((prefixes[-1] | prefixes[-1] << value) & mask)
+
+    if not prefixes[-1] >> target & 1:
+        return None
+
+    chosen = []
+    remaining = target
+    for index in range(len(values) - 1, -1, -1):
+        # Take the value only when the rest can't be reached without it
+        if not prefixes[index] >> remaining & 1:
+            chosen.append(index)
+            remaining -= values[index]
+    chosen.reverse()
+
+    for index in chosen:
+        others = values[:index] + values[index + 1 :]
+        if _reachable(others, target) >> target & 1:
+            return None
+
+    return chosen
+
+
+def _candidates(
+    nfes: list[Row],
+    days: list[float],
+    used: set[str | int],
+    payment: Row,
+    window: float,
+) -> list[Row]:
+    start = bisect.bisect_left(days, payment.day - window)
+    end = bisect.bisect_right(days, payment.day + window)
+    nearby = [
+        nfe
+        for nfe in nfes[start:end]
+        if 0 < nfe.cents <= payment.cents and nfe.key not in used
+    ]
+    nearby.sort(key=lambda nfe: abs(nfe.day - payment.day))
+    return nearby[:MAX_CANDIDATES]
+
+
+def find_sets(db: Database, window: float = WINDOW_DAYS) -> list[NFESet]:
+    """
+    Unambiguous sets of two or more NFEs paid by one marketplace transaction.
+    Payments are taken by date, and an NFE goes to the first payment it fits
+    """
+    names = ", ".join(f"'{name}'" for name in MARKETPLACES)
+    payments = [Row(*row) for row in db.execute(PAYMENTS.format(names)).all()]
+    nfes = [Row(*row) for row in db.execute(NFES).all()]
+    days = [nfe.day for nfe in nfes]
+
+    used: set[str | int] = set()
+    sets = []
+    for payment in payments:
+        if payment.cents > MAX_CENTS:
+            continue
+
+        candidates = _candidates(nfes, days, used, payment, window)
+        chosen = unique_subset([nfe.cents for nfe in candidates], payment.cents)
+        if chosen is None or len(chosen) < 2:
+            continue
+
+        found = [candidates[index] for index in chosen]
+        sets.append(NFESet(payment, sorted(found, key=lambda nfe: nfe.day)))
+
+        used.update(nfe.key for nfe in found)
+
+    return sets
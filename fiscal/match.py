@@ -1,14 +1,15 @@
 import os
 from datetime import datetime
-from functools import partial
 from os import stat
-from typing import Any
+from typing import Any, Optional
 
 import typer
 from pydantic import BaseModel
+from tabulate import tabulate
 from typing_extensions import Self
 
-from fiscal.db import Database, Validations
+from fiscal import marketplace
+from fiscal.db import Database
 
 # TODO - Include matching salarios given the accounting email or some other form (or manual input )
 # TODO - Same for agua e luz
@@ -17,30 +18,84 @@ from fiscal.db import Database, Validations
 
 # Match NFE with Transaction on same Company and Same value
 
-UNDO_TRANSACTION = """
+UPDATE_NFE = """
+UPDATE nfes
+SET validated = :validated
+WHERE codigo_acesso = :codigo_acesso;
+"""
+
+UPDATE_TRANSACTION = """
 UPDATE transactions
-SET validated = 0
-WHERE id = {};
+SET validated = :validated
+WHERE id = :transacao;
 """
-UNDO_NFE = """
-UPDATE nfes
-SET validated = 0
-WHERE codigo_acesso = '{}';
+
+INSERT_VALIDATION = """
+INSERT INTO validations (transacao, codigo_acesso, batch)
+VALUES (:transacao, :codigo_acesso, :batch);
 """
 
-UPDATE_NFE = """
+DELETE_VALIDATION = """
+DELETE FROM validations
+WHERE transacao = :transacao AND codigo_acesso = :codigo_acesso;
+"""
+
+# Either side may still be validated by another pair, e.g. the other NFEs of a
+# marketplace set, so it is only cleared when no validation is left
+CLEAR_NFE = """
 UPDATE nfes
-SET validated = 1
-WHERE codigo_acesso = '{}';
+SET validated = 0
+WHERE codigo_acesso = :codigo_acesso
+    AND NOT EXISTS (SELECT 1 FROM validations WHERE codigo_acesso = :codigo_acesso);
 """
 
-UPDATE_TRANSACTION = """
+CLEAR_TRANSACTION = """
 UPDATE transactions
-SET validated = 1
-WHERE id = {};
+SET validated = 0
+WHERE id = :transacao
+    AND NOT EXISTS (SELECT 1 FROM validations WHERE transacao = :transacao);
+"""
+
+
+BATCHES = """
+SELECT   VAL.batch
+        ,COUNT(DISTINCT VAL.transacao)
+        ,MIN(VAL.created_at)
+        ,MAX(VAL.created_at)
+FROM "main"."validations" as VAL
+WHERE VAL.batch IS NOT NULL
+GROUP BY VAL.batch
+ORDER BY MAX(VAL.created_at) DESC
+LIMIT 10
+"""
+
+BATCH_VALIDATIONS = """
+SELECT   VAL.transacao
+        ,VAL.codigo_acesso
+FROM "main"."validations" as VAL
+WHERE VAL.batch = :batch
 """
 
 
+def new_batch(kind: str) -> str:
+    """
+    Id tagging the validations of one matching session
+    """
+    return f"{kind}-{datetime.now().strftime('%Y%m%dt%H%M%S%f')}"
+
+
+def _set_validated(db: Database, pairs: list[dict[str, Any]], validated: bool):
+    rows = [pair | {"validated": int(validated)} for pair in pairs]
+    db.execute(UPDATE_NFE, rows)
+    db.execute(UPDATE_TRANSACTION, rows)
+
+
+def _remove_validations(db: Database, pairs: list[dict[str, Any]]):
+    db.execute(DELETE_VALIDATION, pairs)
+    db.execute(CLEAR_NFE, pairs)
+    db.execute(CLEAR_TRANSACTION, pairs)
+
+
 # This is expected for market places
 
 DATE_FORMAT = "%Y-%m-%d"
@@ -54,19 +109,48 @@ class BaseMatch(BaseModel):
     def query() -> str:
         return ""
 
+    @classmethod
+    def find(cls, db: Database) -> list[Self]:
+        return [row_to_model(row, cls) for row in db.execute(cls.query()).all()]
+
     def format(self) -> None:
         ...
 
     def split_marker(self) -> str:
         return ""
 
-    def act(self, db: Database):
-        transacao = self.id
-        codigo_acesso = self.codigo_acesso
-
-        db.add(Validations(transacao=transacao, codigo_acesso=codigo_acesso))
-        db.execute(UPDATE_NFE.format(codigo_acesso))
-        db.execute(UPDATE_TRANSACTION.format(transacao))
+    def pairs(self) -> list[dict[str, Any]]:
+        return [{"transacao": self.id, "codigo_acesso": self.codigo_acesso}]
+
+    def act(self, db: Database, batch: str | None = None):
+        self.act_all(db, [self], batch)
+
+    @classmethod
+    def act_all(
+        cls, db: Database, matches: list[Self], batch: str | None = None
+    ) -> list[Self]:
+        """
+        Validate the matches with one statement per table, tagged with `batch`. A
+        match sharing an NFE or a transaction with one before it is skipped.
+        Returns the accepted ones
+        """
+        accepted = []
+        nfes: set[str] = set()
+        transactions: set[int] = set()
+        for match in matches:
+            codigos = {pair["codigo_acesso"] for pair in match.pairs()}
+            if match.id in transactions or codigos & nfes:
+                continue
+            accepted.append(match)
+            nfes |= codigos
+            transactions.add(match.id)
+
+        pairs = [pair for match in accepted for pair in match.pairs()]
+        if pairs:
+            db.execute(INSERT_VALIDATION, [pair | {"batch": batch} for pair in pairs])
+            _set_validated(db, pairs, True)
+
+        return accepted
 
 
 class Undo(BaseMatch):
@@ -75,6 +159,7 @@ class Undo(BaseMatch):
     dt_emissao: datetime
     dt_transaction: datetime
     value: float
+    batch: str | None
 
     def format(self):
         return (
@@ -83,6 +168,7 @@ class Undo(BaseMatch):
             f"Valor: {self.value}\t"
             f"Emissor: {self.emissor}\t"
             f"Counter: {self.counterpart}\t"
+            f"Batch: {self.batch or '-'}"
         )
 
     @staticmethod
@@ -95,6 +181,7 @@ class Undo(BaseMatch):
                 ,NFE.dt_emissao
                 ,TRA.date
                 ,TRA.value
+                ,VAL.batch
         FROM "main"."validations" as VAL
             JOIN "main"."nfes" as NFE  on NFE.codigo_acesso == VAL.codigo_acesso
             JOIN "main"."transactions" as TRA ON TRA.id == VAL.transacao
@@ -102,15 +189,14 @@ class Undo(BaseMatch):
         LIMIT 10
     """
 
-    def act(self, db: Database):
-        transacao = self.id
-        codigo_acesso = self.codigo_acesso
-
-        val = db.get_validation_by_id(transacao=transacao, codigo_acesso=codigo_acesso)
-        assert val
-        db.delete(val)
-        db.execute(UNDO_NFE.format(codigo_acesso))
-        db.execute(UNDO_TRANSACTION.format(transacao))
+    @classmethod
+    def act_all(
+        cls, db: Database, matches: list[Self], batch: str | None = None
+    ) -> list[Self]:
+        pairs = [pair for match in matches for pair in match.pairs()]
+        if pairs:
+            _remove_validations(db, pairs)
+        return matches
 
 
 class MarketPlace(BaseMatch):
@@ -152,6 +238,57 @@ ORDER by NFE.emissor, ABS(days_difference)
 """
 
 
+class MarketPlaceSet(BaseMatch):
+    """
+    Several NFEs paid by one marketplace transaction, `codigo_acesso` holds
+    their comma separated access keys
+    """
+
+    emissores: list[str]
+    counterpart: str
+    dt_transaction: datetime
+    day_diff: int
+    value: float
+    values: list[float]
+
+    @classmethod
+    def find(cls, db: Database) -> list[Self]:
+        return [
+            cls(
+                codigo_acesso=",".join(str(nfe.key) for nfe in found.nfes),
+                id=found.payment.key,
+                emissores=[nfe.name for nfe in found.nfes],
+                counterpart=found.payment.name,
+                dt_transaction=found.payment.date,
+                day_diff=round(
+                    max(abs(nfe.day - found.payment.day) for nfe in found.nfes)
+                ),
+                value=found.payment.cents / 100,
+                values=[nfe.cents / 100 for nfe in found.nfes],
+            )
+            for found in marketplace.find_sets(db)
+        ]
+
+    def format(self):
+        nfes = " + ".join(
+            f"{value} ({emissor})"
+            for value, emissor in zip(self.values, self.emissores)
+        )
+        return (
+            f"Diff: {str(self.day_diff).rjust(3, ' ')}\t"
+            f"Transação: {self.dt_transaction.strftime(DATE_FORMAT)}\t"
+            f"Valor: {self.value}\t"
+            f"Counter: {self.counterpart}\t"
+            f"NFEs: {nfes}"
+        )
+
+    def pairs(self) -> list[dict[str, Any]]:
+        return [
+            {"transacao": self.id, "codigo_acesso": codigo_acesso}
+            for codigo_acesso in self.codigo_acesso.split(",")
+        ]
+
+
 class BestMatch(BaseMatch):
     name: str
     dt_emissao: datetime
@@ -203,29 +340,91 @@ def manual_match():
 
     db = Database.from_default()
     with db:
-        BaseMatch(codigo_acesso=codigo_acesso, id=transaction_id).act(db)
+        BaseMatch(codigo_acesso=codigo_acesso, id=transaction_id).act(
+            db, new_batch("manual")
+        )
 
 
 def match():
     db = Database.from_default()
+    batch = new_batch("match")
 
     print("MATCH NFES")
     save = "1"
     while save:
         with db:
-            save = iterate_matching(db, cls=BestMatch)
+            save = iterate_matching(db, cls=BestMatch, batch=batch)
 
     print("MATCH MARKETPLACES")
     save = "1"
     while save:
         with db:
-            save = iterate_matching(db, cls=MarketPlace)
+            save = iterate_matching(db, cls=MarketPlace, batch=batch)
+
+    print("MATCH MARKETPLACE SETS")
+    save = "1"
+    while save:
+        with db:
+            save = iterate_matching(db, cls=MarketPlaceSet, batch=batch)
 
     print("MATCH MISSING")
 
 
-def undo():
+def latest_batches(db: Database) -> list[dict[str, Any]]:
+    return [
+        {"Batch": batch, "Matches": count, "Start": start, "End": end}
+        for batch, count, start, end in db.execute(BATCHES).all()
+    ]
+
+
+def undo_batch(db: Database, batch: str) -> int:
+    """
+    Revert every validation of a matching session, returns how many transactions
+    it had validated
+    """
+    pairs = [
+        {"transacao": transacao, "codigo_acesso": codigo_acesso}
+        for transacao, codigo_acesso in db.execute(
+            BATCH_VALIDATIONS, {"batch": batch}
+        ).all()
+    ]
+    if pairs:
+        _remove_validations(db, pairs)
+    return len({pair["transacao"] for pair in pairs})
+
+
+def _undo_batch(db: Database, batch: str):
+    batches = latest_batches(db)
+    print(tabulate(batches, headers="keys", tablefmt="psql"))
+
+    if batch == "last":
+        if not batches:
+            print("No batches to undo")
+            raise typer.Exit(1)
+        batch = batches[0]["Batch"]
+
+    if not typer.confirm(f"Revert every match of batch '{batch}'?"):
+        return
+
+    reverted = undo_batch(db, batch)
+    if not reverted:
+        print(f"No matches in batch '{batch}'")
+        raise typer.Exit(1)
+    print(f"Reverted {reverted} matches")
+
+
+def undo(
+    batch: Optional[str] = typer.Option(
+        None, help="Revert a whole matching session, 'last' for the latest one"
+    ),
+):
     db = Database.from_default()
+
+    if batch is not None:
+        with db:
+            _undo_batch(db, batch)
+        return
+
     print("UNDO")
     save = "1"
     while save:
@@ -237,10 +436,37 @@ def row_to_model(row: list[Any], cls: type[BaseMatch]):
     return cls(**{field: value for field, value in zip(cls.__fields__, row)})
 
 
-def iterate_matching(db: Database, cls: type[BaseMatch]) -> bool:
+def _select(answer: str, results: list[BaseMatch]) -> list[int]:
+    """
+    Indexes picked by an answer like "0-5,8,12", or "d3" for every row at most
+    3 days apart
+    """
+    answer = answer.replace(" ", "")
+
+    if answer.startswith("d"):
+        days = int(answer[1:])
+        return [
+            index
+            for index, row in enumerate(results)
+            if abs(getattr(row, "day_diff")) <= days
+        ]
+
+    indexes = []
+    for part in answer.split(","):
+        first, _, last = part.partition("-")
+        indexes += range(int(first), int(last or first) + 1)
+
+    if any(index not in range(len(results)) for index in indexes):
+        raise ValueError(f"Pick rows between 0 and {len(results) - 1}")
+    return list(dict.fromkeys(indexes))
+
+
+def iterate_matching(
+    db: Database, cls: type[BaseMatch], batch: str | None = None
+) -> bool:
     os.system("clear")
 
-    results = list(map(partial(row_to_model, cls=cls), db.execute(cls.query()).all()))
+    results = cls.find(db)
 
     if not results:
         print("No results. Done.")
@@ -248,13 +474,24 @@ def iterate_matching(db: Database, cls: type[BaseMatch]) -> bool:
 
     _print_rows(results)
 
-    save = input(f"Would you like to accept a match (0 to {len(results) - 1}): ")
+    by_days = ", d<N> for all within N days" if "day_diff" in cls.__fields__ else ""
+    save = input(
+        f"Would you like to accept matches (0 to {len(results) - 1}, "
+        f"as in 0-5,8,12{by_days}): "
+    )
+
+    if not save:
+        return False
 
-    if save:
-        results[int(save)].act(db=db)
+    try:
+        selected = _select(save, results)
+    except (ValueError, AttributeError) as err:
+        input(f"Invalid selection '{save}': {err}. Press enter to go on")
         return True
 
-    return False
+    accepted = cls.act_all(db, [results[index] for index in selected], batch)
+    print(f"Accepted {len(accepted)} of {len(selected)}")
+    return True
 
 
 def _print_rows(results: list[BaseMatch]):
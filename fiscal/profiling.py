@@ -0,0 +1,123 @@
+"""
+Stage timing and profiling of a whole command.
+
+`fiscal --profile out.prof <command>` runs the command under cProfile, writes the
+stats to out.prof (open with `python -m pstats out.prof` or snakeviz) and prints
+the time and peak memory of each named stage to stderr at exit:
+
+    with profiling.stage("parse"):
+        ...
+
+Stages cost nothing while profiling is off
+"""
+import atexit
+import contextlib
+import cProfile
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterable, Iterator, TypeVar
+
+from tabulate import tabulate
+
+Item = TypeVar("Item")
+
+_profiler: cProfile.Profile | None = None
+
+# name -> [calls, seconds, peak bytes]
+_stages: dict[str, list[float]] = {}
+
+# Highest peak seen before a stage reset it
+_peak = 0
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Account the time and peak traced memory of the block to `name`.
+
+    Peaks are reset when a stage starts, so nested stages report their own peak
+    and the outer one only what follows the inner stage
+    """
+    global _peak
+
+    if not enabled():
+        yield
+        return
+
+    _peak = max(_peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        _peak = max(_peak, peak)
+
+        calls, seconds, previous_peak = _stages.get(name, [0, 0.0, 0])
+        _stages[name] = [calls + 1, seconds + elapsed, max(previous_peak, peak)]
+
+
+def iterate(name: str, iterable: Iterable[Item]) -> Iterator[Item]:
+    """
+    Account the time spent producing each item of a lazy iterable to `name`
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def summary() -> str:
+    rows = [
+        {
+            "stage": name,
+            "calls": int(calls),
+            "seconds": seconds,
+            "peak (MiB)": peak / 2**20,
+        }
+        for name, (calls, seconds, peak) in _stages.items()
+    ]
+    return tabulate(rows, headers="keys", tablefmt="psql", floatfmt=",.3f")
+
+
+def _finish(output: Path, start: float) -> None:
+    assert _profiler
+    _profiler.disable()
+    _profiler.dump_stats(output)
+
+    peak = max(_peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    print(
+        f"{time.perf_counter() - start:,.3f}s, peak {peak / 2**20:,.1f} MiB,"
+        f" profile written to {output}",
+        file=sys.stderr,
+    )
+    if _stages:
+        print(summary(), file=sys.stderr)
+
+
+def enable(output: Path) -> None:
+    """
+    Profile everything from now until the process exits
+    """
+    global _profiler
+
+    if _profiler is not None:
+        return
+
+    tracemalloc.start()
+    _profiler = cProfile.Profile()
+    atexit.register(_finish, output, time.perf_counter())
+    _profiler.enable()
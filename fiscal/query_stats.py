@@ -0,0 +1,153 @@
+"""
+Timing of every statement executed through SQLAlchemy.
+
+Enable with `fiscal --query-stats <command>` or FISCAL_QUERY_STATS=1. Statements
+are grouped by their SQL text; statements slower than FISCAL_SLOW_QUERY_MS
+(default 100) are logged together with their `EXPLAIN QUERY PLAN`, and a summary
+is printed to stderr when the command exits
+"""
+import atexit
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("FISCAL_SLOW_QUERY_MS", 100))
+
+# Statements shown in the summary, by total time
+SUMMARY_LIMIT = 20
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def _normalize(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+class StatementStats:
+    def __init__(self) -> None:
+        self.durations: list[float] = []
+        self.rows = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.durations)
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations)
+
+    @property
+    def p95(self) -> float:
+        durations = sorted(self.durations)
+        return durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+
+class QueryStats:
+    """
+    Collects per statement count, total and p95 time and affected rows.
+
+    Row counts come from the DBAPI cursor, which sqlite only fills for writes
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS) -> None:
+        self.slow_seconds = slow_ms / 1000
+        self.statements: dict[str, StatementStats] = {}
+        self.slow: list[tuple[str, float, list[str]]] = []
+        self._lock = threading.Lock()
+
+    def install(self, target: Any = Engine) -> None:
+        event.listen(target, "before_cursor_execute", self._before)
+        event.listen(target, "after_cursor_execute", self._after)
+
+    def remove(self, target: Any = Engine) -> None:
+        event.remove(target, "before_cursor_execute", self._before)
+        event.remove(target, "after_cursor_execute", self._after)
+
+    def _before(self, connection, *_) -> None:
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after(
+        self, connection, cursor, statement: str, parameters, _context, executemany
+    ) -> None:
+        elapsed = time.perf_counter() - connection.info["query_start"].pop()
+        key = _normalize(statement)
+
+        with self._lock:
+            stats = self.statements.setdefault(key, StatementStats())
+            stats.durations.append(elapsed)
+            stats.rows += max(cursor.rowcount, 0)
+
+        if elapsed < self.slow_seconds or executemany:
+            return
+
+        plan = self._explain(cursor, statement, parameters)
+        logger.warning(
+            "Slow query (%.1f ms): %s\n%s", elapsed * 1000, key, "\n".join(plan)
+        )
+        with self._lock:
+            self.slow.append((key, elapsed, plan))
+
+    @staticmethod
+    def _explain(cursor, statement: str, parameters) -> list[str]:
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+
+        try:
+            rows = cursor.connection.execute(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            ).fetchall()
+        except Exception as err:  # the plan is best effort, never fail the query
+            return [f"no plan: {err}"]
+
+        return [row[-1] for row in rows]
+
+    def summary(self, limit: int = SUMMARY_LIMIT) -> str:
+        with self._lock:
+            items = sorted(
+                self.statements.items(), key=lambda item: item[1].total, reverse=True
+            )
+
+        rows = [
+            {
+                "statement": statement[:80],
+                "count": stats.count,
+                "total (ms)": stats.total * 1000,
+                "p95 (ms)": stats.p95 * 1000,
+                "rows": stats.rows,
+            }
+            for statement, stats in items[:limit]
+        ]
+        total = sum(stats.total for _, stats in items) * 1000
+        count = sum(stats.count for _, stats in items)
+
+        return (
+            f"{count} statements in {total:,.1f} ms, {len(self.slow)} slow\n"
+            + tabulate(rows, headers="keys", tablefmt="psql", floatfmt=",.2f")
+        )
+
+
+_installed: QueryStats | None = None
+
+
+def enable(slow_ms: float = SLOW_QUERY_MS) -> QueryStats:
+    """
+    Start recording on every engine and print the summary at exit
+    """
+    global _installed
+
+    if _installed is None:
+        _installed = QueryStats(slow_ms)
+        _installed.install()
+        atexit.register(lambda: print(_installed.summary(), file=sys.stderr))
+
+    return _installed
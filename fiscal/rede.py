@@ -1,8 +1,9 @@
 from datetime import date, datetime, time, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from typing import Any, NamedTuple
 
 import pandas as pd
-import requests
 import typer
 from pydantic import BaseModel, Field
 from requests.models import HTTPBasicAuth, HTTPError
@@ -10,9 +11,12 @@ from tabulate import tabulate
 from thefuzz.process import logging
 from urllib3.connectionpool import HTTPConnection
 
+from fiscal import profiling
 from fiscal.banco_inter import INTER_BANK
 from fiscal.db import DATE_FORMAT, Category, Database, EntryType, Transactions
 from fiscal.fetcher import handle_inserts
+from fiscal.landing import Landing
+from fiscal.transport import Transport
 
 
 class Columns(str, Enum):
@@ -166,6 +170,11 @@ class Modality(BaseModel):
     productCode: int
 
 
+class SaleMerchant(BaseModel):
+    companyNumber: str
+    companyName: str | None
+
+
 class Transaction(BaseModel):
     status: str
     brandCode: int
@@ -173,10 +182,15 @@ class Transaction(BaseModel):
     movementDate: date
     saleHour: time
     amount: float
+    netAmount: float | None
+    mdrAmount: float | None
+    installmentQuantity: int | None
+    nsu: int | None
     modality: Modality
     authorizationCode: str
     strAuthorizationCode: str | None
     tokenNumber: str | None
+    merchant: SaleMerchant | None
 
 
 class Cursor(BaseModel):
@@ -193,17 +207,84 @@ class RedeDTO(BaseModel):
     cursor: Cursor
 
 
+REDE_URL = "https://api.userede.com.br/redelabs"
+
+REDE_BANK = "rede"
+
+# Store whose sales were the only ones fetched, its ids and pages keep their format
+REDE_MERCHANT = "93122470"
+
+# Merchants whose cursors are walked at the same time
+MAX_PARALLEL_MERCHANTS = 4
+
+# Requests per second to the Rede API
+REDE_RATE_LIMIT = 5.0
+
+SAVE_SALES = """
+INSERT INTO rede_sales (
+    external_id, merchant, sale_date, brand, modality, installments, nsu,
+    amount, net_amount, mdr_amount, fee_total
+)
+VALUES (
+    :external_id, :merchant, :sale_date, :brand, :modality, :installments, :nsu,
+    :amount, :net_amount, :mdr_amount, :fee_total
+)
+ON CONFLICT (external_id) DO NOTHING;
+"""
+
+LATEST_SALES = """
+SELECT   SAL.merchant
+        ,MAX(SAL.sale_date)
+FROM "main"."rede_sales" as SAL
+GROUP BY SAL.merchant
+"""
+
+
+class Merchant(NamedTuple):
+    number: str
+    subsidiaries: tuple[str, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "Merchant":
+        """
+        "93122470" for a store alone, "93122470:111,222" for a parent company
+        and its subsidiaries
+        """
+        number, _, subsidiaries = spec.strip().partition(":")
+        if not subsidiaries:
+            return cls(number, (number,))
+        return cls(number, tuple(subsidiaries.split(",")))
+
+    @property
+    def endpoint(self) -> str:
+        """
+        Landing endpoint of the merchant's sales pages
+        """
+        return "sales" if self.number == REDE_MERCHANT else f"sales-{self.number}"
+
+
 class Rede:
     bearer_token: str
 
     def __init__(
-        self, username: str, password: str, client_id: str, client_secret: str
+        self,
+        username: str,
+        password: str,
+        client_id: str,
+        client_secret: str,
+        base_url: str = REDE_URL,
+        transport: Transport | None = None,
+        landing: Landing | None = None,
+        merchants: list[Merchant] | None = None,
     ):
+        self.base_url = base_url
+        self.landing = landing
+        self.merchants = merchants or [Merchant.parse(REDE_MERCHANT)]
         self.username = username
         self.password = password
         self.client_id = client_id
         self.client_secret = client_secret
-        self._session = requests.session()
+        self._session = transport or Transport(rate_limit=REDE_RATE_LIMIT)
 
         self.authenticate()
 
@@ -216,7 +297,7 @@ class Rede:
         }
 
         resp = self._session.post(
-            url="https://api.userede.com.br/redelabs/oauth/token",
+            url=f"{self.base_url}/oauth/token",
             data=params,
             auth=basic,
         )
@@ -228,34 +309,77 @@ class Rede:
     def get_transactions(
         self, start_date: datetime, end_date: datetime
     ) -> list[Transactions]:
+        return [
+            self._to_default_transaction(tran)
+            for tran in self.get_sales(start_date, end_date)
+        ]
+
+    def get_sales(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        starts: dict[str, datetime] | None = None,
+    ) -> list[Transaction]:
+        """
+        Sales of every merchant, each one's cursor walked on its own thread. The
+        transport's rate limit is shared between them. `starts` has the first day
+        of some merchants by number, the others start on `start_date`
+        """
+        starts = starts or {}
+
+        def merchant_sales(merchant: Merchant) -> list[Transaction]:
+            start = starts.get(merchant.number, start_date)
+            return self._get_merchant_sales(merchant, start, end_date)
+
+        if len(self.merchants) == 1:
+            return merchant_sales(self.merchants[0])
+
+        workers = min(len(self.merchants), MAX_PARALLEL_MERCHANTS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(merchant_sales, self.merchants)
+            return [sale for sales in results for sale in sales]
+
+    def _get_merchant_sales(
+        self, merchant: Merchant, start_date: datetime, end_date: datetime
+    ) -> list[Transaction]:
         has_next = True
         next_key: str | None = ""
-        trans = []
+        sales = []
+        page = 0
 
         while has_next:
-            response = self._get_transactions(start_date, end_date, next_key)
+            response = self._get_transactions(
+                start_date, end_date, next_key, page, merchant
+            )
+            page += 1
 
-            trans += [
-                self._to_default_transaction(tran)
-                for tran in response.content.transactions
-            ]
+            for sale in response.content.transactions:
+                if sale.merchant is None:
+                    sale.merchant = SaleMerchant(companyNumber=merchant.number)
+            sales += response.content.transactions
 
             has_next = response.cursor.hasNextKey
             next_key = response.cursor.nextKey
 
-        return trans
+        return sales
 
     def _get_transactions(
-        self, start_date: datetime, end_date: datetime, next_key: str
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        next_key: str,
+        page: int = 0,
+        merchant: Merchant | None = None,
     ) -> RedeDTO:
+        merchant = merchant or self.merchants[0]
         resp = self._session.get(
-            url="https://api.userede.com.br/redelabs/merchant-statement/v1/sales",
+            url=f"{self.base_url}/merchant-statement/v1/sales",
             headers={"Authorization": self.bearer_token},
             params={
                 "startDate": str(start_date.date().strftime(DATE_FORMAT)),
                 "endDate": str(end_date.date().strftime(DATE_FORMAT)),
-                "parentCompanyNumber": "93122470",
-                "subsidiaries": "93122470",
+                "parentCompanyNumber": merchant.number,
+                "subsidiaries": ",".join(merchant.subsidiaries),
                 "size": "100",
                 **({"pageKey": next_key} if next_key else {}),
             },
@@ -267,12 +391,16 @@ class Rede:
             print(resp.text)
             raise e
 
-        return RedeDTO.parse_obj(resp.json())
+        if self.landing:
+            self.landing.save(
+                REDE_BANK, merchant.endpoint, start_date, end_date, page, resp.content
+            )
+        return RedeDTO.parse_raw(resp.content)
 
     @staticmethod
     def _to_default_transaction(tran: Transaction) -> Transactions:
         return Transactions(
-            bank="rede",
+            bank=REDE_BANK,
             date=datetime.combine(tran.movementDate, tran.saleHour),
             value=tran.amount,
             description=BRAND_CODE[tran.brandCode],
@@ -281,9 +409,57 @@ class Rede:
             category=Category.ENTRADA,
             counterpart_name="rede",
             validated=True,
-            external_id=f"{tran.movementDate}-{tran.saleHour}-{tran.authorizationCode}-{tran.strAuthorizationCode}-{tran.tokenNumber}",
+            external_id=Rede._external_id(tran),
         )
 
+    @staticmethod
+    def _external_id(tran: Transaction) -> str:
+        external_id = f"{tran.movementDate}-{tran.saleHour}-{tran.authorizationCode}-{tran.strAuthorizationCode}-{tran.tokenNumber}"
+        merchant = _merchant_number(tran)
+        # Authorization codes only identify a sale within its store
+        if merchant != REDE_MERCHANT:
+            return f"{merchant}-{external_id}"
+        return external_id
+
+    @staticmethod
+    def _to_sale_detail(tran: Transaction) -> dict[str, Any]:
+        amount = round(tran.amount * 100)
+        if tran.mdrAmount is not None:
+            mdr = round(tran.mdrAmount * 100)
+        else:
+            mdr = round(amount * tran.feeTotal / 100)
+        if tran.netAmount is not None:
+            net = round(tran.netAmount * 100)
+        else:
+            net = amount - mdr
+
+        return {
+            # Lower cased, the same as the transaction's
+            "external_id": Rede._external_id(tran).lower(),
+            "merchant": _merchant_number(tran),
+            "sale_date": tran.movementDate,
+            "brand": BRAND_CODE[tran.brandCode],
+            "modality": TRANSACION_TYPE[tran.modality.type],
+            "installments": tran.installmentQuantity or 1,
+            "nsu": tran.nsu,
+            "amount": amount,
+            "net_amount": net,
+            "mdr_amount": mdr,
+            "fee_total": tran.feeTotal,
+        }
+
+
+def _merchant_number(tran: Transaction) -> str:
+    return tran.merchant.companyNumber if tran.merchant else REDE_MERCHANT
+
+
+def save_sales(db: Database, sales: list[Transaction]) -> None:
+    """
+    Keep the fees of each sale, the ones already saved are left as they are
+    """
+    if sales:
+        db.execute(SAVE_SALES, [Rede._to_sale_detail(sale) for sale in sales])
+
 
 def _parse_row(row: pd.Series) -> tuple[Transactions, str]:
     date = row[Columns.DATE]
@@ -297,7 +473,7 @@ def _parse_row(row: pd.Series) -> tuple[Transactions, str]:
 
     return (
         Transactions(
-            bank="rede",
+            bank=REDE_BANK,
             date=date,
             value=value,
             description=str(row[Columns.DESCRIPTION]),
@@ -312,20 +488,29 @@ def _parse_row(row: pd.Series) -> tuple[Transactions, str]:
     )
 
 
-def _get_latest_transactions(
-    client: Rede, db: Database
-) -> list[tuple[Transactions, str]]:
-    last_date = db.get_latest_transaction(bank="rede") or (
-        datetime.now() - timedelta(days=1)
-    )
-    last_date -= timedelta(days=1)
-
+def _get_latest_sales(client: Rede, db: Database) -> list[Transaction]:
+    """
+    Sales since the day before each merchant's latest saved one, so a store
+    behind the others is caught up. A merchant without saved sales gets the
+    initial window
+    """
+    latest = {
+        merchant: datetime.strptime(day[:10], DATE_FORMAT)
+        for merchant, day in db.execute(LATEST_SALES).all()
+    }
+
+    # Sales are saved under the store that made them, maybe a subsidiary
+    starts = {}
+    for merchant in client.merchants:
+        numbers = {merchant.number, *merchant.subsidiaries}
+        days = [latest[number] for number in numbers if number in latest]
+        if days:
+            starts[merchant.number] = min(days) - timedelta(days=1)
+
+    initial = datetime.now() - timedelta(days=2)
     yesterday = datetime.combine(date.today() + timedelta(days=-1), datetime.max.time())
 
-    return [
-        (t, t.description)
-        for t in client.get_transactions(start_date=last_date, end_date=yesterday)
-    ]
+    return client.get_sales(start_date=initial, end_date=yesterday, starts=starts)
 
 
 def update_rede(
@@ -333,22 +518,40 @@ def update_rede(
     password: str = typer.Option(..., envvar="REDE_PASSWORD"),
     client_id: str = typer.Option(..., envvar="REDE_CLIENT_ID"),
     client_secret: str = typer.Option(..., envvar="REDE_CLIENT_SECRET"),
+    merchants: list[str] = typer.Option(
+        [REDE_MERCHANT],
+        "--merchant",
+        envvar="REDE_MERCHANTS",
+        help="Store number, or parent:subsidiary,subsidiary. Repeat for each one",
+    ),
 ):
+    db = Database.from_default()
+
     client = Rede(
         username=username,
         password=password,
         client_id=client_id,
         client_secret=client_secret,
+        landing=Landing.from_db(db),
+        merchants=[Merchant.parse(merchant) for merchant in merchants],
     )
 
-    db = Database.from_default()
-
     with db:
-        transactions = _get_latest_transactions(client, db)
-
-        print(
-            tabulate(
-                [t[0].dict() for t in transactions], headers="keys", tablefmt="psql"
+        with profiling.stage("fetch"):
+            sales = _get_latest_sales(client, db)
+        transactions = [
+            (t, t.description) for t in map(Rede._to_default_transaction, sales)
+        ]
+
+        with profiling.stage("render"):
+            print(
+                tabulate(
+                    [t[0].dict() for t in transactions],
+                    headers="keys",
+                    tablefmt="psql",
+                )
             )
-        )
         handle_inserts(transactions, db)
+
+    with db, profiling.stage("fees"):
+        save_sales(db, sales)
@@ -1,12 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
+from enum import Enum
 
 import pandas as pd
+import typer
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import case, func
+from sqlalchemy import func, literal_column
 from sqlmodel import select
 from tabulate import tabulate
 
-from fiscal.db import Balance, Database, Transactions
+from fiscal import cache
+from fiscal.db import (
+    AGGREGATE_KEY_COLUMNS,
+    DATE_FORMAT,
+    MONTH_FORMAT,
+    MONTHLY_AGGREGATES_FROM_TRANSACTIONS,
+    Balance,
+    Database,
+    EntryType,
+    Monthly_Aggregates,
+)
 
 
 def first_day_of_month(n_previous=1) -> datetime:
@@ -29,201 +42,360 @@ def last_day_of_month(n_previous=1) -> datetime:
     return last_day_of_month
 
 
-def diff_balance():
+class Granularity(str, Enum):
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+    def to_freq(self) -> str:
+        match self.value:
+            case Granularity.MONTH:
+                return "M"
+            case Granularity.QUARTER:
+                return "Q"
+            case Granularity.YEAR:
+                return "Y"
+        raise ValueError(self.value)
+
+
+# Period label of a monthly_aggregates row, same format as str(pd.Period)
+PERIOD_SQL = {
+    Granularity.MONTH: "month",
+    Granularity.QUARTER: (
+        "substr(month, 1, 4) || 'Q' || ((CAST(substr(month, 6, 2) AS INTEGER) + 2) / 3)"
+    ),
+    Granularity.YEAR: "substr(month, 1, 4)",
+}
+
+# Position of the period on a continuous axis, one year back is always the same offset
+PERIOD_POSITION_SQL = {
+    Granularity.MONTH: (
+        "CAST(substr(month, 1, 4) AS INTEGER) * 12 + CAST(substr(month, 6, 2) AS INTEGER)"
+    ),
+    Granularity.QUARTER: (
+        "CAST(substr(month, 1, 4) AS INTEGER) * 4"
+        " + (CAST(substr(month, 6, 2) AS INTEGER) + 2) / 3"
+    ),
+    Granularity.YEAR: "CAST(substr(month, 1, 4) AS INTEGER)",
+}
+
+PERIODS_PER_YEAR = {
+    Granularity.MONTH: 12,
+    Granularity.QUARTER: 4,
+    Granularity.YEAR: 1,
+}
+
+START = typer.Option(
+    None, formats=["%Y-%m"], help="First month (YYYY-MM), defaults to last month"
+)
+END = typer.Option(None, formats=["%Y-%m"], help="Last month (YYYY-MM), defaults to start")
+GRANULARITY = typer.Option(Granularity.MONTH, help="Size of each reported period")
+
+
+def _period_bounds(
+    start: datetime | None, end: datetime | None, granularity: Granularity
+) -> tuple[datetime, datetime]:
     """
-    Return the difference in balance for each bank from the end of one month to the end of the next one
+    First and last moment of the reported range, widened to whole periods
     """
-    print("Balance Report")
+    if start is None and end is None:
+        start = first_day_of_month(1)
 
-    db = Database.from_default()
+    freq = granularity.to_freq()
+    first = pd.Period(start or end, freq=freq)
+    last = pd.Period(end or start, freq=freq)
 
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = last_day_of_month(2).date()
-
-        statement = (
-            select(Balance)
-            .where(Balance.date >= first_day)
-            .where(Balance.date <= last_day)
-            .where(Balance.bank != "inter - investimentos")
-        )
+    first_day = datetime.combine(first.start_time.date(), datetime.min.time())
+    last_day = datetime.combine(last.end_time.date(), datetime.max.time())
+
+    return first_day, last_day
+
+
+def _periods(
+    first_day: datetime, last_day: datetime, granularity: Granularity
+) -> pd.PeriodIndex:
+    return pd.period_range(first_day, last_day, freq=granularity.to_freq())
 
-        balances = db.exec(statement).all()
 
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame([balance.dict() for balance in balances])
+def _load_month(
+    db: Database,
+    first_day: datetime,
+    last_day: datetime,
+    granularity: Granularity = Granularity.MONTH,
+) -> pd.DataFrame:
+    """
+    Load the months between the given days, already summed by every dimension used on the reports.
 
-        # Pivot so date is a new column
-        df = df.pivot(index="bank", columns="date", values="balance")
+    Reads the incrementally maintained monthly_aggregates, so there is one row per
+    (period, bank, entry_type, transaction_type, category) whatever the range
+    """
+    period = literal_column(PERIOD_SQL[granularity])
+
+    statement = (
+        select(
+            period.label("period"),
+            func.sum(Monthly_Aggregates.value).label("value"),
+            Monthly_Aggregates.bank,
+            Monthly_Aggregates.entry_type,
+            Monthly_Aggregates.transaction_type,
+            func.nullif(Monthly_Aggregates.category, "").label("category"),
+        )
+        .where(Monthly_Aggregates.month >= first_day.strftime(MONTH_FORMAT))
+        .where(Monthly_Aggregates.month <= last_day.strftime(MONTH_FORMAT))
+        .group_by(
+            period,
+            Monthly_Aggregates.bank,
+            Monthly_Aggregates.entry_type,
+            Monthly_Aggregates.transaction_type,
+            Monthly_Aggregates.category,
+        )
+    )
+
+    df = db.read_sql(statement)
 
-        # Include row with index total
-        df.loc["Total"] = df.sum()
+    # Conver value column to float
+    df["value"] = df["value"].astype(float)
 
-        df["diff"] = df[last_day.date()] - df[first_day]
-        print(tabulate(df, headers="keys", tablefmt="psql"))
+    return df
 
 
-def dre():
+def _load_fornecedores(
+    db: Database,
+    first_day: datetime,
+    last_day: datetime,
+    granularity: Granularity = Granularity.MONTH,
+) -> pd.DataFrame:
     """
-    Return the difference in balance for each bank from the end of one month to the end of the next one
+    Categorized saídas of our banks per period and counterpart, the only report that
+    needs counterparts, so `_load_month` does not carry one row per counterpart
     """
-    db = Database.from_default()
+    period = literal_column(PERIOD_SQL[granularity])
 
-    print("Total here should match the total in balances\n")
-
-    print(
-        (
-            "\t1. If consolidado and balances are matching, this means there are differences\n"
-            + "\tthis means that  there are transferência/ignorar wrong labeld"
+    statement = (
+        select(
+            period.label("period"),
+            func.sum(Monthly_Aggregates.value).label("value"),
+            Monthly_Aggregates.counterparty.label("fornecedor"),
         )
+        .where(Monthly_Aggregates.month >= first_day.strftime(MONTH_FORMAT))
+        .where(Monthly_Aggregates.month <= last_day.strftime(MONTH_FORMAT))
+        .where(Monthly_Aggregates.entry_type == EntryType.SAIDA.value)
+        .where(Monthly_Aggregates.bank != "rede")
+        .where(Monthly_Aggregates.category.not_in(["", "transferencia"]))
+        .group_by(period, Monthly_Aggregates.counterparty)
     )
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
-
-        statement = (
-            select(Transactions)
-            .where(Transactions.category != "transferencia")
-            .where(Transactions.bank != "rede")
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-        )
 
-        transactions = db.exec(statement).all()
+    df = db.read_sql(statement)
+    df["value"] = df["value"].astype(float)
+
+    return df
+
+
+TREND = """
+WITH series AS (
+    SELECT   {period} AS period
+            ,{position} AS position
+            ,category
+            ,SUM(CASE WHEN entry_type == 'saida' THEN -value ELSE value END) AS value
+    FROM "main"."monthly_aggregates"
+    WHERE month >= :lookback AND month <= :last_month
+        AND category NOT IN ('', 'transferencia') AND bank != 'rede'
+    GROUP BY 1, 2, 3
+)
+SELECT * FROM (
+    SELECT   period
+            ,category
+            ,value
+            ,SUM(value) OVER (
+                PARTITION BY category ORDER BY position
+                RANGE BETWEEN {per_year} PRECEDING AND {per_year} PRECEDING
+            ) AS previous_year
+    FROM series
+)
+WHERE period >= :first_period
+"""
+
+
+def _load_trend(
+    db: Database, first_day: datetime, last_day: datetime, granularity: Granularity
+) -> pd.DataFrame:
+    """
+    DRE value per category and period, next to the value of the same period one year before
+    """
+    statement = TREND.format(
+        period=PERIOD_SQL[granularity],
+        position=PERIOD_POSITION_SQL[granularity],
+        per_year=PERIODS_PER_YEAR[granularity],
+    )
+    result = db.execute(
+        statement,
+        {
+            "lookback": (first_day - relativedelta(years=1)).strftime(MONTH_FORMAT),
+            "last_month": last_day.strftime(MONTH_FORMAT),
+            "first_period": str(pd.Period(first_day, freq=granularity.to_freq())),
+        },
+    )
 
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame([balance.dict() for balance in transactions])
+    return pd.DataFrame(
+        result.all(), columns=["period", "category", "value", "previous_year"]
+    )
 
-        # fill NA on category empty
-        df["category"] = df["category"].fillna("n/a")
 
-        # Conver value column to float
-        df["value"] = df["value"].astype(float)
+REDE_FEES = """
+SELECT   {period} AS period
+        ,brand
+        ,modality
+        ,SUM(sales)
+        ,SUM(amount)
+        ,SUM(net_amount)
+        ,SUM(mdr_amount)
+FROM (
+    SELECT substr(day, 1, 7) AS month, *
+    FROM "main"."rede_fees_daily"
+    WHERE day >= :first_day AND day <= :last_day
+)
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+"""
+
+
+def _load_rede_fees(
+    db: Database, first_day: datetime, last_day: datetime, granularity: Granularity
+) -> pd.DataFrame:
+    """
+    Rede sales, net and MDR amounts per period, brand and modality, in reais
+    """
+    result = db.execute(
+        REDE_FEES.format(period=PERIOD_SQL[granularity]),
+        {
+            "first_day": first_day.strftime(DATE_FORMAT),
+            "last_day": last_day.strftime(DATE_FORMAT),
+        },
+    )
+    df = pd.DataFrame(
+        result.all(),
+        columns=["period", "brand", "modality", "sales", "amount", "net", "mdr"],
+    )
+    df[["amount", "net", "mdr"]] /= 100
+    return df
 
-        # Make negative where transactions are not entrada or transferencia
-        mask_saidas = df["entry_type"] == "saida"
-        df.loc[mask_saidas, "value"] = df.loc[mask_saidas, "value"] * -1
 
-        df = df[["date", "value", "category"]]
+def _load_balances(db: Database, first_day: date, last_day: datetime) -> pd.DataFrame:
+    statement = (
+        select(Balance)
+        .where(Balance.date >= first_day)
+        .where(Balance.date <= last_day)
+        .where(Balance.bank != "inter - investimentos")
+    )
 
-        # Group by category
-        df = (
-            df.groupby(["category"])
-            .sum(numeric_only=True)
-            .sort_values(by=["value"], ascending=False)
-        )
+    balances = db.exec(statement).all()
 
-        df.sort_values(by=["value"], ascending=False, inplace=True)
+    # Convert list of balances to pandas dataframe
+    return pd.DataFrame([balance.dict() for balance in balances])
 
-        print("All Transactions")
 
-        df.loc["Total"] = df.sum()
-        print(tabulate(df, headers="keys", tablefmt="psql"))
+def _categorized(month: pd.DataFrame) -> pd.DataFrame:
+    """
+    Transactions with a category that are not transfers between our own banks
+    """
+    mask = month["category"].notna() & (month["category"] != "transferencia")
+    return month.loc[mask]
 
-        print("DRE")
 
-        # Remove "compras" from the dataframe
-        df = df.drop("compras")
-        df = df.drop("investimentos", errors="ignore")
-        df = df.drop("resgate", errors="ignore")
-        df = df.drop("estorno", errors="ignore")
-        df = df.drop("Total")
+def _print_balances(balances: pd.DataFrame, first_day: date, last_day: date):
+    print("Balance Report")
 
-        df.loc["Total"] = df.sum()
-        print(tabulate(df, headers="keys", tablefmt="psql"))
+    df = balances.loc[balances["date"].isin([first_day, last_day])]
 
+    # Pivot so date is a new column
+    df = df.pivot(index="bank", columns="date", values="balance")
 
-def transfers():
-    """
-    Validate all transfers between banks
-    """
-    print("Transfer Report\n")
-    print("\t1. Totals should match\n\n")
+    # Include row with index total
+    df.loc["Total"] = df.sum()
 
-    db = Database.from_default()
+    df["diff"] = df[last_day] - df[first_day]
+    print(tabulate(df, headers="keys", tablefmt="psql"))
 
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
-
-        statement = (
-            select(
-                func.sum(Transactions.value),  # noqa
-                Transactions.bank,
-                Transactions.entry_type,
-            )
-            .where(Transactions.category == "transferencia")
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-            .group_by(Transactions.bank, Transactions.entry_type)
-            .order_by(Transactions.value)
-        )
 
-        transactions = db.exec(statement).all()
+def _print_dre(month: pd.DataFrame):
+    print("Total here should match the total in balances\n")
 
-        # Convert list of balances to pandas dataframe
-        df_saidas = (
-            pd.DataFrame(transactions, columns=["value", "bank", "entry_type"])
-            .pivot(index="bank", columns="entry_type", values="value")
-            .fillna(0)
+    print(
+        (
+            "\t1. If consolidado and balances are matching, this means there are differences\n"
+            + "\tthis means that  there are transferência/ignorar wrong labeld"
         )
+    )
 
-        # Create a column total with the diff from entrada and saida
-        df_saidas.loc["total"] = df_saidas.sum()
+    df = _categorized(month)
+    df = df.loc[df["bank"] != "rede"]
 
-        # pandas display dataframe pretty
-        print(df_saidas.to_markdown(floatfmt=",.2f"))
+    # Make negative where transactions are not entrada or transferencia
+    value = df["value"].where(df["entry_type"] != EntryType.SAIDA, -df["value"])
 
+    # Group by category
+    df = value.groupby(df["category"]).sum().to_frame("value")
 
-def entradas_e_saidas_por_banco():
-    """
-    Sum all transactions for each bank
-    """
-    print("Consolidado Report - all transactions")
+    df.sort_values(by=["value"], ascending=False, inplace=True)
 
-    db = Database.from_default()
+    print("All Transactions")
 
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
-
-        statement = (
-            select(
-                func.sum(Transactions.value),  # noqa
-                Transactions.bank,
-                Transactions.entry_type,
-            )
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-            .group_by(Transactions.bank, Transactions.entry_type)
-            .order_by(Transactions.value)
-        )
+    df.loc["Total"] = df.sum()
+    print(tabulate(df, headers="keys", tablefmt="psql"))
 
-        transactions = db.exec(statement).all()
+    print("DRE")
 
-        # Convert list of balances to pandas dataframe
-        df_saidas = (
-            pd.DataFrame(transactions, columns=["value", "bank", "entry_type"])
-            .pivot(index="bank", columns="entry_type", values="value")
-            .fillna(0)
-        )
+    # Remove "compras" from the dataframe
+    df = df.drop("compras", errors="ignore")
+    df = df.drop("investimentos", errors="ignore")
+    df = df.drop("resgate", errors="ignore")
+    df = df.drop("estorno", errors="ignore")
+    df = df.drop("Total")
 
-        # Create a column total with the diff from entrada and saida
-        df_saidas["total"] = df_saidas["entrada"] - df_saidas["saida"]
+    df.loc["Total"] = df.sum()
+    print(tabulate(df, headers="keys", tablefmt="psql"))
 
-        # pandas display dataframe pretty
-        print(df_saidas.to_markdown(floatfmt=",.2f"))
 
+def _print_transfers(month: pd.DataFrame):
+    print("Transfer Report\n")
+    print("\t1. Totals should match\n\n")
 
-# Validar se o que a REDE diz que me transferiu bate com o que eu recebi no itau
+    df = month.loc[month["category"] == "transferencia"]
 
+    df_saidas = (
+        df.groupby(["bank", "entry_type"])["value"]
+        .sum()
+        .unstack("entry_type")
+        .reindex(columns=["entrada", "saida"], fill_value=0)
+        .fillna(0)
+    )
 
-def compare_itau_and_rede():
-    """
-    (first) Check if numbers are sound
-    """
-    db = Database.from_default()
+    # Create a column total with the diff from entrada and saida
+    df_saidas.loc["total"] = df_saidas.sum()
+
+    # pandas display dataframe pretty
+    print(df_saidas.to_markdown(floatfmt=",.2f"))
 
+
+def _print_entradas_e_saidas_por_banco(month: pd.DataFrame):
+    print("Consolidado Report - all transactions")
+
+    df_saidas = (
+        month.groupby(["bank", "entry_type"])["value"]
+        .sum()
+        .unstack("entry_type")
+        .reindex(columns=["entrada", "saida"], fill_value=0)
+        .fillna(0)
+    )
+
+    # Create a column total with the diff from entrada and saida
+    df_saidas["total"] = df_saidas["entrada"] - df_saidas["saida"]
+
+    # pandas display dataframe pretty
+    print(df_saidas.to_markdown(floatfmt=",.2f"))
+
+
+def _print_compare_itau_and_rede(month: pd.DataFrame):
     print()
 
     print(
@@ -236,70 +408,58 @@ def compare_itau_and_rede():
         )
     )
     print("\n\n\n")
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
 
-        statement = (
-            select(Transactions)
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-        )
-        transactions = db.exec(statement).all()
-
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame([balance.dict() for balance in transactions])
-        df = df[["date", "value", "transaction_type", "entry_type", "bank", "category"]]
-
-        df["transaction_type"] = df["transaction_type"].replace("pix - recebido", "pix")
-        df["transaction_type"] = df["transaction_type"].replace("pix - enviado", "pix")
-
-        # Conver value column to float
-        df["value"] = df["value"].astype(float)
-
-        df = (
-            df.groupby(["bank", "entry_type", "transaction_type", "category"])
-            .sum(numeric_only=True)
-            .sort_values(by=["value"], ascending=False)
-            .reset_index()
-            .pivot(
-                index=["transaction_type", "entry_type", "category"],
-                columns="bank",
-                values="value",
-            )
-            .reset_index()
-            .sort_values(by=["entry_type", "transaction_type"])
-            .fillna(0)
-        )
+    # Uncategorized transactions are left out of this report
+    df = month.loc[month["category"].notna()].copy()
+
+    df["transaction_type"] = df["transaction_type"].replace("pix - recebido", "pix")
+    df["transaction_type"] = df["transaction_type"].replace("pix - enviado", "pix")
 
-        entradas = df.loc[df["entry_type"] == "entrada", :].copy()
-        entradas.loc["Total"] = entradas.sum()
-        entradas.loc["Total", "entry_type"] = None
-        entradas.loc["Total", "transaction_type"] = None
-        entradas.loc["Total", "category"] = None
-        print(entradas.to_markdown())
-
-        print("\n\n\n")
-        saidas = df.loc[df["entry_type"] != "entrada", :].copy()
-        saidas.loc["Total"] = saidas.sum()
-        saidas.loc["Total", "entry_type"] = None
-        saidas.loc["Total", "transaction_type"] = None
-        saidas.loc["Total", "category"] = None
-        print(saidas.to_markdown())
-
-        print(
-            (
-                entradas.loc["Total"].fillna(0) - saidas.loc["Total"].fillna(0)
-            ).to_markdown()
+    df = (
+        df.groupby(["bank", "entry_type", "transaction_type", "category"])
+        .sum(numeric_only=True)
+        .reset_index()
+        .pivot(
+            index=["transaction_type", "entry_type", "category"],
+            columns="bank",
+            values="value",
         )
+        .reset_index()
+        .sort_values(by=["entry_type", "transaction_type"])
+        .fillna(0)
+    )
 
+    entradas = df.loc[df["entry_type"] == "entrada", :].copy()
+    entradas.loc["Total"] = entradas.sum()
+    entradas.loc["Total", "entry_type"] = None
+    entradas.loc["Total", "transaction_type"] = None
+    entradas.loc["Total", "category"] = None
+    print(entradas.to_markdown())
 
-def entradas():
-    """
-    See all money that came in
-    """
-    db = Database.from_default()
+    print("\n\n\n")
+    saidas = df.loc[df["entry_type"] != "entrada", :].copy()
+    saidas.loc["Total"] = saidas.sum()
+    saidas.loc["Total", "entry_type"] = None
+    saidas.loc["Total", "transaction_type"] = None
+    saidas.loc["Total", "category"] = None
+    print(saidas.to_markdown())
+
+    print(
+        (entradas.loc["Total"].fillna(0) - saidas.loc["Total"].fillna(0)).to_markdown()
+    )
+
+
+def _by_category_and_bank(month: pd.DataFrame, entry_type: EntryType) -> pd.DataFrame:
+    df = _categorized(month)
+    df = df.loc[(df["entry_type"] == entry_type) & (df["bank"] != "rede")]
+
+    df = df.groupby(["category", "bank"])["value"].sum().unstack("bank").fillna(0)
 
+    # Appended, .loc can not add a row to the columnless frame of an empty period
+    return pd.concat([df, df.sum().to_frame("Total").T])
+
+
+def _print_entradas(month: pd.DataFrame):
     print()
 
     print(
@@ -311,132 +471,337 @@ def entradas():
         )
     )
     print("\n\n\n")
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
-
-        statement = (
-            select(
-                func.sum(Transactions.value),
-                Transactions.bank,
-                Transactions.category,
-            )
-            .where(Transactions.category != "transferencia")
-            .where(Transactions.entry_type == "entrada")
-            .where(Transactions.bank != "rede")
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-            .group_by(
-                Transactions.bank,
-                Transactions.category,
-            )
-            .order_by(Transactions.value)
-        )
-        transactions = db.exec(statement).all()
 
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame(transactions, columns=["value", "bank", "category"])
+    transactions = _by_category_and_bank(month, EntryType.ENTRADA)
+    print(transactions.to_markdown())
 
-        # Conver value column to float
-        df["value"] = df["value"].astype(float)
+    print(f"\n\nTotal : {transactions.loc['Total'].sum()}")
 
-        df = df.pivot(
-            index=["category"],
-            columns="bank",
-            values="value",
-        ).fillna(0)
 
-        transactions = df
-        transactions.loc["Total"] = transactions.sum()
-        print(transactions.to_markdown())
+def _print_saidas(month: pd.DataFrame):
+    print()
+
+    transactions = _by_category_and_bank(month, EntryType.SAIDA)
+    print(transactions.to_markdown(floatfmt=",.2f"))
+
+    print(f"Total : {transactions.loc['Total'].sum()}")
 
-        print(f"\n\nTotal : {transactions.loc['Total'].sum()}")
 
+def _print_fornecedores(fornecedores: pd.DataFrame):
+    print()
 
-def saidas():
+    df = fornecedores[["value", "fornecedor"]].sort_values(by="value")
+    print(df.reset_index(drop=True).to_markdown(floatfmt=",.2f"))
+
+
+def _print_trend(trend: pd.DataFrame):
+    print("Trend Report - DRE per category\n")
+
+    values = trend.pivot(index="category", columns="period", values="value").fillna(0)
+    values.loc["Total"] = values.sum()
+    print(values.to_markdown(floatfmt=",.2f"))
+
+    print("\nChange against the same period one year before\n")
+
+    previous = trend.pivot(index="category", columns="period", values="previous_year")
+    previous = previous.reindex_like(values.drop("Total")).fillna(0)
+    previous.loc["Total"] = previous.sum()
+    print((values - previous).to_markdown(floatfmt=",.2f"))
+
+
+def _print_rede_fees(fees: pd.DataFrame):
+    print("Taxas REDE - MDR efetivo por bandeira e modalidade\n")
+
+    if fees.empty:
+        print("Sem vendas da REDE no período")
+        return
+
+    fees = fees.copy()
+    fees["mdr %"] = fees["mdr"] / fees["amount"] * 100
+    # Everything Rede kept, MDR plus flex and other fees
+    fees["desconto %"] = (fees["amount"] - fees["net"]) / fees["amount"] * 100
+    print(fees.to_markdown(index=False, floatfmt=",.2f"))
+
+    total = fees[["sales", "amount", "net", "mdr"]].sum()
+    print(
+        f"\nTotal: {total['sales']:.0f} vendas, bruto {total['amount']:,.2f}, "
+        f"MDR {total['mdr'] / total['amount']:.2%}, "
+        f"desconto {1 - total['net'] / total['amount']:.2%}"
+    )
+
+
+def _print_by_period(printer, month: pd.DataFrame, periods: pd.PeriodIndex):
+    for period in periods:
+        if len(periods) > 1:
+            print(f"\n### {period}\n")
+        printer(month.loc[month["period"] == str(period)])
+
+
+def _report_month(
+    printer, start: datetime | None, end: datetime | None, granularity: Granularity
+) -> None:
+    db = Database.from_default(read_only=True)
+
+    first_day, last_day = _period_bounds(start, end, granularity)
+
+    def render():
+        with db:
+            month = _load_month(db, first_day, last_day, granularity)
+
+        _print_by_period(printer, month, _periods(first_day, last_day, granularity))
+
+    cache.show(db, printer.__name__, (first_day, last_day, granularity), render)
+
+
+def _balance_dates(period: pd.Period) -> tuple[date, date]:
     """
-    See all money that we paid out
+    Last day before the period and last day of the period
     """
-    db = Database.from_default()
+    return (period.start_time - relativedelta(days=1)).date(), period.end_time.date()
 
-    print()
 
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
-
-        statement = (
-            select(
-                func.sum(Transactions.value),
-                Transactions.bank,
-                Transactions.category,
-            )
-            .where(Transactions.category != "transferencia")
-            .where(Transactions.entry_type == "saida")
-            .where(Transactions.bank != "rede")
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-            .group_by(
-                Transactions.bank,
-                Transactions.category,
-            )
-            .order_by(Transactions.value)
-        )
-        transactions = db.exec(statement).all()
+def diff_balance(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    Return the difference in balance for each bank from the end of one month to the end of the next one
+    """
+    db = Database.from_default(read_only=True)
 
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame(transactions, columns=["value", "bank", "category"])
+    first_day, last_day = _period_bounds(start, end, granularity)
+    periods = _periods(first_day, last_day, granularity)
 
-        # Conver value column to float
-        df["value"] = df["value"].astype(float)
+    def render():
+        with db:
+            balances = _load_balances(db, _balance_dates(periods[0])[0], last_day)
 
-        df = df.pivot(
-            index=["category"],
-            columns="bank",
-            values="value",
-        ).fillna(0)
+        for period in periods:
+            if len(periods) > 1:
+                print(f"\n### {period}\n")
+            _print_balances(balances, *_balance_dates(period))
+
+    cache.show(db, "balances", (first_day, last_day, granularity), render)
+
+
+def dre(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    Return the difference in balance for each bank from the end of one month to the end of the next one
+    """
+    _report_month(_print_dre, start, end, granularity)
+
+
+def transfers(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    Validate all transfers between banks
+    """
+    _report_month(_print_transfers, start, end, granularity)
+
+
+def entradas_e_saidas_por_banco(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    Sum all transactions for each bank
+    """
+    _report_month(_print_entradas_e_saidas_por_banco, start, end, granularity)
+
+
+# Validar se o que a REDE diz que me transferiu bate com o que eu recebi no itau
 
-        transactions = df
-        transactions.loc["Total"] = transactions.sum()
-        print(transactions.to_markdown(floatfmt=",.2f"))
 
-        print(f"Total : {transactions.loc['Total'].sum()}")
+def compare_itau_and_rede(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    (first) Check if numbers are sound
+    """
+    _report_month(_print_compare_itau_and_rede, start, end, granularity)
+
+
+def entradas(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    See all money that came in
+    """
+    _report_month(_print_entradas, start, end, granularity)
+
+
+def saidas(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    See all money that we paid out
+    """
+    _report_month(_print_saidas, start, end, granularity)
 
 
-def fornecedores():
+def fornecedores(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
     """
     See all money categorized by fornecedor
     """
-    db = Database.from_default()
+    db = Database.from_default(read_only=True)
 
-    print()
+    first_day, last_day = _period_bounds(start, end, granularity)
 
-    with db:
-        last_day = last_day_of_month(1)
-        first_day = first_day_of_month(1)
+    def render():
+        with db:
+            fornecedores = _load_fornecedores(db, first_day, last_day, granularity)
 
-        statement = (
-            select(
-                func.sum(Transactions.value),
-                Transactions.counterpart_name,
-            )
-            .where(Transactions.category != "transferencia")
-            .where(Transactions.entry_type == "saida")
-            .where(Transactions.bank != "rede")
-            .where(Transactions.date >= first_day)
-            .where(Transactions.date <= last_day)
-            .group_by(
-                Transactions.counterpart_name,
+        periods = _periods(first_day, last_day, granularity)
+        _print_by_period(_print_fornecedores, fornecedores, periods)
+
+    cache.show(db, "fornecedores", (first_day, last_day, granularity), render)
+
+
+def trend(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    DRE of each category over time, compared with one year before
+    """
+    db = Database.from_default(read_only=True)
+
+    first_day, last_day = _period_bounds(start, end, granularity)
+
+    def render():
+        with db:
+            trend = _load_trend(db, first_day, last_day, granularity)
+
+        _print_trend(trend)
+
+    cache.show(db, "trend", (first_day, last_day, granularity), render)
+
+
+def rede_fees(
+    start: datetime = START, end: datetime = END, granularity: Granularity = GRANULARITY
+):
+    """
+    Effective MDR Rede charged per brand and modality
+    """
+    db = Database.from_default(read_only=True)
+
+    first_day, last_day = _period_bounds(start, end, granularity)
+
+    def render():
+        with db:
+            fees = _load_rede_fees(db, first_day, last_day, granularity)
+
+        _print_rede_fees(fees)
+
+    cache.show(db, "rede_fees", (first_day, last_day, granularity), render)
+
+
+def report_all(
+    output: str = typer.Option(None, help="Write every table to this file"),
+    start: datetime = START,
+    end: datetime = END,
+    granularity: Granularity = GRANULARITY,
+):
+    """
+    Run every report from a single load of the period
+    """
+    db = Database.from_default(read_only=True)
+
+    first_day, last_day = _period_bounds(start, end, granularity)
+    periods = _periods(first_day, last_day, granularity)
+
+    def load_balances():
+        with db:
+            return _load_balances(db, _balance_dates(periods[0])[0], last_day)
+
+    def load_month():
+        with db:
+            return _load_month(db, first_day, last_day, granularity)
+
+    def load_fornecedores():
+        with db:
+            return _load_fornecedores(db, first_day, last_day, granularity)
+
+    def render():
+        # Each thread gets its own session and pooled read only connection
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            balances = executor.submit(load_balances)
+            month = executor.submit(load_month)
+            fornecedores = executor.submit(load_fornecedores)
+            balances, month = balances.result(), month.result()
+            fornecedores = fornecedores.result()
+
+        for period in periods:
+            if len(periods) > 1:
+                print(f"\n### {period}\n")
+
+            _print_balances(balances, *_balance_dates(period))
+
+            period_month = month.loc[month["period"] == str(period)]
+            for printer in (
+                _print_dre,
+                _print_entradas_e_saidas_por_banco,
+                _print_compare_itau_and_rede,
+                _print_entradas,
+                _print_saidas,
+                _print_transfers,
+            ):
+                print("\n")
+                printer(period_month)
+
+            print("\n")
+            _print_fornecedores(
+                fornecedores.loc[fornecedores["period"] == str(period)]
             )
-            .order_by(Transactions.value)
+
+    content = cache.render(db, "all", (first_day, last_day, granularity), render)
+
+    if output:
+        with open(output, "w") as file:
+            file.write(content)
+    else:
+        print(content, end="")
+
+
+def verify_aggregates(
+    rebuild: bool = typer.Option(False, help="Recompute the table when it differs"),
+):
+    """
+    Compare monthly_aggregates against a full recomputation from transactions
+    """
+    db = Database.from_default(read_only=not rebuild)
+
+    columns = [column.strip() for column in AGGREGATE_KEY_COLUMNS.split(",")]
+
+    with db:
+        expected = pd.DataFrame(
+            db.execute(MONTHLY_AGGREGATES_FROM_TRANSACTIONS).all(),
+            columns=columns + ["value", "quantity"],
+        )
+        stored = pd.DataFrame(
+            db.execute(
+                f"SELECT {AGGREGATE_KEY_COLUMNS}, value, quantity FROM monthly_aggregates"
+            ).all(),
+            columns=columns + ["value", "quantity"],
+        )
+
+        df = expected.merge(
+            stored, on=columns, how="outer", suffixes=("_expected", "_stored")
+        ).fillna(0)
+
+        mismatch = (df["quantity_expected"] != df["quantity_stored"]) | (
+            (df["value_expected"] - df["value_stored"]).abs() > 0.005
         )
-        transactions = db.exec(statement).all()
 
-        # Convert list of balances to pandas dataframe
-        df = pd.DataFrame(transactions, columns=["value", "fornecedor"])
+        if not mismatch.any():
+            print(f"monthly_aggregates is consistent ({len(df)} groups)")
+            return
 
-        # Conver value column to float
-        df["value"] = df["value"].astype(float)
+        print(tabulate(df.loc[mismatch], headers="keys", tablefmt="psql"))
+        print(f"{mismatch.sum()} of {len(df)} groups differ")
 
-        df.sort_values(by="value", inplace=True)
-        print(df.to_markdown(floatfmt=",.2f"))
+        if rebuild:
+            db.rebuild_monthly_aggregates()
+            print("monthly_aggregates rebuilt")
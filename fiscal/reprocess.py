@@ -0,0 +1,159 @@
+"""
+Rebuild transactions from the pages kept in the landing store.
+
+After a fix to how API transactions are converted, `fiscal reprocess` applies
+it to everything already fetched: transactions already in the database get the
+converted fields again (category and validation are kept, they are decisions
+taken on import), and the ones missing go through the regular import
+"""
+from datetime import date, datetime
+from typing import Callable, Iterator, Optional
+
+import typer
+
+from fiscal import fetcher, profiling
+from fiscal.banco_inter import INTER_BANK, GetTransactions, _convert_transaction
+from fiscal.db import Database, Transactions
+from fiscal.landing import Landing
+from fiscal.rede import (
+    REDE_BANK,
+    REDE_MERCHANT,
+    Rede,
+    RedeDTO,
+    SaleMerchant,
+    Transaction,
+    save_sales,
+)
+
+# Columns the conversion fills, the others belong to the import
+CONVERTED_FIELDS = [
+    "date",
+    "entry_type",
+    "transaction_type",
+    "description",
+    "value",
+    "counterpart_name",
+]
+
+
+def _inter_transactions(
+    landing: Landing, since: date | None
+) -> Iterator[tuple[Transactions, str]]:
+    for page in landing.pages(INTER_BANK, "extrato", since):
+        for transaction in GetTransactions.parse_raw(page.read()).transacoes:
+            yield _convert_transaction(transaction)
+
+
+def _rede_sales(landing: Landing, since: date | None) -> Iterator[Transaction]:
+    for endpoint in landing.endpoints(REDE_BANK):
+        # "sales" for the first store, "sales-<number>" for the others
+        if endpoint != "sales" and not endpoint.startswith("sales-"):
+            continue
+        number = endpoint.removeprefix("sales-") if endpoint != "sales" else REDE_MERCHANT
+        merchant = SaleMerchant(companyNumber=number)
+
+        for page in landing.pages(REDE_BANK, endpoint, since):
+            for sale in RedeDTO.parse_raw(page.read()).content.transactions:
+                sale.merchant = sale.merchant or merchant
+                yield sale
+
+
+def _rede_transactions(
+    landing: Landing, since: date | None
+) -> Iterator[tuple[Transactions, str]]:
+    for sale in _rede_sales(landing, since):
+        transaction = Rede._to_default_transaction(sale)
+        yield transaction, transaction.description
+
+
+SOURCES: dict[
+    str, Callable[[Landing, date | None], Iterator[tuple[Transactions, str]]]
+] = {
+    INTER_BANK: _inter_transactions,
+    REDE_BANK: _rede_transactions,
+}
+
+
+def load(
+    landing: Landing, source: str, since: date | None = None
+) -> dict[str, tuple[Transactions, str]]:
+    """
+    Converted transactions by external id. Pages fetched later win
+    """
+    with profiling.stage("parse"):
+        return {
+            transaction.external_id: (transaction, cnpj)
+            for transaction, cnpj in SOURCES[source](landing, since)
+        }
+
+
+def _update_existing(
+    db: Database, bank: str, transactions: dict[str, tuple[Transactions, str]]
+) -> tuple[set[str], int]:
+    """
+    Refresh the converted fields of the transactions already in the database.
+    Returns their external ids and how many changed
+    """
+    existing = set()
+    changed = 0
+
+    for current in db.get_transactions(bank=bank):
+        if current.external_id not in transactions:
+            continue
+        existing.add(current.external_id)
+
+        converted, _ = transactions[current.external_id]
+        if not fetcher._has_counterpart(converted):
+            converted.counterpart_name = None
+
+        updates = {
+            field: getattr(converted, field)
+            for field in CONVERTED_FIELDS
+            if getattr(converted, field) != getattr(current, field)
+        }
+        if updates:
+            for field, value in updates.items():
+                setattr(current, field, value)
+            db.add(current)
+            changed += 1
+
+    return existing, changed
+
+
+def reprocess(
+    source: Optional[str] = typer.Option(
+        None, help=f"One of {', '.join(SOURCES)}, all of them by default"
+    ),
+    since: Optional[datetime] = typer.Option(
+        None, help="Only pages of fetches ending on or after this day"
+    ),
+):
+    db = Database.from_default()
+    landing = Landing.from_db(db)
+    if landing is None:
+        print("No landing store for this database")
+        raise typer.Exit(1)
+
+    if source is not None and source not in SOURCES:
+        print(f"Unknown source '{source}'")
+        raise typer.Exit(1)
+
+    first_day = since.date() if since else None
+    for name in [source] if source else list(SOURCES):
+        transactions = load(landing, name, first_day)
+
+        with db, profiling.stage("update"):
+            existing, changed = _update_existing(db, name, transactions)
+
+        new = [row for key, row in transactions.items() if key not in existing]
+        print(
+            f"{name}: {len(transactions)} stored, {changed} updated, {len(new)} new"
+        )
+
+        if new:
+            fetcher.handle_inserts(new, db)
+
+        # Fees of the sales fetched before they were kept
+        if name == REDE_BANK:
+            with db, profiling.stage("fees"):
+                save_sales(db, list(_rede_sales(landing, first_day)))
@@ -0,0 +1,302 @@
+"""
+Reconcile Rede card sales with the deposits Rede makes into Itaú.
+
+Sales are summed by day, brand and modality, net of fees when the sale's
+details were kept, and each day is moved to the date Rede is expected to pay
+it: the next business day for débito, thirty days later (rolled to a business
+day) for crédito. Itaú deposits are summed the same way, with the brand and
+modality read from the statement description.
+
+Both sides are sorted by (brand, modality, date) and walked together once. A
+deposit on the expected day settles it, one up to a few business days late
+(holidays) also does, anything else is reported: sales never paid, deposits
+without sales and paid amounts further from the sales than the card fees
+explain
+"""
+from datetime import date, datetime, timedelta
+from typing import Iterator, NamedTuple
+
+import typer
+from tabulate import tabulate
+
+from fiscal import profiling
+from fiscal.db import DATE_FORMAT, Database
+from fiscal.rede import REDE_BANK
+from fiscal.reports import END, GRANULARITY, START, Granularity, _period_bounds
+
+ITAU_BANK = "itau"
+
+# Days after the sale Rede pays each modality
+SETTLEMENT_DAYS = {"débito": 1, "crédito": 30}
+
+# Business days a deposit may come after the expected date
+SLACK_DAYS = 3
+
+# Share of the sales Rede may keep as fees before a deposit is a mismatch, for
+# sales without their net amount
+MAX_FEE_RATE = 0.06
+
+# Brand codes on Itaú deposits, as named by rede.BRAND_CODE
+ITAU_BRANDS = {
+    "MAST": "mastercard",
+    "MC": "mastercard",
+    "VISA": "visa",
+    "VS": "visa",
+    "ELO": "elo",
+    "EL": "elo",
+    "DN": "dinners",
+    "AM": "amex",
+}
+
+SALES = """
+SELECT   date(TRA.date)
+        ,lower(TRA.description)
+        ,lower(TRA.transaction_type)
+        ,SUM(COALESCE(SALE.net_amount, CAST(ROUND(TRA.value * 100) AS INTEGER)))
+        ,COUNT(*)
+FROM "main"."transactions" as TRA
+    LEFT JOIN "main"."rede_sales" as SALE ON SALE.external_id == TRA.external_id
+WHERE TRA.bank == :bank AND TRA.date BETWEEN :start AND :end
+GROUP BY 1, 2, 3
+"""
+
+DEPOSITS = """
+SELECT   date(TRA.date)
+        ,TRA.description
+        ,SUM(CAST(ROUND(TRA.value * 100) AS INTEGER))
+FROM "main"."transactions" as TRA
+WHERE TRA.bank == :bank
+    AND TRA.entry_type == 'entrada'
+    AND TRA.description LIKE 'rede %'
+    AND TRA.date BETWEEN :start AND :end
+GROUP BY 1, 2
+"""
+
+
+class Key(NamedTuple):
+    brand: str
+    modality: str
+    day: date
+
+
+class Settlement(NamedTuple):
+    key: Key
+    status: str
+    expected: int
+    deposited: int
+    sales: int
+    # Day of the deposit when it is not the expected one
+    paid_on: date | None = None
+
+    def row(self) -> dict[str, object]:
+        return {
+            "Dia": self.key.day.strftime(DATE_FORMAT),
+            "Bandeira": self.key.brand,
+            "Modalidade": self.key.modality,
+            "Vendas": self.sales,
+            "Esperado": self.expected / 100,
+            "Depositado": self.deposited / 100,
+            "Taxa": (
+                f"{1 - self.deposited / self.expected:.2%}"
+                if self.expected and self.deposited
+                else ""
+            ),
+            "Pago em": self.paid_on.strftime(DATE_FORMAT) if self.paid_on else "",
+            "Status": self.status,
+        }
+
+
+def _business_day(day: date) -> date:
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def _add_business_days(day: date, days: int) -> date:
+    for _ in range(days):
+        day = _business_day(day + timedelta(days=1))
+    return day
+
+
+def expected_settlement(sale: date, modality: str) -> date:
+    days = SETTLEMENT_DAYS.get(modality, SETTLEMENT_DAYS["crédito"])
+    if days == 1:
+        return _add_business_days(sale, 1)
+    return _business_day(sale + timedelta(days=days))
+
+
+def parse_deposit(description: str) -> tuple[str, str] | None:
+    """
+    Brand and modality of an Itaú deposit like "REDE   MAST DB093122470" or
+    "REDE  MC  093122470", in any case
+    """
+    parts = description.upper().split()
+    if len(parts) != 3 or parts[0] != "REDE" or parts[1] not in ITAU_BRANDS:
+        return None
+    modality = "débito" if parts[2].startswith("DB") else "crédito"
+    return ITAU_BRANDS[parts[1]], modality
+
+
+def _to_date(value: str) -> date:
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def _expected(
+    db: Database, first_day: date, last_day: date
+) -> dict[Key, tuple[int, int]]:
+    """
+    Cents and number of sales due on each day of the range
+    """
+    longest = max(SETTLEMENT_DAYS.values()) + 7
+    params = {
+        "bank": REDE_BANK,
+        "start": datetime.combine(
+            first_day - timedelta(days=longest), datetime.min.time()
+        ),
+        "end": datetime.combine(last_day, datetime.max.time()),
+    }
+
+    expected: dict[Key, tuple[int, int]] = {}
+    for day, brand, modality, cents, sales in db.execute(SALES, params).all():
+        due = expected_settlement(_to_date(day), modality)
+        if not first_day <= due <= last_day:
+            continue
+        key = Key(brand, modality, due)
+        total, count = expected.get(key, (0, 0))
+        expected[key] = (total + cents, count + sales)
+    return expected
+
+
+def _deposits(db: Database, first_day: date, last_day: date) -> dict[Key, int]:
+    params = {
+        "bank": ITAU_BANK,
+        "start": datetime.combine(first_day, datetime.min.time()),
+        "end": datetime.combine(
+            _add_business_days(last_day, SLACK_DAYS), datetime.max.time()
+        ),
+    }
+
+    deposits: dict[Key, int] = {}
+    for day, description, cents in db.execute(DEPOSITS, params).all():
+        parsed = parse_deposit(description)
+        if parsed is None:
+            continue
+        key = Key(*parsed, _to_date(day))
+        deposits[key] = deposits.get(key, 0) + cents
+    return deposits
+
+
+def _status(expected: int, deposited: int, late: bool) -> str:
+    if not 0 <= expected - deposited <= expected * MAX_FEE_RATE:
+        return "divergente"
+    return "atrasado" if late else "ok"
+
+
+def merge(
+    expected: dict[Key, tuple[int, int]], deposits: dict[Key, int], last_day: date
+) -> Iterator[Settlement]:
+    """
+    Walk both sides sorted by (brand, modality, day). A deposit settles the sales
+    due on its day or, when nothing else was due on it, the earlier sales of the
+    same brand and modality still open up to SLACK_DAYS business days before
+    """
+    due = sorted(expected)
+    paid = sorted(deposits)
+    i = j = 0
+
+    while i < len(due) or j < len(paid):
+        sale = due[i] if i < len(due) else None
+        deposit = paid[j] if j < len(paid) else None
+
+        if deposit is None or (sale is not None and sale < deposit):
+            assert sale is not None
+            cents, sales = expected[sale]
+            i += 1
+            late = (
+                deposit is not None
+                and deposit[:2] == sale[:2]
+                and deposit.day <= _add_business_days(sale.day, SLACK_DAYS)
+                and (i == len(due) or due[i] > deposit)
+            )
+            if late:
+                assert deposit is not None
+                j += 1
+                yield Settlement(
+                    sale,
+                    _status(cents, deposits[deposit], late=True),
+                    cents,
+                    deposits[deposit],
+                    sales,
+                    paid_on=deposit.day,
+                )
+            else:
+                yield Settlement(sale, "não pago", cents, 0, sales)
+
+        elif sale is None or deposit < sale:
+            j += 1
+            # Deposits after the range only pay late sales from inside it
+            if deposit.day <= last_day:
+                yield Settlement(deposit, "sem vendas", 0, deposits[deposit], 0)
+
+        else:
+            cents, sales = expected[sale]
+            i += 1
+            j += 1
+            yield Settlement(
+                sale,
+                _status(cents, deposits[deposit], late=False),
+                cents,
+                deposits[deposit],
+                sales,
+            )
+
+
+def reconcile(db: Database, first_day: date, last_day: date) -> list[Settlement]:
+    """
+    Every expected settlement and Rede deposit between the two days, by day
+    """
+    with profiling.stage("load"):
+        expected = _expected(db, first_day, last_day)
+        deposits = _deposits(db, first_day, last_day)
+
+    with profiling.stage("merge"):
+        settlements = list(merge(expected, deposits, last_day))
+
+    settlements.sort(key=lambda settlement: (settlement.key.day, settlement.key))
+    return settlements
+
+
+def settlement(
+    start: datetime = START,
+    end: datetime = END,
+    granularity: Granularity = GRANULARITY,
+    show_all: bool = typer.Option(False, "--all", help="Also show the settled days"),
+):
+    """
+    Check that Itaú received what Rede owed for each day
+    """
+    first_day, last_day = _period_bounds(start, end, granularity)
+    last_day = min(last_day, datetime.today() - timedelta(days=1))
+
+    db = Database.from_default(read_only=True)
+    with db:
+        settlements = reconcile(db, first_day.date(), last_day.date())
+
+    shown = [s for s in settlements if show_all or s.status != "ok"]
+    if shown:
+        print(
+            tabulate(
+                [s.row() for s in shown],
+                headers="keys",
+                tablefmt="psql",
+                floatfmt=".2f",
+            )
+        )
+
+    problems = [s for s in settlements if s.status not in ("ok", "atrasado")]
+    expected = sum(s.expected for s in settlements)
+    deposited = sum(s.deposited for s in settlements)
+    print(
+        f"{len(settlements) - len(problems)} of {len(settlements)} settled, "
+        f"expected {expected / 100:.2f}, deposited {deposited / 100:.2f}"
+    )
@@ -0,0 +1,210 @@
+"""
+Pair transfers between our own banks.
+
+Money sent from one of our accounts shows up as a saída in that bank and an
+entrada of the same value in another one, the same day or shortly after.
+Unlinked transactions are bucketed by value in cents, and inside a bucket the
+entradas are sorted by day so the ones near each saída are found with a bisect.
+
+A saída and an entrada are paired when each is the only candidate of the other:
+two transfers of the same value on the same days can't be told apart, so they
+are left for labeling by hand. Only transactions without a category, already
+categorized as transferencia or, for entradas, with the `entrada` every import
+gives them are candidates: a category chosen by someone, like a supplier
+payment, is never taken for a transfer. Paired transactions are linked in
+`transfer_links` and re-labeled as transferencia, which is what the reports
+already expect
+"""
+import bisect
+from collections import defaultdict
+from typing import NamedTuple
+
+import typer
+from tabulate import tabulate
+
+from fiscal import profiling
+from fiscal.db import Category, Database, EntryType
+from fiscal.fetcher import NO_COUNTERPARTY
+from fiscal.rede import REDE_BANK
+
+TRANSFER_CATEGORY = "transferencia"
+
+# Days between the saída and the entrada
+WINDOW_DAYS = 1
+
+CANDIDATES = """
+SELECT   TRA.id
+        ,TRA.bank
+        ,TRA.entry_type
+        ,CAST(ROUND(TRA.value * 100) AS INTEGER)
+        ,TRA.date
+        ,CAST(julianday(date(TRA.date)) AS INTEGER)
+FROM "main"."transactions" as TRA
+WHERE TRA.bank != :rede
+    AND (
+        TRA.category IS NULL
+        OR TRA.category == :category
+        OR (TRA.entry_type == 'entrada' AND TRA.category == :entrada)
+    )
+    AND TRA.transaction_type NOT IN ({})
+    AND NOT EXISTS (SELECT 1 FROM transfer_links as LNK WHERE LNK.saida == TRA.id)
+    AND NOT EXISTS (SELECT 1 FROM transfer_links as LNK WHERE LNK.entrada == TRA.id)
+    AND NOT EXISTS (SELECT 1 FROM validations as VAL WHERE VAL.transacao == TRA.id)
+"""
+
+INSERT_LINK = """
+INSERT INTO transfer_links (saida, entrada)
+VALUES (:saida, :entrada);
+"""
+
+CATEGORIZE = """
+UPDATE transactions
+SET category = :category
+WHERE id = :id AND (category IS NULL OR category == :entrada);
+"""
+
+
+class Candidate(NamedTuple):
+    id: int
+    bank: str
+    entry_type: str
+    cents: int
+    date: str
+    day: int
+
+
+class Transfer(NamedTuple):
+    saida: Candidate
+    entrada: Candidate
+
+    def row(self) -> dict[str, object]:
+        return {
+            "Valor": self.saida.cents / 100,
+            "De": self.saida.bank,
+            "Saída": self.saida.date[:10],
+            "Para": self.entrada.bank,
+            "Entrada": self.entrada.date[:10],
+            "Ids": f"{self.saida.id} -> {self.entrada.id}",
+        }
+
+
+def _bucket(
+    saidas: list[Candidate], entradas: list[Candidate], window: int
+) -> tuple[list[Transfer], int]:
+    """
+    Pairs of one value and how many saídas had more than one way to pair
+    """
+    entradas.sort(key=lambda entrada: entrada.day)
+    days = [entrada.day for entrada in entradas]
+
+    options: dict[int, list[Candidate]] = {}
+    chosen_by: dict[int, int] = defaultdict(int)
+    for saida in saidas:
+        start = bisect.bisect_left(days, saida.day - window)
+        end = bisect.bisect_right(days, saida.day + window)
+        options[saida.id] = [
+            entrada for entrada in entradas[start:end] if entrada.bank != saida.bank
+        ]
+        for entrada in options[saida.id]:
+            chosen_by[entrada.id] += 1
+
+    pairs = []
+    ambiguous = 0
+    for saida in saidas:
+        found = options[saida.id]
+        if not found:
+            continue
+        if len(found) == 1 and chosen_by[found[0].id] == 1:
+            pairs.append(Transfer(saida, found[0]))
+        else:
+            ambiguous += 1
+    return pairs, ambiguous
+
+
+def find_transfers(
+    db: Database, window: int = WINDOW_DAYS
+) -> tuple[list[Transfer], int]:
+    """
+    Unambiguous transfers between two of our banks, and how many saídas could
+    be paired more than one way
+    """
+    excluded = ", ".join(f"'{kind.value}'" for kind in NO_COUNTERPARTY)
+
+    with profiling.stage("candidates"):
+        params = {
+            "rede": REDE_BANK,
+            "category": TRANSFER_CATEGORY,
+            "entrada": Category.ENTRADA.value,
+        }
+        rows = db.execute(CANDIDATES.format(excluded), params).all()
+
+    buckets: dict[int, tuple[list[Candidate], list[Candidate]]] = defaultdict(
+        lambda: ([], [])
+    )
+    for row in rows:
+        candidate = Candidate(*row)
+        saidas, entradas = buckets[candidate.cents]
+        if candidate.entry_type == EntryType.SAIDA.value:
+            saidas.append(candidate)
+        else:
+            entradas.append(candidate)
+
+    transfers = []
+    ambiguous = 0
+    with profiling.stage("pair"):
+        for saidas, entradas in buckets.values():
+            if not saidas or not entradas:
+                continue
+            pairs, unsure = _bucket(saidas, entradas, window)
+            transfers += pairs
+            ambiguous += unsure
+
+    return transfers, ambiguous
+
+
+def link(db: Database, transfers: list[Transfer]) -> None:
+    if not transfers:
+        return
+    db.execute(
+        INSERT_LINK,
+        [{"saida": t.saida.id, "entrada": t.entrada.id} for t in transfers],
+    )
+    db.execute(
+        CATEGORIZE,
+        [
+            {
+                "id": side.id,
+                "category": TRANSFER_CATEGORY,
+                "entrada": Category.ENTRADA.value,
+            }
+            for transfer in transfers
+            for side in transfer
+        ],
+    )
+
+
+def pair_transfers(
+    window: int = typer.Option(WINDOW_DAYS, help="Days between saída and entrada"),
+    dry_run: bool = typer.Option(False, help="Only show the transfers found"),
+):
+    db = Database.from_default()
+
+    with db:
+        transfers, ambiguous = find_transfers(db, window)
+        transfers.sort(key=lambda transfer: transfer.saida.date)
+
+        if transfers:
+            print(
+                tabulate(
+                    [transfer.row() for transfer in transfers],
+                    headers="keys",
+                    tablefmt="psql",
+                    floatfmt=".2f",
+                )
+            )
+
+        if not dry_run:
+            link(db, transfers)
+
+    verb = "Would link" if dry_run else "Linked"
+    print(f"{verb} {len(transfers)} transfers, {ambiguous} ambiguous left to label")
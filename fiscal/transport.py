@@ -0,0 +1,224 @@
+"""
+HTTP transport shared by the bank API clients.
+
+    transport = Transport(cert=("certificado.crt", "chave.key"), rate_limit=5)
+    resp = transport.get(url, params=params)
+
+Wraps one keep-alive `requests.Session` with a sized connection pool, a default
+timeout and a per host rate limit. Responses with 429 or 5xx and dropped
+connections are retried with exponential backoff, waiting what `Retry-After`
+asks for when the server sends it. Only idempotent methods are retried unless
+the caller passes `retry=True`: a POST that timed out may have gone through. The
+last response is returned as is, so the clients still decide what to do with
+errors through `raise_for_status`.
+
+Every attempt is recorded in `metrics` with its latency, size and retry number
+"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, NamedTuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Methods that can be sent twice without doing twice what they ask
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+MAX_RETRIES = 4
+# Seconds before the first retry, doubled on each of the next ones
+BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+# (connect, read) seconds
+TIMEOUT = (10.0, 60.0)
+
+POOL_SIZE = 8
+
+
+class RequestMetric(NamedTuple):
+    method: str
+    url: str
+    status: int | None
+    seconds: float
+    bytes: int
+    retry: int
+
+
+class RateLimiter:
+    """
+    Spaces out requests to at most `rate` per second, across threads
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            # No slot is further away than the requests already waiting, even
+            # if the clock went back (or was frozen and thawed, in the tests)
+            latest = now + self.interval * (self._waiting + 1)
+            slot = min(max(now, self._next), latest)
+            self._next = slot + self.interval
+            self._waiting += 1
+        try:
+            if slot > now:
+                time.sleep(slot - now)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+
+# Limits apply per host, whichever client or transport is talking to it
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter(host: str, rate: float) -> RateLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None or limiter.interval != 1 / rate:
+            limiter = _limiters[host] = RateLimiter(rate)
+        return limiter
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    """
+    Seconds asked by `Retry-After`, which is either a number or an HTTP date
+    """
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class Transport:
+    def __init__(
+        self,
+        cert: tuple[str, str] | None = None,
+        rate_limit: float | None = None,
+        max_retries: int = MAX_RETRIES,
+        backoff: float | None = None,
+        timeout: float | tuple[float, float] = TIMEOUT,
+        pool_size: int = POOL_SIZE,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        # Read when the transport is made, so tests can patch BACKOFF to 0
+        self.backoff = BACKOFF if backoff is None else backoff
+        self.timeout = timeout
+        self.metrics: list[RequestMetric] = []
+        # Waits between retries, the rate limit always uses the real clock
+        self._sleep = sleep
+
+        self._session = requests.Session()
+        # Sent on every request of the session
+        self._session.cert = cert
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._metrics_lock = threading.Lock()
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self, method: str, url: str, retry: bool | None = None, **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send the request, retrying failures when `retry` (by default, when the
+        method is idempotent)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        limiter = (
+            _limiter(urlparse(url).netloc, self.rate_limit) if self.rate_limit else None
+        )
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        max_retries = self.max_retries if retry else 0
+
+        for attempt in range(max_retries + 1):
+            if limiter:
+                limiter.wait()
+
+            start = time.perf_counter()
+            try:
+                resp = self._session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(method, url, None, start, 0, attempt)
+                if attempt == max_retries:
+                    raise
+                self._sleep(self._backoff(attempt))
+                continue
+
+            size = len(resp.content)
+            self._record(method, url, resp.status_code, start, size, attempt)
+            if resp.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return resp
+
+            delay = _retry_after(resp)
+            self._sleep(
+                min(delay, MAX_BACKOFF) if delay is not None else self._backoff(attempt)
+            )
+
+        raise AssertionError("unreachable")
+
+    def _backoff(self, retry: int) -> float:
+        # Jitter keeps parallel fetches from retrying in lockstep
+        delay = self.backoff * 2**retry * random.uniform(0.5, 1.0)
+        return min(delay, MAX_BACKOFF)
+
+    def _record(
+        self,
+        method: str,
+        url: str,
+        status: int | None,
+        start: float,
+        size: int,
+        retry: int,
+    ) -> None:
+        metric = RequestMetric(
+            method, url, status, time.perf_counter() - start, size, retry
+        )
+        with self._metrics_lock:
+            self.metrics.append(metric)
+
+    @property
+    def retries(self) -> int:
+        return sum(1 for metric in self.metrics if metric.retry)
+
+    def summary(self) -> dict[str, Any]:
+        seconds = sorted(metric.seconds for metric in self.metrics)
+        return {
+            "requests": len(self.metrics),
+            "retries": self.retries,
+            "failed": sum(
+                1
+                for metric in self.metrics
+                if metric.status is None or metric.status >= 400
+            ),
+            "bytes": sum(metric.bytes for metric in self.metrics),
+            "seconds": sum(seconds),
+            "p95 seconds": seconds[int(len(seconds) * 0.95)] if seconds else 0.0,
+        }
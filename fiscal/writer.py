@@ -0,0 +1,151 @@
+"""
+Write models to the database on a dedicated thread.
+
+Importers parse files or page through APIs while earlier rows are being written:
+models are grouped in batches, handed over through a bounded queue and committed
+by a single writer thread, one transaction per batch. A batch that fails is
+written again row by row, so one bad row doesn't take the rest of the import
+with it.
+"""
+import queue
+import threading
+from types import TracebackType
+from typing import TypeVar
+
+from sqlmodel import SQLModel
+
+from fiscal import profiling
+from fiscal.db import Database
+
+Model = TypeVar("Model", bound=SQLModel)
+
+BATCH_SIZE = 500
+
+# Batches waiting to be written before `add` blocks the producer
+MAX_PENDING_BATCHES = 4
+
+_DONE = None
+
+
+class WriteError(Exception):
+    """
+    Rows that could not be written, after everything else was
+    """
+
+    def __init__(self, failed: list[tuple[SQLModel, Exception]]) -> None:
+        self.failed = failed
+        rows = "\n".join(f"  {model!r}: {error}" for model, error in failed)
+        super().__init__(f"{len(failed)} rows were not written:\n{rows}")
+
+
+class BatchWriter:
+    """
+    Single writer consuming batches of models from a bounded queue.
+
+        with BatchWriter(db) as writer:
+            for row in rows:
+                writer.add(parse(row))
+
+    Models are expunged from the writer session after being flushed, so the
+    producer can keep reading the attributes of what it added. Whatever was
+    added is written before leaving the block, even when the producer fails.
+    Rows the database refuses are kept in `failed` and raised as a WriteError
+    when leaving the block
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = BATCH_SIZE,
+        max_pending: int = MAX_PENDING_BATCHES,
+    ) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.written = 0
+        self.failed: list[tuple[SQLModel, Exception]] = []
+
+        self._batch: list[SQLModel] = []
+        self._queue: queue.Queue[list[SQLModel] | None] = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._error: BaseException | None = None
+
+    @property
+    def pending(self) -> int:
+        """
+        Batches queued and not yet written
+        """
+        return self._queue.qsize()
+
+    def __enter__(self) -> "BatchWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.flush()
+        with profiling.stage("write"):
+            self._queue.put(_DONE)
+            self._thread.join()
+
+        if exc is not None:
+            return
+        if self._error:
+            raise self._error
+        if self.failed:
+            raise WriteError(self.failed)
+
+    def add(self, model: Model) -> Model:
+        self._batch.append(model)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return model
+
+    def flush(self) -> None:
+        """
+        Hand the current batch to the writer thread, blocking while the queue is full
+        """
+        if self._error:
+            raise self._error
+        if self._batch:
+            # Time blocked on a full queue is time the producer waits on writes
+            with profiling.stage("write"):
+                self._queue.put(self._batch)
+            self._batch = []
+
+    def _commit(self, models: list[SQLModel]) -> None:
+        try:
+            with self.db as session:
+                session.add_all(models)
+                session.flush()
+                session.expunge_all()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def _write(self, batch: list[SQLModel]) -> None:
+        try:
+            self._commit(batch)
+        except Exception:
+            # One bad row fails the whole batch, write them one by one to keep the rest
+            for model in batch:
+                try:
+                    self._commit([model])
+                    self.written += 1
+                except Exception as error:
+                    self.failed.append((model, error))
+        else:
+            self.written += len(batch)
+
+    def _run(self) -> None:
+        while (batch := self._queue.get()) is not _DONE:
+            if self._error:
+                # Keep draining so producers blocked on the queue are released
+                continue
+            try:
+                self._write(batch)
+            except BaseException as error:
+                self._error = error
@@ -1,11 +1,14 @@
 import re
 import zipfile
 from datetime import datetime
+from typing import Iterator
 
 from pydantic import BaseModel, Field
 from tabulate import tabulate
 
+from fiscal import profiling
 from fiscal.db import Companies, Company_Naming, Database, NFEs, Products_Pricing
+from fiscal.writer import BatchWriter
 
 NF_VALUE = re.compile(r"<vNF>(.*)</vNF>")
 NF_TOTAL = re.compile(r"<total>.*<vProd>(.*)</vProd>.*\<\/total>")
@@ -70,8 +73,10 @@ def _get_produtos(content: str) -> list[XML_Produtos]:
     return produtos
 
 
-def _get_nfes(path: str) -> list[XML_NFEs]:
-    xmls = []
+def _iter_nfes(path: str) -> Iterator[XML_NFEs]:
+    """
+    Parse the NFEs of a zip file one at a time
+    """
     with zipfile.ZipFile(path) as zip_ref:
         files = zip_ref.namelist()
         for file in files:
@@ -83,21 +88,21 @@ def _get_nfes(path: str) -> list[XML_NFEs]:
                 if "cce" in file:
                     continue
                 try:
-                    xmls.append(
-                        XML_NFEs(
-                            codigo_acesso=_get_group(NF_CODE.search(content)),
-                            dt_emissao=_get_group(NF_DATE.search(content)),
-                            valor_total=_get_group(NF_TOTAL.search(content)),
-                            valor_liquido=_get_group(NF_VALUE.search(content)),
-                            emissor=_get_group(NF_NAME.search(content)),
-                            cnpj_emissor=_get_group(NF_CNPJ.search(content)),
-                            description=",".join(re.findall(NF_PROD, content)),
-                            produtos=_get_produtos(content),
-                        )
+                    yield XML_NFEs(
+                        codigo_acesso=_get_group(NF_CODE.search(content)),
+                        dt_emissao=_get_group(NF_DATE.search(content)),
+                        valor_total=_get_group(NF_TOTAL.search(content)),
+                        valor_liquido=_get_group(NF_VALUE.search(content)),
+                        emissor=_get_group(NF_NAME.search(content)),
+                        cnpj_emissor=_get_group(NF_CNPJ.search(content)),
+                        description=",".join(re.findall(NF_PROD, content)),
+                        produtos=_get_produtos(content),
                     )
                 except ValueError as err:
                     print(f"Skipping {file}")
 
+
+def _print_nfes(xmls: list[XML_NFEs]) -> None:
     print(
         tabulate(
             [
@@ -112,18 +117,17 @@ def _get_nfes(path: str) -> list[XML_NFEs]:
             tablefmt="psql",
         )
     )
-    return xmls
 
 
 def update_nfes(path: str) -> None:
     """Atualiza as notas fiscais no banco de dados"""
 
     print("Loading NFEs from Zip file")
-    nfes = _get_nfes(path)
+    nfes = []
 
-    # Read XML from zipfile
+    # Read XML from zipfile, writing each batch while the next files are parsed
     db = Database.from_default()
-    with db:
+    with db, BatchWriter(db) as writer:
         company_by_name = {company.name: company for company in db.get_companies()}
         company_by_cnpj = {
             company.cnpj: company for company in company_by_name.values()
@@ -134,7 +138,8 @@ def update_nfes(path: str) -> None:
         }
         codigos = {nfe.codigo_acesso for nfe in db.get_nfes()}
 
-        for row in nfes:
+        for row in profiling.iterate("parse", _iter_nfes(path)):
+            nfes.append(row)
             codigo_acesso = row.codigo_acesso
             cnpj = row.cnpj_emissor
             name = row.emissor.lower()
@@ -142,6 +147,8 @@ def update_nfes(path: str) -> None:
 
             if codigo_acesso in codigos:
                 continue
+            # The same key may come twice in one zip
+            codigos.add(codigo_acesso)
 
             print(f"{name} - {cnpj}")
             if name in company_by_nickname:
@@ -156,16 +163,20 @@ def update_nfes(path: str) -> None:
                     # TODO:  if the match_cnpj is an UUID, change it on the table Companies
             elif cnpj in company_by_cnpj:
                 ## Add company naming for existing cnpj
-                db.add(Company_Naming(nickname=name, name=company_by_cnpj[cnpj].name))
+                writer.add(
+                    Company_Naming(nickname=name, name=company_by_cnpj[cnpj].name)
+                )
                 company_by_nickname[name] = company_by_cnpj[cnpj]
             else:
                 # add cnpj
-                company = db.add(Companies(name=name, cnpj=cnpj, default_category=""))
-                db.add(Company_Naming(nickname=name, name=name))
+                company = writer.add(
+                    Companies(name=name, cnpj=cnpj, default_category="")
+                )
+                writer.add(Company_Naming(nickname=name, name=name))
                 company_by_cnpj[cnpj] = company
                 company_by_nickname[name] = company
 
-            db.add(
+            writer.add(
                 NFEs(
                     codigo_acesso=codigo_acesso,
                     dt_emissao=date,
@@ -187,7 +198,8 @@ def update_nfes(path: str) -> None:
                 )
             )
 
-            db.commit()
+    with profiling.stage("render"):
+        _print_nfes(nfes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,267 @@
+"""
+In process stand-in for the Inter and Rede APIs.
+
+    with FakeBanks(pages=5, latency=0.05, error_rate=0.1) as banks:
+        client = InterBank(base_url=banks.inter_url, cert=None)
+        rede = Rede("user", "password", "id", "secret", base_url=banks.rede_url)
+
+Serves the Inter oauth, saldo and extrato endpoints, paginated with `pagina`,
+and the Rede oauth and sales endpoints, paginated with a cursor. Every request
+waits `latency` seconds, and a seeded share of the data requests fail with 5xx
+or with 429, asking for `retry_after` seconds. `stats` counts requests per path,
+injected errors and the highest number of requests served at the same time
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from urllib.parse import parse_qs, urlparse
+
+INTER_PREFIX = "/inter"
+REDE_PREFIX = "/rede"
+
+ERROR_STATUSES = [429, 500, 502, 503]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[int] = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+def inter_transaction(index: int, day: date) -> dict:
+    debit = index % 3 == 0
+    return {
+        "idTransacao": f"fake-{day:%Y%m%d}-{index}",
+        "dataInclusao": f"{day:%Y-%m-%d} 10:{index % 60:02}:00",
+        "dataTransacao": f"{day:%Y-%m-%d}",
+        "tipoTransacao": "PIX",
+        "tipoOperacao": "D" if debit else "C",
+        "valor": f"{10 + index % 500}.{index % 100:02}",
+        "titulo": "Pix enviado" if debit else "Pix recebido",
+        "descricao": f"PIX {'ENVIADO' if debit else 'RECEBIDO'} - CP :{index}",
+        "detalhes": {
+            "tipoDetalhe": "PIX",
+            "nomePagador": "PADARIA" if debit else f"CLIENTE {index}",
+            "cpfCnpjPagador": f"{index:014}",
+            "nomeRecebedor": f"FORNECEDOR {index % 40}" if debit else "PADARIA",
+            "cpfCnpjRecebedor": f"{index % 40:014}",
+            "descricaoPix": None,
+            "endToEndId": f"E{index:031}",
+            "chavePixRecebedor": None,
+            "nomeEmpresaRecebedor": None,
+            "origemMovimentacao": None,
+        },
+    }
+
+
+def rede_transaction(index: int, day: date, merchant: str = "93122470") -> dict:
+    amount = 5 + index % 300
+    return {
+        "status": "approved",
+        "brandCode": [1, 2, 14, 13][index % 4],
+        "feeTotal": 1.99,
+        "movementDate": f"{day:%Y-%m-%d}",
+        "saleHour": f"{8 + index % 12:02}:{index % 60:02}:00",
+        "amount": float(amount),
+        "netAmount": round(amount * 0.98, 2),
+        "mdrAmount": round(amount * 0.02, 2),
+        "installmentQuantity": 1,
+        "nsu": 29_000_000 + index,
+        "modality": {
+            "type": "credit" if index % 2 else "debit",
+            "code": 1,
+            "product": "no_installments",
+            "productCode": 1,
+        },
+        "authorizationCode": f"{index:06}",
+        "strAuthorizationCode": f"{index:06}",
+        "tokenNumber": f"545931******{index % 10_000:04}",
+        "merchant": {"companyNumber": merchant, "companyName": f"loja {merchant}"},
+    }
+
+
+class FakeBanks:
+    def __init__(
+        self,
+        pages: int = 3,
+        page_size: int = 50,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 42,
+    ) -> None:
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stats = Stats()
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def inter_url(self) -> str:
+        return self.url + INTER_PREFIX
+
+    @property
+    def rede_url(self) -> str:
+        return self.url + REDE_PREFIX
+
+    def __enter__(self) -> "FakeBanks":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _injected_error(self) -> int | None:
+        with self._random_lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            return self._random.choice(ERROR_STATUSES)
+
+    def _days(self, query: dict[str, list[str]], start: str, end: str) -> list[date]:
+        first = datetime.strptime(query[start][0], "%Y-%m-%d").date()
+        last = datetime.strptime(query[end][0], "%Y-%m-%d").date()
+        return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+    def _page(self, page: int, days: list[date], transaction) -> list[dict]:
+        first = page * self.page_size
+        return [
+            transaction(index, days[index % len(days)])
+            for index in range(first, first + self.page_size)
+        ]
+
+    def _inter_extrato(self, query: dict[str, list[str]]) -> dict:
+        page = int(query.get("pagina", ["0"])[0])
+        days = self._days(query, "dataInicio", "dataFim")
+        return {
+            "totalPaginas": self.pages,
+            "totalElementos": self.pages * self.page_size,
+            "ultimaPagina": page >= self.pages - 1,
+            "primeiraPagina": page == 0,
+            "tamanhoPagina": self.page_size,
+            "numeroDeElementos": self.page_size,
+            "transacoes": self._page(page, days, inter_transaction),
+        }
+
+    def _rede_sales(self, query: dict[str, list[str]]) -> dict:
+        page = int(query.get("pageKey", ["0"])[0])
+        days = self._days(query, "startDate", "endDate")
+        has_next = page < self.pages - 1
+        merchant = query["parentCompanyNumber"][0]
+        transaction = partial(rede_transaction, merchant=merchant)
+        return {
+            "content": {"transactions": self._page(page, days, transaction)},
+            "cursor": {
+                "hasNextKey": has_next,
+                "nextKey": str(page + 1) if has_next else None,
+            },
+        }
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        banks = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep alive, so clients can reuse pooled connections
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_) -> None:
+                ...
+
+            def _send(self, status: int, body: dict, headers=None) -> None:
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _serve(self) -> None:
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                banks.stats.start(url.path)
+                try:
+                    time.sleep(banks.latency)
+                    self._route(url.path, query)
+                finally:
+                    banks.stats.finish()
+
+            def _route(self, path: str, query: dict[str, list[str]]) -> None:
+                if path.endswith("/oauth/v2/token") or path.endswith("/oauth/token"):
+                    length = int(self.headers.get("Content-Length", 0))
+                    self.rfile.read(length)
+                    self._send(
+                        200,
+                        {
+                            "access_token": "fake-token",
+                            "token_type": "Bearer",
+                            "expires_in": 3600,
+                        },
+                    )
+                    return
+
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._send(401, {"title": "Unauthorized"})
+                    return
+
+                if status := banks._injected_error():
+                    banks.stats.errors[status] += 1
+                    headers = {}
+                    if status == 429:
+                        headers["Retry-After"] = str(banks.retry_after)
+                    self._send(status, {"title": "Injected error"}, headers)
+                    return
+
+                if path == INTER_PREFIX + "/banking/v2/saldo":
+                    self._send(200, {"disponivel": 12345.67, "limite": 0.0})
+                elif path == INTER_PREFIX + "/banking/v2/extrato/completo":
+                    self._send(200, banks._inter_extrato(query))
+                elif path == REDE_PREFIX + "/merchant-statement/v1/sales":
+                    self._send(200, banks._rede_sales(query))
+                else:
+                    self._send(404, {"title": "Not found"})
+
+            def do_GET(self) -> None:
+                self._serve()
+
+            def do_POST(self) -> None:
+                self._serve()
+
+        return Handler
@@ -0,0 +1,247 @@
+"""
+NFe 4.0 documents and zips shaped like the accounting system export.
+
+Documents carry the SEFAZ namespace, an emitter, a company or consumer recipient,
+items with taxes, freight and discount, payment data, the signature and the
+authorization protocol. Zips also hold the members the importer must skip:
+inutilization (`-inu`) and correction letter (`cce`) events.
+
+Every generated document is returned as an `ExpectedNFE`, with the values the
+parser should read back
+"""
+import random
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+BRT = timezone(timedelta(hours=-3))
+
+UNITS = ["UN", "CX", "KG", "LT", "PC", "FD"]
+PRODUCTS = [
+    "CERVEJA PILSEN LATA 350ML",
+    "REFRIGERANTE COLA 2L",
+    "AGUA MINERAL 500ML",
+    "CARVAO VEGETAL 5KG",
+    "GELO EM CUBOS 10KG",
+    "COPO DESCARTAVEL 300ML",
+    "GUARDANAPO FOLHA DUPLA",
+    "SUCO DE UVA INTEGRAL 1L",
+    "DETERGENTE NEUTRO 500ML",
+    "PAPEL TOALHA 2 ROLOS",
+]
+
+
+class ExpectedProduct(NamedTuple):
+    name: str
+    unit: str
+    quantity: str
+    unit_value: str
+    total: str
+
+
+class ExpectedNFE(NamedTuple):
+    codigo_acesso: str
+    emissor: str
+    cnpj_emissor: str
+    dt_emissao: datetime
+    valor_total: str
+    valor_liquido: str
+    produtos: list[ExpectedProduct]
+
+
+def _check_digit(key: str) -> str:
+    """
+    Modulo 11 digit closing the 43 digits of an access key
+    """
+    total = sum(int(digit) * (2 + index % 8) for index, digit in enumerate(key[::-1]))
+    digit = 11 - total % 11
+    return "0" if digit >= 10 else str(digit)
+
+
+def access_key(cnpj: str, issued: datetime, number: int, code: int) -> str:
+    key = f"35{issued:%y%m}{cnpj}55001{number:09}1{code:08}"
+    return key + _check_digit(key)
+
+
+def random_nfes(
+    quantity: int,
+    emitters: list[tuple[str, str]],
+    seed: int = 42,
+    first_number: int = 1,
+    max_items: int = 30,
+) -> list[ExpectedNFE]:
+    """
+    `quantity` NFEs from random (name, cnpj) emitters with 1 to `max_items` items
+    """
+    rnd = random.Random(seed)
+    start = datetime(2023, 1, 1, tzinfo=BRT)
+
+    nfes = []
+    for number in range(first_number, first_number + quantity):
+        name, cnpj = rnd.choice(emitters)
+        issued = start + timedelta(seconds=rnd.randrange(365 * 24 * 3600))
+
+        produtos = []
+        for _ in range(rnd.randint(1, max_items)):
+            quantity_ = rnd.randint(1, 120)
+            unit_value = round(rnd.uniform(0.5, 250), 2)
+            produtos.append(
+                ExpectedProduct(
+                    name=rnd.choice(PRODUCTS),
+                    unit=rnd.choice(UNITS),
+                    quantity=f"{quantity_:.4f}",
+                    unit_value=f"{unit_value:.10f}",
+                    total=f"{quantity_ * unit_value:.2f}",
+                )
+            )
+
+        total = sum(float(produto.total) for produto in produtos)
+        freight = rnd.choice([0.0, 0.0, round(rnd.uniform(10, 80), 2)])
+        discount = rnd.choice([0.0, 0.0, round(total * 0.05, 2)])
+
+        nfes.append(
+            ExpectedNFE(
+                codigo_acesso=access_key(cnpj, issued, number, rnd.randrange(10**8)),
+                emissor=name,
+                cnpj_emissor=cnpj,
+                dt_emissao=issued.replace(microsecond=0),
+                valor_total=f"{total:.2f}",
+                valor_liquido=f"{total + freight - discount:.2f}",
+                produtos=produtos,
+            )
+        )
+
+    return nfes
+
+
+def _recipient(rnd: random.Random) -> str:
+    if rnd.random() < 0.2:
+        # Sale to a consumer, identified by CPF only
+        return (
+            f"<dest><CPF>{rnd.randrange(10**11):011}</CPF>"
+            "<xNome>CONSUMIDOR FINAL</xNome><indIEDest>9</indIEDest></dest>"
+        )
+    return (
+        "<dest><CNPJ>12345678000190</CNPJ><xNome>BAR E RESTAURANTE LTDA</xNome>"
+        "<enderDest><xLgr>RUA DAS FLORES</xLgr><nro>100</nro><xBairro>CENTRO</xBairro>"
+        "<cMun>3550308</cMun><xMun>SAO PAULO</xMun><UF>SP</UF><CEP>01001000</CEP>"
+        "</enderDest><indIEDest>1</indIEDest><IE>111222333444</IE></dest>"
+    )
+
+
+def _item(number: int, produto: ExpectedProduct) -> str:
+    icms = float(produto.total) * 0.18
+    return (
+        f'<det nItem="{number}"><prod>'
+        f"<cProd>{number:06}</cProd><cEAN>SEM GTIN</cEAN>"
+        f"<xProd>{produto.name}</xProd><NCM>22030000</NCM><CFOP>5102</CFOP>"
+        f"<uCom>{produto.unit}</uCom><qCom>{produto.quantity}</qCom>"
+        f"<vUnCom>{produto.unit_value}</vUnCom><vProd>{produto.total}</vProd>"
+        f"<cEANTrib>SEM GTIN</cEANTrib><uTrib>{produto.unit}</uTrib>"
+        f"<qTrib>{produto.quantity}</qTrib><vUnTrib>{produto.unit_value}</vUnTrib>"
+        "<indTot>1</indTot></prod>"
+        f"<imposto><vTotTrib>{icms:.2f}</vTotTrib><ICMS><ICMS00><orig>0</orig>"
+        f"<CST>00</CST><modBC>3</modBC><vBC>{produto.total}</vBC><pICMS>18.00</pICMS>"
+        f"<vICMS>{icms:.2f}</vICMS></ICMS00></ICMS></imposto></det>"
+    )
+
+
+def document(nfe: ExpectedNFE, rnd: random.Random | None = None) -> str:
+    """
+    Authorized NFe (nfeProc) for the expected values
+    """
+    rnd = rnd or random.Random(nfe.codigo_acesso)
+    total = float(nfe.valor_total)
+    liquido = float(nfe.valor_liquido)
+    freight = max(liquido - total, 0)
+    discount = max(total - liquido, 0)
+    issued = nfe.dt_emissao.isoformat()
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NAMESPACE}" versao="4.00">'
+        f'<NFe xmlns="{NAMESPACE}">'
+        f'<infNFe Id="NFe{nfe.codigo_acesso}" versao="4.00">'
+        f"<ide><cUF>35</cUF><cNF>{nfe.codigo_acesso[35:43]}</cNF>"
+        "<natOp>VENDA DE MERCADORIA</natOp><mod>55</mod><serie>1</serie>"
+        f"<nNF>{int(nfe.codigo_acesso[25:34])}</nNF><dhEmi>{issued}</dhEmi>"
+        f"<dhSaiEnt>{issued}</dhSaiEnt><tpNF>1</tpNF><idDest>1</idDest>"
+        "<cMunFG>3550308</cMunFG><tpImp>1</tpImp><tpEmis>1</tpEmis>"
+        f"<cDV>{nfe.codigo_acesso[-1]}</cDV><tpAmb>1</tpAmb><finNFe>1</finNFe>"
+        "<indFinal>0</indFinal><indPres>1</indPres><procEmi>0</procEmi>"
+        "<verProc>4.00</verProc></ide>"
+        f"<emit><CNPJ>{nfe.cnpj_emissor}</CNPJ><xNome>{nfe.emissor.upper()}</xNome>"
+        f"<xFant>{nfe.emissor.split()[0].upper()}</xFant><enderEmit>"
+        "<xLgr>AVENIDA INDUSTRIAL</xLgr><nro>2000</nro><xBairro>DISTRITO</xBairro>"
+        "<cMun>3509502</cMun><xMun>CAMPINAS</xMun><UF>SP</UF><CEP>13069000</CEP>"
+        "</enderEmit><IE>244555666777</IE><CRT>3</CRT></emit>"
+        f"{_recipient(rnd)}"
+        + "".join(_item(number, p) for number, p in enumerate(nfe.produtos, start=1))
+        + f"<total><ICMSTot><vBC>{total:.2f}</vBC><vICMS>{total * 0.18:.2f}</vICMS>"
+        f"<vProd>{nfe.valor_total}</vProd><vFrete>{freight:.2f}</vFrete>"
+        f"<vDesc>{discount:.2f}</vDesc><vNF>{nfe.valor_liquido}</vNF>"
+        "</ICMSTot></total>"
+        "<transp><modFrete>0</modFrete></transp>"
+        f"<pag><detPag><tPag>15</tPag><vPag>{nfe.valor_liquido}</vPag></detPag></pag>"
+        "<infAdic><infCpl>DOCUMENTO EMITIDO POR ME OU EPP</infCpl></infAdic>"
+        "</infNFe>"
+        '<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"><SignedInfo>'
+        f'<Reference URI="#NFe{nfe.codigo_acesso}"><DigestValue>'
+        f"{rnd.getrandbits(160):040x}</DigestValue></Reference></SignedInfo>"
+        f"<SignatureValue>{rnd.getrandbits(1024):0256x}</SignatureValue></Signature>"
+        "</NFe>"
+        f'<protNFe versao="4.00"><infProt><tpAmb>1</tpAmb>'
+        f"<chNFe>{nfe.codigo_acesso}</chNFe><dhRecbto>{issued}</dhRecbto>"
+        f"<nProt>1352300{rnd.randrange(10**8):08}</nProt><cStat>100</cStat>"
+        "<xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe>"
+        "</nfeProc>"
+    )
+
+
+def _correction_letter(nfe: ExpectedNFE) -> str:
+    return (
+        f'<procEventoNFe xmlns="{NAMESPACE}" versao="1.00"><evento versao="1.00">'
+        f'<infEvento Id="ID110110{nfe.codigo_acesso}01">'
+        f"<chNFe>{nfe.codigo_acesso}</chNFe><tpEvento>110110</tpEvento>"
+        "<detEvento><descEvento>Carta de Correcao</descEvento>"
+        "<xCorrecao>CORRIGE O CFOP DOS ITENS</xCorrecao></detEvento>"
+        "</infEvento></evento></procEventoNFe>"
+    )
+
+
+def _inutilization(number: int) -> str:
+    return (
+        f'<procInutNFe xmlns="{NAMESPACE}" versao="4.00"><inutNFe versao="4.00">'
+        f'<infInut Id="ID35230000000000000001550010000{number:05}0000{number:05}">'
+        "<xServ>INUTILIZAR</xServ><mod>55</mod><serie>1</serie>"
+        f"<nNFIni>{number}</nNFIni><nNFFin>{number}</nNFFin>"
+        "<xJust>FALHA NA NUMERACAO DO SISTEMA</xJust></infInut></inutNFe>"
+        "</procInutNFe>"
+    )
+
+
+def write_zip(path: Path, nfes: Iterable[ExpectedNFE], seed: int = 42) -> int:
+    """
+    Write the NFEs plus a few event members to skip. Returns the bytes of XML
+    written for the NFEs themselves
+    """
+    rnd = random.Random(seed)
+    size = 0
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for nfe in nfes:
+            content = document(nfe, rnd).encode()
+            size += len(content)
+            zip_file.writestr(f"{nfe.codigo_acesso}-nfe.xml", content)
+
+            if rnd.random() < 0.05:
+                zip_file.writestr(
+                    f"{nfe.codigo_acesso}-cce-01.xml", _correction_letter(nfe)
+                )
+            if rnd.random() < 0.02:
+                number = rnd.randrange(10**5)
+                zip_file.writestr(f"{number}-inu.xml", _inutilization(number))
+
+    return size
@@ -0,0 +1,108 @@
+import itertools
+import random
+from datetime import datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.auto_match import Candidate, _assignment, find_matches, solve_group
+from fiscal.db import Company_Naming, Database, EntryType, NFEs, Transactions
+
+
+def nfe(key: str, day: float) -> Candidate:
+    return Candidate(key, "ambev", 10_000, "", day)
+
+
+def payment(key: int, day: float) -> Candidate:
+    return Candidate(key, "ambev", 10_000, "", day)
+
+
+def brute_force(edges: dict[tuple[int, int], float], rows: int, columns: int):
+    best = (0, 0.0)
+    for size in range(min(rows, columns), 0, -1):
+        for chosen_rows in itertools.combinations(range(rows), size):
+            for chosen_columns in itertools.permutations(range(columns), size):
+                pairs = list(zip(chosen_rows, chosen_columns))
+                if all(pair in edges for pair in pairs):
+                    total = sum(edges[pair] for pair in pairs)
+                    if best[0] < size or total < best[1]:
+                        best = (size, total)
+        if best[0]:
+            return best
+    return best
+
+
+class TestAutoMatch(TestCase):
+    def test_assignment_is_optimal(self):
+        rnd = random.Random(3)
+        for _ in range(200):
+            rows, columns = rnd.randint(1, 4), rnd.randint(1, 4)
+            edges = {
+                (i, j): float(rnd.randint(0, 20))
+                for i in range(rows)
+                for j in range(columns)
+                if rnd.random() < 0.7
+            }
+            (size, total), pairs = _assignment(edges, rows)
+
+            assert (size, total) == brute_force(edges, rows, columns)
+            assert len({i for i, _ in pairs}) == len({j for _, j in pairs}) == size
+
+    def test_only_forced_pairs_are_confident(self):
+        # Monthly invoices and payments, each paid a few days later
+        nfes = [nfe(f"n{month}", month * 30) for month in range(3)]
+        payments = [payment(month, month * 30 + 5) for month in range(3)]
+        confident, ambiguous = solve_group(nfes, payments, window=45)
+        assert [(p.nfe.key, p.transaction.key) for p in confident] == [
+            ("n0", 0),
+            ("n1", 1),
+            ("n2", 2),
+        ]
+        assert ambiguous == []
+
+        # Two invoices and two payments that can be paired either way
+        confident, ambiguous = solve_group(
+            [nfe("a", 0), nfe("b", 1)], [payment(1, 2), payment(2, 3)], window=45
+        )
+        assert confident == []
+        assert len(ambiguous) == 2
+
+    def test_finds_matches_in_database(self):
+        db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(db.engine)
+
+        with db:
+            db.add(Company_Naming(nickname="ambev sa", name="ambev"))
+            db.add(Company_Naming(nickname="ambev", name="ambev"))
+            db.add(
+                NFEs(
+                    codigo_acesso="1",
+                    emissor="ambev sa",
+                    dt_emissao=datetime(2023, 3, 1),
+                    valor_liquido="224.00",
+                    valor_total="224.00",
+                )
+            )
+            for id, day in [(1, 10), (2, 28)]:
+                db.add(
+                    Transactions(
+                        id=id,
+                        bank="inter",
+                        date=datetime(2023, 3, day),
+                        entry_type=EntryType.SAIDA,
+                        transaction_type="pix",
+                        category="insumos",
+                        description="ambev",
+                        value=224.0,
+                        counterpart_name="ambev",
+                        validated=False,
+                        external_id=str(id),
+                    )
+                )
+
+        with db:
+            confident, ambiguous = find_matches(db)
+
+        # The nearest payment, the other stays unmatched
+        assert [(p.nfe.key, p.transaction.key) for p in confident] == [("1", 1)]
+        assert ambiguous == []
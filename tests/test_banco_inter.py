@@ -2,7 +2,7 @@ import builtins
 import contextlib
 from datetime import datetime
 import os
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import responses
 from sqlmodel import SQLModel, text
@@ -48,6 +48,8 @@ def TRANSACTION_CPFL_1():
 
 
 def delete_content(client: Database):
+    # The test database may predate newer tables
+    SQLModel.metadata.create_all(client.engine)
     tables = SQLModel.metadata.tables.keys()
     with client.engine.begin() as conn:
         conn.execute(text("PRAGMA foreign_keys=OFF"))
@@ -134,6 +136,11 @@ class TestBancoInter(TestCase):
         cls.r_mock = responses.RequestsMock(assert_all_requests_are_fired=True)
 
     def setUp(self) -> None:
+        # The client makes its own transport, retry it without waiting
+        patcher = mock.patch("fiscal.transport.BACKOFF", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.db = Database.from_default()
         self.r_mock.start()
 
@@ -1,6 +1,7 @@
 from datetime import datetime
 import responses
 from fiscal.banco_inter import InterBank
+from fiscal.transport import Transport
 from unittest import TestCase
 from pathlib import Path
 
@@ -10,7 +11,8 @@ RESOURCES = Path(__file__).parent / "resources"
 class TestInterBankClient(TestCase):
     @classmethod
     def setUpClass(self) -> None:
-        self.client = InterBank()
+        # Requests the mock doesn't know fail at once instead of backing off
+        self.client = InterBank(transport=Transport(backoff=0))
         self.client.bearer_token = "some token"
 
         self.r_mock = responses.RequestsMock(assert_all_requests_are_fired=True)
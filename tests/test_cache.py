@@ -0,0 +1,48 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal import cache
+from fiscal.db import Banks, Database
+
+
+class TestReportCache(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "fiscal.db"
+        self.db = Database(create_engine(f"sqlite:///{path}"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_data_version_only_bumps_on_writes(self):
+        with self.db:
+            assert self.db.get_data_version() == 0
+
+        with self.db:
+            self.db.add(Banks(bank="inter", description="inter bank"))
+
+        with self.db:
+            self.db.get_companies()
+
+        with self.db:
+            assert self.db.get_data_version() == 1
+
+    def test_render_is_cached_until_next_write(self):
+        calls = []
+
+        def printer():
+            calls.append(1)
+            print(f"call {len(calls)}")
+
+        assert cache.render(self.db, "report", ("a",), printer) == "call 1\n"
+        assert cache.render(self.db, "report", ("a",), printer) == "call 1\n"
+        assert cache.render(self.db, "report", ("b",), printer) == "call 2\n"
+
+        with self.db:
+            self.db.add(Banks(bank="inter", description="inter bank"))
+
+        assert cache.render(self.db, "report", ("a",), printer) == "call 3\n"
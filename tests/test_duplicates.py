@@ -0,0 +1,211 @@
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal import duplicates
+from fiscal.db import Database, EntryType, Transactions
+from fiscal.fetcher import _remove_existent_transactions, handle_inserts
+
+
+def transaction(
+    external_id: str,
+    day: int,
+    value: float,
+    description: str = "Pix - Enviado FULANO",
+    bank: str = "bb",
+    entry_type: EntryType = EntryType.SAIDA,
+):
+    return Transactions(
+        bank=bank,
+        date=datetime(2023, 3, day),
+        entry_type=entry_type,
+        transaction_type="pix",
+        category=None,
+        description=description,
+        value=value,
+        counterpart_name=None,
+        validated=False,
+        external_id=external_id,
+    )
+
+
+class TestFingerprint(TestCase):
+    def test_ignores_case_accents_and_spacing(self):
+        self.assertEqual(
+            duplicates.content_key(
+                "bb", "2023-03-01", "saida", 10.0, "Pix  Tarifa Bancária"
+            ),
+            duplicates.content_key(
+                "bb",
+                datetime(2023, 3, 1, 12),
+                EntryType.SAIDA,
+                10.001,
+                "pix - tarifa bancaria",
+            ),
+        )
+
+    def test_entrada_and_saida_differ(self):
+        self.assertNotEqual(
+            duplicates.content_key("bb", "2023-03-01", "saida", 10.0, "pix"),
+            duplicates.content_key("bb", "2023-03-01", "entrada", 10.0, "pix"),
+        )
+
+    def test_identical_transactions_are_numbered(self):
+        first, second, other = duplicates.fingerprints(
+            [
+                transaction("a", 1, 10.0),
+                transaction("b", 1, 10.0),
+                transaction("c", 1, 11.0),
+            ]
+        )
+        key = first.rsplit("-", 1)[0]
+        self.assertEqual(first, f"{key}-0")
+        self.assertEqual(second, f"{key}-1")
+        self.assertTrue(other.endswith("-0"))
+
+
+class TestDuplicates(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def add(self, *transactions: Transactions) -> None:
+        with self.db:
+            for model in transactions:
+                self.db.add(model)
+
+    def test_import_keeps_new_rows_of_shifted_statements(self):
+        stored = [
+            transaction("01/03/2023-0", 1, 10.0),
+            transaction("01/03/2023-1", 1, 20.0),
+        ]
+        for model, fingerprint in zip(stored, duplicates.fingerprints(stored)):
+            model.fingerprint = fingerprint
+        self.add(*stored)
+
+        # Exported again with a new first row, every id moved by one
+        exported = [
+            transaction("01/03/2023-0", 1, 5.0, "Tarifa"),
+            transaction("01/03/2023-1", 1, 10.0),
+            transaction("01/03/2023-2", 1, 20.0),
+            transaction("01/03/2023-3", 1, 20.0),
+        ]
+        with self.db:
+            kept = _remove_existent_transactions(self.db, [(t, "") for t in exported])
+
+        # The new first row took a stored id and is kept all the same
+        self.assertEqual(
+            [t.external_id for t, _ in kept], ["01/03/2023-0", "01/03/2023-3"]
+        )
+        self.assertEqual(kept[0][0].value, 5.0)
+        self.assertTrue(kept[1][0].fingerprint.endswith("-1"))
+
+    def test_import_compares_transactions_without_fingerprint(self):
+        self.add(transaction("01/03/2023-0", 1, 10.0))
+
+        with self.db:
+            kept = _remove_existent_transactions(
+                self.db, [(transaction("01/03/2023-7", 1, 10.0), "")]
+            )
+
+        self.assertEqual(kept, [])
+        with self.db:
+            [stored] = self.db._get_all(Transactions)
+            self.assertTrue(stored.fingerprint.endswith("-0"))
+
+    def test_import_numbers_old_rows_after_fingerprinted_copies(self):
+        fingerprinted = transaction("01/03/2023-0", 1, 10.0)
+        [fingerprinted.fingerprint] = duplicates.fingerprints([fingerprinted])
+        self.add(fingerprinted, transaction("01/03/2023-1", 1, 10.0))
+
+        exported = [
+            transaction("01/03/2023-0", 1, 10.0),
+            transaction("01/03/2023-1", 1, 10.0),
+        ]
+        with self.db:
+            kept = _remove_existent_transactions(self.db, [(t, "") for t in exported])
+
+        # Both payments are stored, the one without fingerprint numbered second
+        self.assertEqual(kept, [])
+        with self.db:
+            prints = [row.fingerprint for row in self.db._get_all(Transactions)]
+        self.assertEqual([p.rsplit("-", 1)[1] for p in prints], ["0", "1"])
+
+    def test_api_banks_only_skip_known_ids(self):
+        self.add(transaction("sale-1", 1, 10.0, "visa", bank="rede"))
+
+        with self.db:
+            kept = _remove_existent_transactions(
+                self.db, [(transaction("sale-2", 1, 10.0, "visa", bank="rede"), "")]
+            )
+
+        self.assertEqual(len(kept), 1)
+        self.assertIsNotNone(kept[0][0].fingerprint)
+
+    def test_backfill_numbers_in_insertion_order(self):
+        self.add(transaction("a", 1, 10.0), transaction("b", 1, 10.0))
+
+        with self.db:
+            self.assertEqual(duplicates.backfill(self.db), 2)
+            self.assertEqual(duplicates.backfill(self.db), 0)
+            rows = self.db._get_all(Transactions)
+            prints = {row.external_id: row.fingerprint for row in rows}
+
+        self.assertTrue(prints["a"].endswith("-0"))
+        self.assertTrue(prints["b"].endswith("-1"))
+
+    def test_finds_copies_near_each_other(self):
+        self.add(
+            transaction("01/03/2023-0", 1, 10.0),
+            transaction("01/03/2023-1", 1, 10.0, "PIX ENVIADO - FULANO"),
+            transaction("02/03/2023-0", 2, 10.0),
+            # Same payment a week later is a different one
+            transaction("08/03/2023-0", 8, 10.0),
+            # Another bank never duplicates this one
+            transaction("x", 1, 10.0, bank="itau"),
+        )
+
+        with self.db:
+            same_day = duplicates.find_duplicates(self.db)
+            next_day = duplicates.find_duplicates(self.db, days=1)
+            itau = duplicates.find_duplicates(self.db, days=1, bank="itau")
+
+        self.assertEqual(len(same_day), 1)
+        self.assertEqual(
+            [row.external_id for row in same_day[0]], ["01/03/2023-0", "01/03/2023-1"]
+        )
+        self.assertEqual(len(next_day[0]), 3)
+        self.assertEqual(itau, [])
+
+
+class TestImport(TestCase):
+    def setUp(self) -> None:
+        # The import writes on its own thread, so use a file and not :memory:
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "fiscal.db"
+        self.db = Database(create_engine(f"sqlite:///{path}"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_writes_after_fingerprinting_stored_rows(self):
+        entrada = EntryType.ENTRADA
+        with self.db:
+            self.db.add(transaction("01/03/2023-0", 1, 10.0, entry_type=entrada))
+
+        exported = [
+            transaction("01/03/2023-0", 1, 10.0, entry_type=entrada),
+            transaction("01/03/2023-1", 1, 20.0, entry_type=entrada),
+        ]
+        with self.db:
+            handle_inserts([(t, "") for t in exported], self.db)
+
+        with self.db:
+            rows = self.db._get_all(Transactions)
+            self.assertEqual(sorted(row.value for row in rows), [10.0, 20.0])
+            self.assertTrue(all(row.fingerprint for row in rows))
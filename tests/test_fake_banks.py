@@ -0,0 +1,121 @@
+from datetime import date, datetime, timedelta
+from unittest import TestCase
+
+import requests
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.banco_inter import InterBank
+from fiscal.db import Database
+from fiscal.rede import Merchant, Rede, Transaction, _get_latest_sales, save_sales
+from fiscal.transport import Transport
+from tests.fake_banks import FakeBanks, rede_transaction
+
+START = datetime(2023, 3, 1)
+END = datetime(2023, 3, 10)
+
+
+class TestFakeBanks(TestCase):
+    def test_inter_pages_through_extrato(self):
+        with FakeBanks(pages=4, page_size=25) as banks:
+            client = InterBank.from_secrets(
+                "id", "secret", base_url=banks.inter_url, cert=None
+            )
+            transactions = client.get_transactions(START, END)
+            balance = client._get_balance(END)
+
+        assert len(transactions.transacoes) == 100
+        assert len({t.idTransacao for t in transactions.transacoes}) == 100
+        assert balance.disponivel == 12345.67
+        assert banks.stats.requests["/inter/banking/v2/extrato/completo"] == 4
+
+    def test_rede_follows_cursor(self):
+        with FakeBanks(pages=3, page_size=10) as banks:
+            client = Rede("user", "password", "id", "secret", base_url=banks.rede_url)
+            transactions = client.get_transactions(START, END)
+
+        assert len(transactions) == 30
+        assert banks.stats.requests["/rede/merchant-statement/v1/sales"] == 3
+
+    def test_rede_walks_each_merchant(self):
+        with FakeBanks(pages=3, page_size=10, latency=0.2) as banks:
+            client = Rede(
+                "user",
+                "password",
+                "id",
+                "secret",
+                base_url=banks.rede_url,
+                transport=Transport(rate_limit=20),
+                merchants=[Merchant.parse("93122470"), Merchant.parse("1:2,3")],
+            )
+            transactions = client.get_transactions(START, END)
+
+        assert len(transactions) == 60
+        # Same authorization codes on both stores, told apart by the merchant
+        assert len({t.external_id for t in transactions}) == 60
+        assert sum(t.external_id.startswith("1-") for t in transactions) == 30
+        assert banks.stats.requests["/rede/merchant-statement/v1/sales"] == 6
+        assert banks.stats.max_in_flight == 2
+
+    def test_rede_starts_each_merchant_after_its_latest_sale(self):
+        today = date.today()
+        db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(db.engine)
+        with db:
+            save_sales(
+                db,
+                [
+                    Transaction(**rede_transaction(0, today - timedelta(days=10))),
+                    # Saved under the subsidiary that made the sale
+                    Transaction(**rede_transaction(1, today - timedelta(days=5), "2")),
+                ],
+            )
+
+        with FakeBanks(pages=1, page_size=20) as banks:
+            client = Rede(
+                "user",
+                "password",
+                "id",
+                "secret",
+                base_url=banks.rede_url,
+                merchants=[
+                    Merchant.parse("93122470"),
+                    Merchant.parse("1:2,3"),
+                    Merchant.parse("7"),
+                ],
+            )
+            with db:
+                sales = _get_latest_sales(client, db)
+
+        first = {}
+        for sale in sales:
+            number = sale.merchant.companyNumber
+            first[number] = min(first.get(number, sale.movementDate), sale.movementDate)
+
+        assert first == {
+            "93122470": today - timedelta(days=11),
+            "1": today - timedelta(days=6),
+            "7": today - timedelta(days=2),
+        }
+
+    def test_injected_errors_are_retried(self):
+        with FakeBanks(pages=4, page_size=25, error_rate=0.3, retry_after=0) as banks:
+            transport = Transport(backoff=0.01)
+            client = Rede("user", "password", "id", "secret", banks.rede_url, transport)
+            transactions = client.get_transactions(START, END)
+
+        assert len(transactions) == 100
+        assert sum(banks.stats.errors.values()) > 0
+        assert transport.retries == sum(banks.stats.errors.values())
+
+    def test_errors_reach_the_client_after_the_last_retry(self):
+        with FakeBanks(error_rate=1.0, retry_after=0) as banks:
+            client = InterBank.from_secrets(
+                "id",
+                "secret",
+                base_url=banks.inter_url,
+                transport=Transport(max_retries=2, backoff=0.01),
+            )
+            with self.assertRaises(requests.HTTPError):
+                client.get_transactions(START, END)
+
+        assert sum(banks.stats.errors.values()) == 3
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from fiscal.banco_inter import (
+    PixTransacao,
+    Transaction,
+    TransferenciaTransacao,
+    _convert_transaction,
+)
+
+PIX = {
+    "nomePagador": "PADARIA",
+    "cpfCnpjPagador": "27723354000110",
+    "tipoDetalhe": "COMPLETE",
+    "nomeRecebedor": "ASSAI ATACADISTA",
+    "cpfCnpjRecebedor": "06057223000171",
+}
+
+TRANSFERENCIA = {
+    "contaBancariaPagador": "1234",
+    "descricaoTransferencia": "TED",
+    "agenciaPagador": "0001",
+    "bancoRecebedor": "341",
+    "contaBancariaRecebedor": "5678",
+    "cpfCnpjRecebedor": "06057223000171",
+    "cpfCnpjPagador": "27723354000110",
+    "nomePagador": "PADARIA",
+    "nomeRecebedor": "ASSAI ATACADISTA",
+    "tipoDetalhe": "COMPLETE",
+    "dataEfetivacao": "2023-03-20",
+}
+
+
+def transaction(tipo: str, detalhes: dict | None) -> dict:
+    return {
+        "idTransacao": "1",
+        "dataInclusao": "2023-03-20 10:41:33.980",
+        "dataTransacao": "2023-03-20",
+        "tipoTransacao": tipo,
+        "tipoOperacao": "D",
+        "valor": "2639.57",
+        "titulo": "Pix enviado",
+        "descricao": "Assai Atacadista",
+        "detalhes": detalhes,
+    }
+
+
+class TestInterTransactions(TestCase):
+    def test_details_model_follows_transaction_type(self):
+        pix = Transaction.parse_obj(transaction("PIX", PIX))
+
+        assert isinstance(pix.detalhes, PixTransacao)
+        assert pix.detalhes.nomeRecebedor == "assai atacadista"
+
+        # Pix details under another type are not taken for a pix
+        with self.assertRaises(ValueError):
+            Transaction.parse_obj(transaction("PAGAMENTO", PIX))
+
+        pagamento = Transaction.parse_obj(transaction("PAGAMENTO", None))
+        assert pagamento.detalhes is None
+
+    def test_unknown_type_keeps_raw_details(self):
+        detalhes = {"tipoDetalhe": "COMPLETE", "valorTarifa": "1.99"}
+
+        tarifa = Transaction.parse_obj(transaction("TARIFA", detalhes))
+
+        assert tarifa.detalhes == detalhes
+
+    def test_transfer_names_its_recipient(self):
+        payload = transaction("TRANSFERENCIA", TRANSFERENCIA)
+        payload["descricao"] = "TED enviada"
+        ted = Transaction.parse_obj(payload)
+
+        assert isinstance(ted.detalhes, TransferenciaTransacao)
+        converted, cnpj = _convert_transaction(ted)
+
+        assert converted.counterpart_name == "assai atacadista"
+        assert cnpj == "06057223000171"
@@ -0,0 +1,76 @@
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.banco_inter import INTER_BANK, InterBank, _convert_transaction
+from fiscal.db import Database, Transactions
+from fiscal.landing import Landing
+from fiscal.reprocess import _update_existing, load
+from fiscal.transport import Transport
+from tests.fake_banks import FakeBanks
+
+START = datetime(2023, 3, 1)
+END = datetime(2023, 3, 10)
+
+
+class TestLanding(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "fiscal.db"
+        self.db = Database(create_engine(f"sqlite:///{path}"))
+        SQLModel.metadata.create_all(self.db.engine)
+        self.landing = Landing.from_db(self.db)
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def fetch(self):
+        with FakeBanks(pages=3, page_size=10) as banks:
+            client = InterBank.from_secrets(
+                "id",
+                "secret",
+                base_url=banks.inter_url,
+                transport=Transport(),
+                landing=self.landing,
+            )
+            return client.get_transactions(START, END).transacoes
+
+    def test_pages_are_stored_and_reloaded(self):
+        fetched = self.fetch()
+
+        assert self.landing
+        pages = list(self.landing.pages(INTER_BANK, "extrato"))
+        assert [page.page for page in pages] == [0, 1, 2]
+        assert pages[0].start == START.date() and pages[0].end == END.date()
+        after = END.date().replace(day=11)
+        assert list(self.landing.pages(INTER_BANK, "extrato", since=after)) == []
+
+        loaded = load(self.landing, INTER_BANK)
+        assert sorted(loaded) == sorted(t.idTransacao.lower() for t in fetched)
+
+    def test_existing_transactions_get_converted_again(self):
+        transaction, _ = _convert_transaction(self.fetch()[0])
+        with self.db:
+            self.db.add(
+                Transactions(
+                    **transaction.dict()
+                    | {"description": "wrong", "category": "insumos"}
+                )
+            )
+
+        with self.db:
+            existing, changed = _update_existing(
+                self.db, INTER_BANK, load(self.landing, INTER_BANK)
+            )
+
+        assert existing == {transaction.external_id}
+        assert changed == 1
+        with self.db:
+            [stored] = self.db.get_transactions(INTER_BANK)
+            assert stored.description == transaction.description
+            # Decisions taken on import are kept
+            assert stored.category == "insumos"
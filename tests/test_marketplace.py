@@ -0,0 +1,66 @@
+from datetime import datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, EntryType, NFEs, Transactions, Validations
+from fiscal.marketplace import unique_subset
+from fiscal.match import MarketPlaceSet
+
+
+def nfe(codigo: str, day: int, total: str) -> NFEs:
+    return NFEs(
+        codigo_acesso=codigo,
+        emissor=f"loja {codigo}",
+        dt_emissao=datetime(2023, 3, day),
+        valor_liquido=total,
+        valor_total=total,
+    )
+
+
+class TestMarketplace(TestCase):
+    def test_unique_subset(self):
+        assert unique_subset([1000, 2550, 799, 4000], 3349) == [1, 2]
+        assert unique_subset([1000, 2550, 799], 5000) is None
+        # 1000 + 2000 and 3000 both reach 3000
+        assert unique_subset([1000, 2000, 3000], 3000) is None
+
+    def test_matches_marketplace_payment_to_its_nfes(self):
+        db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(db.engine)
+
+        with db:
+            for model in [
+                nfe("1", 10, "25.50"),
+                nfe("2", 11, "7.99"),
+                nfe("3", 12, "100.00"),
+                # Far from the payment
+                nfe("4", 28, "33.49"),
+            ]:
+                db.add(model)
+            db.add(
+                Transactions(
+                    id=1,
+                    bank="inter",
+                    date=datetime(2023, 3, 10),
+                    entry_type=EntryType.SAIDA,
+                    transaction_type="pix",
+                    category="compras",
+                    description="pix marketplace",
+                    value=33.49,
+                    counterpart_name="Pix Marketplace",
+                    validated=False,
+                    external_id="1",
+                )
+            )
+
+        with db:
+            [found] = MarketPlaceSet.find(db)
+            assert found.codigo_acesso == "1,2"
+            assert found.day_diff == 1
+            found.act(db)
+
+        with db:
+            validations = db._get_all(Validations)
+            assert sorted(v.codigo_acesso for v in validations) == ["1", "2"]
+            assert MarketPlaceSet.find(db) == []
@@ -0,0 +1,161 @@
+from datetime import datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, EntryType, NFEs, Transactions, Validations
+from fiscal.match import (
+    BaseMatch,
+    BestMatch,
+    MarketPlaceSet,
+    Undo,
+    _select,
+    latest_batches,
+    undo_batch,
+)
+
+
+def best(codigo: str, id: int, day_diff: int) -> BestMatch:
+    return BestMatch(
+        codigo_acesso=codigo,
+        id=id,
+        name="padaria",
+        dt_emissao=datetime(2023, 3, 10),
+        dt_transaction=datetime(2023, 3, 10),
+        day_diff=day_diff,
+        value=10.0,
+    )
+
+
+def undo(codigo: str, id: int) -> Undo:
+    return Undo(
+        codigo_acesso=codigo,
+        id=id,
+        emissor="padaria",
+        counterpart="padaria",
+        dt_emissao=datetime(2023, 3, 10),
+        dt_transaction=datetime(2023, 3, 10),
+        value=10.0,
+        batch=None,
+    )
+
+
+class TestMatch(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+        with self.db:
+            for id in range(1, 4):
+                self.db.add(
+                    NFEs(
+                        codigo_acesso=str(id),
+                        emissor="padaria",
+                        dt_emissao=datetime(2023, 3, 10),
+                        valor_liquido="10.00",
+                        valor_total="10.00",
+                    )
+                )
+                self.db.add(
+                    Transactions(
+                        id=id,
+                        bank="inter",
+                        date=datetime(2023, 3, 10),
+                        entry_type=EntryType.SAIDA,
+                        transaction_type="pix",
+                        category="compras",
+                        description="padaria",
+                        value=10.0,
+                        counterpart_name="padaria",
+                        validated=False,
+                        external_id=str(id),
+                    )
+                )
+
+    def test_select(self):
+        rows = [best(str(i), i, diff) for i, diff in enumerate([0, -2, 5, 1, 9])]
+
+        assert _select("0-2, 4", rows) == [0, 1, 2, 4]
+        assert _select("3,1-1,3", rows) == [3, 1]
+        assert _select("d2", rows) == [0, 1, 3]
+        with self.assertRaises(ValueError):
+            _select("2-5", rows)
+        with self.assertRaises(ValueError):
+            _select("a", rows)
+
+    def test_act_all_skips_conflicting_matches(self):
+        with self.db:
+            accepted = BestMatch.act_all(
+                self.db,
+                [best("1", 1, 0), best("1", 2, 0), best("2", 1, 0), best("2", 2, 0)],
+            )
+
+        assert [(m.codigo_acesso, m.id) for m in accepted] == [("1", 1), ("2", 2)]
+        with self.db:
+            validations = self.db._get_all(Validations)
+            assert {(v.codigo_acesso, v.transacao) for v in validations} == {
+                ("1", 1),
+                ("2", 2),
+            }
+            assert [n.validated for n in self.db._get_all(NFEs)] == [1, 1, 0]
+            assert [t.validated for t in self.db._get_all(Transactions)] == [1, 1, 0]
+
+    def test_undo_reverts_batch(self):
+        with self.db:
+            BaseMatch.act_all(self.db, [best("1", 1, 0), best("3", 3, 0)])
+
+        with self.db:
+            Undo.act_all(self.db, [undo("1", 1), undo("3", 3)])
+
+        with self.db:
+            assert self.db._get_all(Validations) == []
+            assert not any(n.validated for n in self.db._get_all(NFEs))
+            assert not any(t.validated for t in self.db._get_all(Transactions))
+
+    def test_undo_batch_reverts_only_that_session(self):
+        with self.db:
+            BaseMatch.act_all(self.db, [best("1", 1, 0), best("2", 2, 0)], "match-a")
+            BaseMatch.act_all(self.db, [best("3", 3, 0)], "match-b")
+
+        with self.db:
+            assert {b["Batch"]: b["Matches"] for b in latest_batches(self.db)} == {
+                "match-a": 2,
+                "match-b": 1,
+            }
+            assert len(Undo.find(self.db)) == 3
+            assert undo_batch(self.db, "match-a") == 2
+
+        with self.db:
+            [validation] = self.db._get_all(Validations)
+            assert validation.batch == "match-b"
+            assert validation.created_at is not None
+            assert [n.validated for n in self.db._get_all(NFEs)] == [0, 0, 1]
+            assert [t.validated for t in self.db._get_all(Transactions)] == [0, 0, 1]
+
+    def test_undo_keeps_transactions_validated_by_other_nfes(self):
+        paid = MarketPlaceSet(
+            codigo_acesso="1,2",
+            id=1,
+            emissores=["padaria", "padaria"],
+            counterpart="padaria",
+            dt_transaction=datetime(2023, 3, 10),
+            day_diff=0,
+            value=20.0,
+            values=[10.0, 10.0],
+        )
+        with self.db:
+            MarketPlaceSet.act_all(self.db, [paid], "set-a")
+            assert latest_batches(self.db)[0]["Matches"] == 1
+
+        with self.db:
+            Undo.act_all(self.db, [undo("1", 1)])
+
+        with self.db:
+            assert [n.validated for n in self.db._get_all(NFEs)] == [0, 1, 0]
+            assert [t.validated for t in self.db._get_all(Transactions)] == [1, 0, 0]
+            assert undo_batch(self.db, "set-a") == 1
+
+        with self.db:
+            assert self.db._get_all(Validations) == []
+            assert not any(n.validated for n in self.db._get_all(NFEs))
+            assert not any(t.validated for t in self.db._get_all(Transactions))
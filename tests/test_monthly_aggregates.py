@@ -0,0 +1,77 @@
+from datetime import datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, EntryType, Monthly_Aggregates, Transactions
+
+
+def TRANSACTION(external_id: str, value: float, date=datetime(2023, 3, 17)):
+    return Transactions(
+        bank="inter",
+        date=date,
+        entry_type=EntryType.SAIDA,
+        transaction_type="pagamento",
+        category=None,
+        description="cpfl cia paulista de forca luz",
+        value=value,
+        counterpart_name=None,
+        validated=False,
+        external_id=external_id,
+    )
+
+
+class TestMonthlyAggregates(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def aggregates(self) -> list[tuple]:
+        with self.db as session:
+            return [
+                (agg.month, agg.category, agg.value, agg.quantity)
+                for agg in session.query(Monthly_Aggregates).all()
+            ]
+
+    def test_insert_sums_on_same_group(self):
+        with self.db:
+            self.db.add(TRANSACTION("1", 10.0))
+            self.db.add(TRANSACTION("2", 5.5))
+
+        assert self.aggregates() == [("2023-03", "", 15.5, 2)]
+
+    def test_update_moves_value_between_groups(self):
+        with self.db:
+            first = self.db.add(TRANSACTION("1", 10.0))
+            self.db.add(TRANSACTION("2", 5.5))
+
+        with self.db:
+            first.category = "insumos"
+            first.date = datetime(2023, 4, 1)
+            self.db.add(first)
+
+        assert sorted(self.aggregates()) == [
+            ("2023-03", "", 5.5, 1),
+            ("2023-04", "insumos", 10.0, 1),
+        ]
+
+    def test_delete_removes_empty_groups(self):
+        with self.db:
+            first = self.db.add(TRANSACTION("1", 10.0))
+
+        with self.db:
+            self.db.delete(first)
+
+        assert self.aggregates() == []
+
+    def test_rebuild_matches_triggers(self):
+        with self.db:
+            self.db.add(TRANSACTION("1", 10.0))
+            self.db.add(TRANSACTION("2", 5.5, date=datetime(2023, 5, 2)))
+
+        expected = sorted(self.aggregates())
+
+        with self.db:
+            self.db.rebuild_monthly_aggregates()
+
+        assert sorted(self.aggregates()) == expected
@@ -0,0 +1,14 @@
+from unittest import TestCase
+
+from fiscal import profiling
+
+
+class TestProfiling(TestCase):
+    def test_stages_are_inert_when_disabled(self):
+        assert not profiling.enabled()
+
+        with profiling.stage("parse"):
+            items = list(profiling.iterate("parse", range(3)))
+
+        assert items == [0, 1, 2]
+        assert profiling.summary().count("parse") == 0
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Banks, Database
+from fiscal.query_stats import QueryStats
+
+
+class TestQueryStats(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+        self.stats = QueryStats(slow_ms=0)
+        self.stats.install(self.db.engine)
+        self.addCleanup(self.stats.remove, self.db.engine)
+
+    def test_groups_statements_and_explains_slow_ones(self):
+        with self.db:
+            self.db.add(Banks(bank="inter", description="inter bank"))
+
+        for _ in range(3):
+            with self.db:
+                self.db.execute("SELECT * FROM banks WHERE bank = :bank", {"bank": "x"})
+
+        stats = self.stats.statements["SELECT * FROM banks WHERE bank = ?"]
+        assert stats.count == 3
+
+        plans = [plan for statement, _, plan in self.stats.slow if "banks" in statement]
+        assert any("banks" in line for plan in plans for line in plan)
+
+    def test_counts_written_rows(self):
+        with self.db:
+            self.db.add(Banks(bank="inter", description="inter bank"))
+            self.db.add(Banks(bank="itau", description="itau bank"))
+
+        with self.db:
+            self.db.execute("UPDATE banks SET description = ''")
+
+        assert self.stats.statements["UPDATE banks SET description = ''"].rows == 2
+        assert "statements in" in self.stats.summary()
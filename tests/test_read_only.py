@@ -0,0 +1,58 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import TestCase, mock
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel
+
+from fiscal.db import Banks, Database
+
+
+class TestReadOnlyDatabase(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        env = {
+            "DB_PATH": str(Path(self.tmp.name) / "fiscal.db"),
+            "FISCAL_DB_PROFILE": "fast",
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.writer = Database.from_default()
+        SQLModel.metadata.create_all(self.writer.engine)
+        with self.writer:
+            self.writer.add(Banks(bank="inter", description="inter bank"))
+
+        self.reader = Database.from_default(read_only=True)
+
+    def tearDown(self) -> None:
+        self.reader.engine.dispose()
+        self.writer.engine.dispose()
+        self.tmp.cleanup()
+
+    def count_banks(self) -> int:
+        with self.reader:
+            return self.reader.execute("SELECT count(*) FROM banks").scalar()
+
+    def test_refuses_writes(self):
+        with self.assertRaises(OperationalError):
+            with self.reader:
+                self.reader.execute("DELETE FROM banks")
+
+    def test_threads_read_concurrently(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            counts = list(executor.map(lambda _: self.count_banks(), range(8)))
+
+        assert counts == [1] * 8
+
+    def test_reads_while_writer_is_open(self):
+        with self.writer:
+            self.writer.add(Banks(bank="itau", description="itau bank"))
+            self.writer._session.flush()
+
+            assert self.count_banks() == 1
+
+        assert self.count_banks() == 2
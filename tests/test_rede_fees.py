@@ -0,0 +1,61 @@
+from datetime import date, datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, Rede_Fees_Daily, Rede_Sales
+from fiscal.rede import Transaction, save_sales
+from fiscal.reports import Granularity, _load_rede_fees
+from tests.fake_banks import rede_transaction
+
+DAY = date(2023, 8, 5)
+
+
+class TestRedeFees(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+        # mastercard credit, visa debit, elo credit and amex debit, twice
+        self.sales = [Transaction(**rede_transaction(index, DAY)) for index in range(8)]
+
+    def test_keeps_fees_once(self):
+        with self.db:
+            save_sales(self.db, self.sales)
+            save_sales(self.db, self.sales[:3])
+
+        with self.db:
+            sales = self.db._get_all(Rede_Sales)
+            daily = self.db._get_all(Rede_Fees_Daily)
+
+            assert len(sales) == 8
+            first = min(sales, key=lambda sale: sale.nsu or 0)
+            assert (first.amount, first.net_amount, first.mdr_amount) == (500, 490, 10)
+            assert first.brand == "mastercard" and first.modality == "débito"
+
+            assert len(daily) == 4
+            assert sum(row.sales for row in daily) == 8
+            assert sum(row.amount for row in daily) == sum(s.amount for s in sales)
+
+    def test_rollup_follows_deletes(self):
+        with self.db:
+            save_sales(self.db, self.sales)
+            self.db.execute("DELETE FROM rede_sales WHERE brand = 'visa'")
+
+        with self.db:
+            daily = self.db._get_all(Rede_Fees_Daily)
+            assert {row.brand for row in daily} == {"mastercard", "elo", "amex"}
+
+    def test_load_rede_fees(self):
+        with self.db:
+            save_sales(self.db, self.sales)
+            fees = _load_rede_fees(
+                self.db,
+                datetime(2023, 8, 1),
+                datetime(2023, 8, 31, 23, 59),
+                Granularity.MONTH,
+            )
+
+        assert list(fees["period"].unique()) == ["2023-08"]
+        assert fees["sales"].sum() == 8
+        mastercard = fees.loc[fees["brand"] == "mastercard"].iloc[0]
+        assert mastercard["mdr"] == round(mastercard["amount"] * 0.02, 2)
@@ -0,0 +1,120 @@
+import io
+from contextlib import redirect_stdout
+from datetime import datetime
+from unittest import TestCase
+
+import pandas as pd
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, EntryType, Transactions
+from fiscal.reports import (
+    Granularity,
+    _load_fornecedores,
+    _load_month,
+    _load_trend,
+    _period_bounds,
+    _periods,
+    _print_by_period,
+    _print_dre,
+    _print_entradas,
+    _print_entradas_e_saidas_por_banco,
+    _print_saidas,
+    _print_transfers,
+)
+
+
+def TRANSACTION(
+    date: datetime, value: float, category="insumos", counterpart_name="ambev"
+):
+    return Transactions(
+        bank="inter",
+        date=date,
+        entry_type=EntryType.SAIDA,
+        transaction_type="pagamento",
+        category=category,
+        description="ambev",
+        value=value,
+        counterpart_name=counterpart_name,
+        validated=False,
+        external_id=f"{date}-{value}",
+    )
+
+
+class TestReports(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def test_period_bounds_widen_to_whole_periods(self):
+        first_day, last_day = _period_bounds(
+            datetime(2023, 2, 1), datetime(2023, 8, 1), Granularity.QUARTER
+        )
+
+        assert first_day == datetime(2023, 1, 1)
+        assert last_day.date() == datetime(2023, 9, 30).date()
+
+    def test_trend_compares_with_previous_year(self):
+        with self.db:
+            self.db.add(TRANSACTION(datetime(2022, 3, 10), 100.0))
+            self.db.add(TRANSACTION(datetime(2023, 2, 10), 30.0))
+            self.db.add(TRANSACTION(datetime(2023, 3, 10), 70.0))
+            self.db.add(TRANSACTION(datetime(2023, 3, 11), 5.0, "transferencia"))
+
+        first_day, last_day = _period_bounds(
+            datetime(2023, 2, 1), datetime(2023, 3, 1), Granularity.MONTH
+        )
+        with self.db:
+            trend = _load_trend(self.db, first_day, last_day, Granularity.MONTH)
+
+        rows = trend.sort_values("period").to_dict("records")
+        assert [row["period"] for row in rows] == ["2023-02", "2023-03"]
+        assert [row["value"] for row in rows] == [-30.0, -70.0]
+        assert pd.isna(rows[0]["previous_year"])
+        assert rows[1]["previous_year"] == -100.0
+
+    def test_range_with_an_empty_month(self):
+        with self.db:
+            self.db.add(TRANSACTION(datetime(2023, 1, 10), 100.0))
+            self.db.add(TRANSACTION(datetime(2023, 3, 10), 70.0))
+
+        first_day, last_day = _period_bounds(
+            datetime(2023, 1, 1), datetime(2023, 3, 1), Granularity.MONTH
+        )
+        with self.db:
+            month = _load_month(self.db, first_day, last_day, Granularity.MONTH)
+
+        periods = _periods(first_day, last_day, Granularity.MONTH)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            for printer in (
+                _print_dre,
+                _print_entradas_e_saidas_por_banco,
+                _print_entradas,
+                _print_saidas,
+                _print_transfers,
+            ):
+                _print_by_period(printer, month, periods)
+
+        assert output.getvalue().count("### 2023-02") == 5
+
+    def test_fornecedores_are_loaded_apart_from_the_month(self):
+        with self.db:
+            self.db.add(TRANSACTION(datetime(2023, 3, 10), 100.0))
+            self.db.add(TRANSACTION(datetime(2023, 3, 11), 30.0, "insumos", "assai"))
+            self.db.add(TRANSACTION(datetime(2023, 3, 12), 20.0, "insumos", "assai"))
+            self.db.add(TRANSACTION(datetime(2023, 3, 13), 5.0, "transferencia"))
+
+        first_day, last_day = _period_bounds(
+            datetime(2023, 3, 1), None, Granularity.MONTH
+        )
+        with self.db:
+            month = _load_month(self.db, first_day, last_day, Granularity.MONTH)
+            fornecedores = _load_fornecedores(
+                self.db, first_day, last_day, Granularity.MONTH
+            )
+
+        assert "counterpart_name" not in month.columns
+        assert sorted(month["category"]) == ["insumos", "transferencia"]
+
+        values = dict(zip(fornecedores["fornecedor"], fornecedores["value"]))
+        assert values == {"ambev": 100.0, "assai": 50.0}
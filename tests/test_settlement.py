@@ -0,0 +1,81 @@
+from datetime import date, datetime
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Database, EntryType, Transactions
+from fiscal.settlement import expected_settlement, parse_deposit, reconcile
+
+
+def transaction(bank: str, day: date, value: float, description: str, kind: str):
+    return Transactions(
+        bank=bank,
+        date=datetime.combine(day, datetime.min.time()),
+        entry_type=EntryType.ENTRADA,
+        transaction_type=kind,
+        category="entrada",
+        description=description,
+        value=value,
+        counterpart_name=bank,
+        validated=True,
+        external_id=f"{bank}-{day}-{description}-{value}",
+    )
+
+
+def sale(day: date, value: float, brand: str = "visa", kind: str = "débito"):
+    return transaction("rede", day, value, brand, kind)
+
+
+def deposit(day: date, value: float, description: str = "REDE   VISA DB093122470"):
+    return transaction("itau", day, value, description, "débito")
+
+
+class TestSettlement(TestCase):
+    def test_expected_settlement(self):
+        # Friday sales are paid on Monday
+        assert expected_settlement(date(2023, 8, 4), "débito") == date(2023, 8, 7)
+        assert expected_settlement(date(2023, 8, 1), "crédito") == date(2023, 8, 31)
+        # Thirty days after lands on a Sunday
+        assert expected_settlement(date(2023, 8, 4), "crédito") == date(2023, 9, 4)
+
+    def test_parse_deposit(self):
+        assert parse_deposit("REDE   MAST DB093122470") == ("mastercard", "débito")
+        assert parse_deposit("REDE  VS  093122470") == ("visa", "crédito")
+        assert parse_deposit("PIX QRS CONSOLIDADO") is None
+
+    def test_reconcile(self):
+        db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(db.engine)
+
+        with db:
+            for model in [
+                # Paid on the next day, minus the fee
+                sale(date(2023, 8, 1), 60.0),
+                sale(date(2023, 8, 1), 40.0),
+                deposit(date(2023, 8, 2), 98.5),
+                # Paid two days late
+                sale(date(2023, 8, 2), 50.0),
+                deposit(date(2023, 8, 5), 49.0),
+                # Never paid
+                sale(date(2023, 8, 7), 30.0, brand="mastercard"),
+                # Paid much less
+                sale(date(2023, 8, 8), 200.0),
+                deposit(date(2023, 8, 9), 100.0),
+                # Paid without sales
+                deposit(date(2023, 8, 10), 10.0, "REDE  MC  093122470"),
+            ]:
+                db.add(model)
+
+        with db:
+            settlements = reconcile(db, date(2023, 8, 1), date(2023, 8, 31))
+
+        assert [(s.key.day, s.key.brand, s.status) for s in settlements] == [
+            (date(2023, 8, 2), "visa", "ok"),
+            (date(2023, 8, 3), "visa", "atrasado"),
+            (date(2023, 8, 8), "mastercard", "não pago"),
+            (date(2023, 8, 9), "visa", "divergente"),
+            (date(2023, 8, 10), "mastercard", "sem vendas"),
+        ]
+        assert settlements[0].expected == 10000
+        assert settlements[0].sales == 2
+        assert settlements[1].paid_on == date(2023, 8, 5)
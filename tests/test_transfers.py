@@ -0,0 +1,175 @@
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Companies, Database, EntryType, Transactions, Transfer_Links
+from fiscal.fetcher import handle_inserts
+from fiscal.transfers import find_transfers, link
+
+ids = iter(range(1, 1_000))
+
+
+def transaction(
+    bank: str,
+    entry_type: EntryType,
+    day: int,
+    value: float,
+    kind="pix",
+    category: str | None = None,
+):
+    id = next(ids)
+    return Transactions(
+        id=id,
+        bank=bank,
+        date=datetime(2023, 3, day, 10),
+        entry_type=entry_type,
+        transaction_type=kind,
+        category=category,
+        description="pix",
+        value=value,
+        counterpart_name=None,
+        validated=False,
+        external_id=str(id),
+    )
+
+
+class TestTransfers(TestCase):
+    def setUp(self) -> None:
+        self.db = Database(create_engine("sqlite://"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def add(self, *transactions: Transactions) -> list[int]:
+        added = [model.id for model in transactions]
+        with self.db:
+            for model in transactions:
+                self.db.add(model)
+        return added
+
+    def test_pairs_transfers_between_banks(self):
+        sent, received = self.add(
+            transaction("inter", EntryType.SAIDA, 10, 1500.0),
+            transaction("itau", EntryType.ENTRADA, 11, 1500.0),
+        )
+        self.add(
+            # Same bank
+            transaction("inter", EntryType.SAIDA, 12, 300.0),
+            transaction("inter", EntryType.ENTRADA, 12, 300.0),
+            # Too far apart
+            transaction("bb", EntryType.SAIDA, 1, 700.0),
+            transaction("itau", EntryType.ENTRADA, 5, 700.0),
+            # Card sales are never transfers
+            transaction("bb", EntryType.SAIDA, 15, 42.0),
+            transaction("rede", EntryType.ENTRADA, 15, 42.0),
+            # Fees aren't either
+            transaction("bb", EntryType.SAIDA, 16, 9.9, kind="tarifa"),
+            transaction("inter", EntryType.ENTRADA, 16, 9.9),
+        )
+
+        with self.db:
+            transfers, ambiguous = find_transfers(self.db)
+            assert [(t.saida.id, t.entrada.id) for t in transfers] == [(sent, received)]
+            assert ambiguous == 0
+
+            link(self.db, transfers)
+
+        with self.db:
+            [saved] = self.db._get_all(Transfer_Links)
+            assert (saved.saida, saved.entrada) == (sent, received)
+            categories = {t.id: t.category for t in self.db._get_all(Transactions)}
+            assert categories[sent] == categories[received] == "transferencia"
+
+            # Linked ones aren't proposed again
+            assert find_transfers(self.db) == ([], 0)
+
+    def test_leaves_ambiguous_transfers(self):
+        self.add(
+            transaction("inter", EntryType.SAIDA, 10, 1000.0),
+            transaction("bb", EntryType.SAIDA, 10, 1000.0),
+            transaction("itau", EntryType.ENTRADA, 10, 1000.0),
+        )
+
+        with self.db:
+            assert find_transfers(self.db) == ([], 2)
+
+
+def imported(
+    bank: str, entry_type: EntryType, value: float, counterpart: str | None = None
+) -> tuple[Transactions, str]:
+    """
+    A statement row as the importers hand it to handle_inserts
+    """
+    id = next(ids)
+    return (
+        Transactions(
+            bank=bank,
+            date=datetime(2023, 3, 10, 10),
+            entry_type=entry_type,
+            transaction_type="pix",
+            category=None,
+            description=f"pix {id}",
+            value=value,
+            counterpart_name=counterpart,
+            validated=False,
+            external_id=f"imported-{id}",
+        ),
+        "",
+    )
+
+
+class TestImportedTransfers(TestCase):
+    def setUp(self) -> None:
+        # The import writes on its own thread, so use a file and not :memory:
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "fiscal.db"
+        self.db = Database(create_engine(f"sqlite:///{path}"))
+        SQLModel.metadata.create_all(self.db.engine)
+        with self.db:
+            self.db.add(Companies(name="nossa loja", cnpj="1", default_category=""))
+            self.db.add(
+                Companies(name="atacado", cnpj="2", default_category="insumos")
+            )
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def insert(self, *rows: tuple[Transactions, str]) -> None:
+        for row in rows:
+            with self.db:
+                handle_inserts([row], self.db)
+
+    def categories(self) -> dict[str, str | None]:
+        with self.db:
+            return {t.bank: t.category for t in self.db._get_all(Transactions)}
+
+    def test_pairs_imported_transfers(self):
+        self.insert(
+            imported("bb", EntryType.SAIDA, 500.0, "nossa loja"),
+            imported("inter", EntryType.ENTRADA, 500.0),
+        )
+        # Imports label every entrada as such
+        assert self.categories() == {"bb": None, "inter": "entrada"}
+
+        with self.db:
+            transfers, ambiguous = find_transfers(self.db)
+            assert [(t.saida.bank, t.entrada.bank) for t in transfers] == [
+                ("bb", "inter")
+            ]
+            assert ambiguous == 0
+            link(self.db, transfers)
+
+        assert self.categories() == {"bb": "transferencia", "inter": "transferencia"}
+
+    def test_leaves_categorized_transactions_alone(self):
+        self.insert(
+            imported("bb", EntryType.SAIDA, 850.0, "atacado"),
+            imported("itau", EntryType.ENTRADA, 850.0),
+        )
+
+        with self.db:
+            assert find_transfers(self.db) == ([], 0)
+
+        assert self.categories() == {"bb": "insumos", "itau": "entrada"}
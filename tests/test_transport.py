@@ -0,0 +1,93 @@
+import time
+from unittest import TestCase
+
+import requests
+import responses
+
+from fiscal.transport import MAX_RETRIES, RateLimiter, Transport, _retry_after
+
+URL = "https://bank.example/extrato"
+
+
+def response(headers: dict[str, str]) -> requests.Response:
+    resp = requests.Response()
+    resp.headers.update(headers)
+    return resp
+
+
+class TestTransport(TestCase):
+    def test_retry_after_in_seconds_or_date(self):
+        assert _retry_after(response({})) is None
+        assert _retry_after(response({"Retry-After": "3"})) == 3.0
+        assert _retry_after(response({"Retry-After": "soon"})) is None
+        # A date in the past means retry right away
+        past = "Wed, 21 Oct 2015 07:28:00 GMT"
+        assert _retry_after(response({"Retry-After": past})) == 0.0
+
+    def test_rate_limiter_spaces_requests(self):
+        limiter = RateLimiter(rate=50)
+
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+
+        # The first request goes right away, the next five wait 20ms each
+        assert time.monotonic() - start >= 0.1
+
+
+class TestRetries(TestCase):
+    def setUp(self) -> None:
+        self.waits: list[float] = []
+        self.transport = Transport(backoff=1.0, sleep=self.waits.append)
+        self.mock = responses.RequestsMock()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.addCleanup(self.mock.reset)
+
+    def test_retries_until_success(self):
+        self.mock.get(URL, status=503)
+        self.mock.get(URL, status=502)
+        self.mock.get(URL, json={"ok": True})
+
+        resp = self.transport.get(URL)
+
+        assert resp.status_code == 200
+        assert self.transport.retries == 2
+        assert [metric.retry for metric in self.transport.metrics] == [0, 1, 2]
+        # Exponential backoff with jitter: half to all of 1s, then of 2s
+        assert 0.5 <= self.waits[0] <= 1.0
+        assert 1.0 <= self.waits[1] <= 2.0
+
+    def test_honors_retry_after(self):
+        self.mock.get(URL, status=429, headers={"Retry-After": "7"})
+        self.mock.get(URL, json={"ok": True})
+
+        assert self.transport.get(URL).status_code == 200
+        assert self.waits == [7.0]
+
+    def test_gives_up_after_max_retries(self):
+        self.mock.get(URL, status=500)
+
+        resp = self.transport.get(URL)
+
+        assert resp.status_code == 500
+        assert len(self.transport.metrics) == MAX_RETRIES + 1
+        assert len(self.waits) == MAX_RETRIES
+
+    def test_connection_errors_raise_after_max_retries(self):
+        self.mock.get(URL, body=requests.ConnectionError("reset"))
+
+        with self.assertRaises(requests.ConnectionError):
+            self.transport.get(URL)
+
+        assert len(self.transport.metrics) == MAX_RETRIES + 1
+
+    def test_post_is_only_retried_when_asked(self):
+        self.mock.post(URL, status=503)
+
+        assert self.transport.post(URL).status_code == 503
+        assert len(self.transport.metrics) == 1
+        assert self.waits == []
+
+        self.transport.post(URL, retry=True)
+        assert len(self.transport.metrics) == 1 + MAX_RETRIES + 1
@@ -0,0 +1,65 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from sqlmodel import SQLModel, create_engine
+
+from fiscal.db import Banks, Database
+from fiscal.writer import BatchWriter, WriteError
+
+
+class TestBatchWriter(TestCase):
+    def setUp(self) -> None:
+        # The writer thread needs its own connection, so use a file and not :memory:
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "fiscal.db"
+        self.db = Database(create_engine(f"sqlite:///{path}"))
+        SQLModel.metadata.create_all(self.db.engine)
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def banks(self) -> list[str]:
+        with self.db:
+            return sorted(bank.bank for bank in self.db._get_all(Banks))
+
+    def test_writes_every_batch(self):
+        with BatchWriter(self.db, batch_size=3, max_pending=1) as writer:
+            added = [
+                writer.add(Banks(bank=f"bank {i}", description="")) for i in range(10)
+            ]
+
+        assert writer.written == 10
+        assert self.banks() == sorted(f"bank {i}" for i in range(10))
+        # Models stay readable by the producer once written
+        assert added[0].bank == "bank 0"
+
+    def test_writes_what_was_added_when_producer_fails(self):
+        with self.assertRaises(KeyError):
+            with BatchWriter(self.db) as writer:
+                writer.add(Banks(bank="inter", description=""))
+                raise KeyError("parse error")
+
+        assert self.banks() == ["inter"]
+
+    def test_raises_write_errors(self):
+        with self.assertRaises(Exception):
+            with BatchWriter(self.db, batch_size=1) as writer:
+                writer.add(Banks(bank="inter", description=""))
+                writer.add(Banks(bank="inter", description=""))
+
+        assert self.banks() == ["inter"]
+
+    def test_keeps_the_rest_of_a_failed_batch(self):
+        names = ["bb", "inter", "inter", "itau", "rede", "sicoob"]
+        with self.assertRaises(WriteError) as raised:
+            with BatchWriter(self.db, batch_size=4) as writer:
+                for name in names:
+                    writer.add(Banks(bank=name, description=""))
+
+        # The duplicate is reported and both batches were written without it
+        [(model, _)] = raised.exception.failed
+        assert model.bank == "inter"
+        assert writer.written == 5
+        assert self.banks() == ["bb", "inter", "itau", "rede", "sicoob"]
@@ -0,0 +1,62 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+
+from sqlmodel import SQLModel
+
+from fiscal.db import Database, NFEs
+from fiscal.xmls_nfs import _iter_nfes, update_nfes
+from tests.nfe_factory import random_nfes, write_zip
+
+EMITTERS = [
+    ("ambev sa", "07526557000100"),
+    ("distribuidora de bebidas ltda", "11222333000144"),
+]
+
+
+class TestXmlsNfs(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "nfes.zip"
+        self.expected = random_nfes(40, EMITTERS, seed=7)
+        write_zip(self.path, self.expected, seed=7)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_reads_known_totals(self):
+        parsed = {nfe.codigo_acesso: nfe for nfe in _iter_nfes(str(self.path))}
+
+        # Correction letters and inutilizations are skipped
+        assert sorted(parsed) == sorted(nfe.codigo_acesso for nfe in self.expected)
+
+        for expected in self.expected:
+            nfe = parsed[expected.codigo_acesso]
+            assert nfe.emissor == expected.emissor
+            assert nfe.cnpj_emissor == expected.cnpj_emissor
+            assert nfe.dt_emissao == expected.dt_emissao
+            assert nfe.valor_total == expected.valor_total
+            assert nfe.valor_liquido == expected.valor_liquido
+            assert [p.valor_total for p in nfe.produtos] == [
+                p.total for p in expected.produtos
+            ]
+            assert [p.quantidade for p in nfe.produtos] == [
+                p.quantity for p in expected.produtos
+            ]
+
+    def test_imports_a_key_repeated_in_the_zip_once(self):
+        db_path = Path(self.tmp.name) / "fiscal.db"
+        with mock.patch.dict(os.environ, {"DB_PATH": str(db_path)}):
+            db = Database.from_default()
+            SQLModel.metadata.create_all(db.engine)
+            repeated = Path(self.tmp.name) / "repeated.zip"
+            write_zip(repeated, self.expected + self.expected[:1], seed=7)
+
+            update_nfes(str(repeated))
+
+            with db:
+                codigos = [nfe.codigo_acesso for nfe in db._get_all(NFEs)]
+            db.engine.dispose()
+
+        assert sorted(codigos) == sorted(nfe.codigo_acesso for nfe in self.expected)